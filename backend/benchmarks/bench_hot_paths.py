@@ -0,0 +1,197 @@
+"""
+Micro-benchmarks: extraction, style detection and PPTX rendering.
+
+Times each hot path over several input sizes and reports, per case:
+wall time (min/median over --repeat runs, after one warm-up), peak and
+retained allocations from tracemalloc (one separate traced run, so tracing
+overhead does not skew timings) and output size (characters extracted or
+bytes written).
+
+Cases:
+- DataExtractor._extract_csv / _extract_excel / _extract_word per corpus size
+- detect_best_styles on synthetic texts of --style-mb megabytes
+- PPTXBuilder.build per slide count and theme in themes.THEMES
+
+The JSON report (--output) can be passed back as --baseline to print the
+relative change per case; --threshold makes slowdowns fail the run.
+
+Usage (from backend/):
+    python -m benchmarks.bench_hot_paths [--only extract styles build] [--repeat 5]
+        [--sizes small medium large] [--style-mb 1 10] [--slides 5 20 60] [--themes corporate_navy ...]
+        [--output report.json] [--baseline report.json --threshold 0.2]
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import UTC, datetime
+
+from benchmarks.bench_styles import make_corpus
+from benchmarks.corpora import SIZES, make_corpora
+from services.extractor import DataExtractor
+from services.llm_simulator import MOCK_ANALYSIS_DECK
+from services.pptx_builder import PPTXBuilder
+from services.presentation_styles import detect_best_styles
+from services.themes import THEMES
+
+GROUPS = ["extract", "styles", "build"]
+
+
+def measure(fn, repeat: int) -> dict:
+    """Time `fn` and trace its allocations. Returns timings, memory and fn's output size."""
+    output_size = fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "min_ms": round(min(timings) * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "runs": repeat,
+        "alloc_peak_kb": round(peak / 1024, 1),
+        "alloc_retained_kb": round(retained / 1024, 1),
+        "output_size": output_size,
+    }
+
+
+def make_deck(slide_count: int) -> dict:
+    """A deck of `slide_count` slides cycling through every slide type."""
+    pool = MOCK_ANALYSIS_DECK["slides"]
+    slides = [copy.deepcopy(pool[i % len(pool)]) for i in range(slide_count)]
+    return {"presentation_title": f"Benchmark deck ({slide_count})", "slides": slides}
+
+
+# =========================================================================
+# Cases
+# =========================================================================
+
+def extract_cases(workdir: str, sizes: list):
+    extractor = DataExtractor()
+    corpora = make_corpora(os.path.join(workdir, "corpora"), sizes)
+    methods = {"csv": extractor._extract_csv, "xlsx": extractor._extract_excel, "docx": extractor._extract_word}
+    for name, path in corpora.items():
+        kind, size = name.split("-")
+        method = methods[kind]
+        yield (f"extract_{kind}", {"size": size, "rows": SIZES[size], "file_bytes": os.path.getsize(path)},
+               lambda method=method, path=path: len(method(path)))
+
+
+def style_cases(megabytes: list):
+    for mb in megabytes:
+        text = make_corpus(mb)
+        yield ("detect_best_styles", {"mb": mb},
+               lambda text=text: len(detect_best_styles(text)))
+
+
+def build_cases(slide_counts: list, themes: list):
+    builder = PPTXBuilder()
+    for count in slide_counts:
+        deck = make_deck(count)
+        for theme_id in themes:
+            def run(deck=deck, theme_id=theme_id, count=count):
+                # build() writes below the working directory
+                path = builder.build(deck, f"bench_{theme_id}_{count}.pptx", theme_id=theme_id)
+                return os.path.getsize(path)
+            yield "pptx_build", {"slides": count, "theme": theme_id}, run
+
+
+# =========================================================================
+# Report
+# =========================================================================
+
+def case_key(result: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()) if k != "file_bytes")
+    return f"{result['benchmark']}[{params}]"
+
+
+def compare(results: list, baseline: dict) -> list:
+    """Return (key, baseline median, current median, relative change) per shared case."""
+    previous = {case_key(r): r for r in baseline.get("results", [])}
+    rows = []
+    for result in results:
+        old = previous.get(case_key(result))
+        if old and old["median_ms"]:
+            change = (result["median_ms"] - old["median_ms"]) / old["median_ms"]
+            rows.append((case_key(result), old["median_ms"], result["median_ms"], change))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--style-mb", type=float, nargs="+", default=[1, 10])
+    parser.add_argument("--slides", type=int, nargs="+", default=[5, 20, 60])
+    parser.add_argument("--themes", nargs="+", choices=list(THEMES), default=list(THEMES))
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Report from a previous run to compare against")
+    parser.add_argument("--threshold", type=float, help="Fail if any case is this much slower (e.g. 0.2)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    workdir = tempfile.mkdtemp(prefix="smartdeck-bench-")
+    os.chdir(workdir)
+
+    cases = []
+    if "extract" in args.only:
+        cases.append(extract_cases(workdir, args.sizes))
+    if "styles" in args.only:
+        cases.append(style_cases(args.style_mb))
+    if "build" in args.only:
+        cases.append(build_cases(args.slides, args.themes))
+
+    results = []
+    print(f"{'case':<60} | {'median ms':>10} | {'peak KB':>9} | {'output':>10}")
+    for group in cases:
+        for name, params, fn in group:
+            result = {"benchmark": name, "params": params, **measure(fn, args.repeat)}
+            results.append(result)
+            print(f"{case_key(result):<60} | {result['median_ms']:>10.1f} | "
+                  f"{result['alloc_peak_kb']:>9.0f} | {result['output_size']:>10}", flush=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {output}")
+
+    if baseline:
+        with open(baseline) as f:
+            rows = compare(results, json.load(f))
+        print(f"\n{'case':<60} | {'baseline':>10} | {'current':>10} | {'change':>7}")
+        for key, old, new, change in rows:
+            print(f"{key:<60} | {old:>10.1f} | {new:>10.1f} | {change:>+7.0%}")
+        if args.threshold is not None:
+            slower = [row for row in rows if row[3] > args.threshold]
+            if slower:
+                print(f"{len(slower)} cases slower than baseline by more than {args.threshold:.0%}")
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
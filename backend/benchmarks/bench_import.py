@@ -0,0 +1,79 @@
+"""
+Benchmark: import time of the backend (python -X importtime).
+
+Imports a module in fresh interpreters, parses the -X importtime log and
+reports the module's cumulative import time (median over --runs) plus the
+slowest dependencies. Exits 1 if the median exceeds --budget-ms or if any
+--forbid module (heavy libraries that must load lazily) was imported.
+
+Usage (from backend/):
+    python -m benchmarks.bench_import [--module main] [--runs 5] [--top 15] [--budget-ms 1500]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+# Must not be imported by `import main`: loaded on first use or by warm_up()
+HEAVY_MODULES = ["pandas", "docx", "pptx", "google.genai"]
+
+
+def parse_importtime(log: str) -> dict:
+    """{module: cumulative microseconds} from a -X importtime log."""
+    modules = {}
+    for line in log.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+    return modules
+
+
+def measure_import(module: str = "main") -> dict:
+    """Import `module` in a fresh interpreter (temp cwd) and parse its import log."""
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd,  # main.py creates its upload dirs in the cwd
+            env={**os.environ, "PYTHONPATH": BACKEND_DIR, "WARM_UP": "off"},
+            capture_output=True, text=True, check=True,
+        )
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float)
+    parser.add_argument("--forbid", nargs="*", default=HEAVY_MODULES)
+    args = parser.parse_args()
+
+    runs = [measure_import(args.module) for _ in range(args.runs)]
+    totals = [run[args.module] / 1000 for run in runs]
+    median_ms = statistics.median(totals)
+    print(f"import {args.module}: median {median_ms:.0f} ms (min {min(totals):.0f}, max {max(totals):.0f})")
+
+    last = runs[-1]
+    top = sorted(((us, name) for name, us in last.items() if "." not in name and name != args.module),
+                 reverse=True)[:args.top]
+    print(f"\n{'top-level dependency':<30} | {'cumulative ms':>13}")
+    for us, name in top:
+        print(f"{name:<30} | {us / 1000:>13.1f}")
+
+    failures = [f"{name} was imported eagerly" for name in args.forbid if name in last]
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        failures.append(f"median {median_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: map-reduce structuring cost versus input size.
+
+Runs IntelligenceService.map_reduce_structure against a local stub client
+with a fixed per-call latency, and reports chunks, tokens and wall time for
+each input size and concurrency level.
+
+Usage (from backend/):
+    python -m benchmarks.bench_map_reduce [--mb 0.5 2 8] [--concurrency 1 4 8] [--latency 0.5]
+"""
+import argparse
+import asyncio
+import json
+from types import SimpleNamespace
+
+from benchmarks.bench_styles import make_corpus
+from services.intelligence import IntelligenceService
+
+
+class _StubModels:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def generate_content(self, model, contents, config):
+        await asyncio.sleep(self.latency)
+        if "CONDENSED INSIGHTS" in contents:
+            text = json.dumps({"presentation_title": "Benchmark", "slides": []})
+        else:
+            text = json.dumps({"summary": "part", "key_points": ["Revenue +8% QoQ"], "metrics": []})
+        usage = SimpleNamespace(prompt_token_count=len(contents) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def make_service(latency: float) -> IntelligenceService:
+    service = IntelligenceService(api_key=None)
+    service.api_key = "benchmark"
+    service.model_name = "stub"
+    service.client = SimpleNamespace(aio=SimpleNamespace(models=_StubModels(latency)))
+    service.simulator = None
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, nargs="+", default=[0.5, 2, 8])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--chunk-tokens", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per stub LLM call")
+    args = parser.parse_args()
+
+    service = make_service(args.latency)
+    print(f"{'size':>7} | {'conc':>4} | {'chunks':>6} | {'in tokens':>9} | "
+          f"{'prompt tok':>10} | {'map (s)':>7} | {'total (s)':>9}")
+    for mb in args.mb:
+        text = f"\n\n--- Source: corpus.csv ---\n{make_corpus(mb)}"
+        for concurrency in args.concurrency:
+            _, stats = asyncio.run(service.map_reduce_structure(
+                text, chunk_tokens=args.chunk_tokens, concurrency=concurrency))
+            print(f"{mb:>5.1f}MB | {concurrency:>4} | {stats.chunks:>6} | {stats.input_tokens:>9} | "
+                  f"{stats.prompt_tokens:>10} | {stats.map_seconds:>7.2f} | {stats.total_seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: keyword-based style detection on large extracted texts.
+
+Compares the compiled single-pass matcher in ``presentation_styles`` against
+the previous implementation (one substring scan per keyword).
+
+Usage (from backend/):
+    python -m benchmarks.bench_styles [--mb 5 20 50] [--repeat 3]
+"""
+import argparse
+import random
+import time
+
+from services.presentation_styles import PRESENTATION_STYLES, detect_best_styles
+
+
+def legacy_detect_best_styles(text: str) -> list:
+    """Previous implementation: lowercase copy + ``kw in text`` per keyword."""
+    text_lower = text.lower()
+    results = []
+    for style_id, style in PRESENTATION_STYLES.items():
+        matches = [kw for kw in style["keywords"] if kw.lower() in text_lower]
+        results.append((style_id, len(matches)))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results
+
+
+def make_corpus(size_mb: float, seed: int = 42) -> str:
+    """Synthetic extraction output: markdown tables with sparse prose, like DataExtractor emits."""
+    rng = random.Random(seed)
+    regions = ["Norte", "Sur", "Este", "Oeste", "LATAM", "EMEA"]
+    states = ["Activo", "Pendiente", "Cerrado", "En revisión"]
+    prose = [
+        "Quarterly revenue grew across all regions.",
+        "El equipo revisó el presupuesto y el flujo de caja.",
+        "Customer retention improved after the product launch.",
+        "Leadership discussed heroic efforts in the roadmap review.",
+    ]
+    target = int(size_mb * 1024 * 1024)
+    parts, size, i = ["--- CSV Data ---", "| id | region | amount | status |", "|---:|:---|---:|:---|"], 0, 0
+    while size < target:
+        if i % 500 == 0:
+            line = rng.choice(prose)
+        else:
+            line = f"| {i} | {rng.choice(regions)} | {rng.random() * 1e5:.2f} | {rng.choice(states)} |"
+        parts.append(line)
+        size += len(line) + 1
+        i += 1
+    return "\n".join(parts)
+
+
+def _best_of(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size':>8} | {'legacy (s)':>10} | {'compiled (s)':>12} | {'speedup':>7}")
+    for mb in args.mb:
+        text = make_corpus(mb)
+        legacy = _best_of(legacy_detect_best_styles, text, args.repeat)
+        compiled = _best_of(detect_best_styles, text, args.repeat)
+        print(f"{mb:>6.1f}MB | {legacy:>10.3f} | {compiled:>12.3f} | {legacy / compiled:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
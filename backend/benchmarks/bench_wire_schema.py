@@ -0,0 +1,141 @@
+"""
+Benchmark: output tokens and generation time, verbose vs compact wire schema.
+
+Three measurements:
+- fixtures: output tokens of the same decks written in each schema (the
+  simulator's decks, plus recorded verbose responses given with --fixtures),
+  and a check that expanding the compact form gives back the deck
+- simulator: generate_from_prompt end to end against the offline simulator,
+  whose latency grows with output tokens (--ms-per-token)
+- fake server: the same through the real google-genai client and
+  tests/fake_gemini.py over HTTP (transfer and parsing only: the fake
+  answers instantly)
+
+Usage (from backend/):
+    python -m benchmarks.bench_wire_schema [--prompts 10] [--ms-per-token 5] [--fixtures rec/*.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+from config import settings
+from services.compact_schema import compact_deck, expand_deck
+from services.intelligence import IntelligenceService
+from services.llm_simulator import (
+    MOCK_ANALYSIS_DECK,
+    MOCK_PROMPT_DECK,
+    LatencyModel,
+    LLMSimulator,
+)
+from services.prompt_packer import TokenEstimator
+
+PROMPTS = [
+    "Plan de ventas 2025 para LATAM con metas por país",
+    "Quarterly business review for the EMEA enterprise segment",
+    "Resultados de marketing Q1 y plan de campañas para Q2",
+    "Hiring plan for the platform engineering team next year",
+    "Estrategia de precios para el lanzamiento del nuevo producto",
+]
+
+
+def load_fixtures(paths: list, prompts: int) -> list:
+    """(name, verbose deck) pairs: recorded responses first, then simulator decks."""
+    fixtures = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            fixtures.append((path, expand_deck(json.load(f))))
+    fixtures += [("mock_analysis", MOCK_ANALYSIS_DECK), ("mock_prompt", MOCK_PROMPT_DECK)]
+    simulator = LLMSimulator()
+    for i in range(prompts):
+        prompt = f"=== USER'S REQUEST ===\n{PROMPTS[i % len(PROMPTS)]} ({i})"
+        fixtures.append((f"simulated_{i}", simulator._prompt_deck(prompt, random.Random(i))))
+    return fixtures
+
+
+def bench_fixtures(fixtures: list):
+    estimator = TokenEstimator()
+    print(f"{'fixture':<16} | {'slides':>6} | {'verbose tok':>11} | {'compact tok':>11} | {'saved':>6} | round trip")
+    totals = [0, 0]
+    for name, deck in fixtures:
+        verbose = estimator.raw_estimate(json.dumps(deck, ensure_ascii=False))
+        compact = estimator.raw_estimate(json.dumps(compact_deck(deck), ensure_ascii=False))
+        totals[0] += verbose
+        totals[1] += compact
+        same = expand_deck(compact_deck(deck)) == deck
+        print(f"{name[-16:]:<16} | {len(deck.get('slides', [])):>6} | {verbose:>11} | {compact:>11} | "
+              f"{1 - compact / verbose:>6.1%} | {'ok' if same else 'MISMATCH'}")
+    print(f"{'total':<16} | {'':>6} | {totals[0]:>11} | {totals[1]:>11} | {1 - totals[1] / totals[0]:>6.1%} |")
+
+
+def _output_tokens() -> float:
+    return REGISTRY.get_sample_value("smartdeck_output_tokens_sum", {"task": "prompt"}) or 0.0
+
+
+def bench_simulator(prompts: int, base_ms: float, ms_per_token: float):
+    print(f"\nSimulator: {base_ms:.0f} ms + {ms_per_token:g} ms per output token, {prompts} sequential decks")
+    print(f"{'schema':<8} | {'output tok/deck':>15} | {'mean (s)':>8} | {'p95 (s)':>7}")
+    for compact in (False, True):
+        service = IntelligenceService(api_key=None)
+        service.simulator = LLMSimulator(latency=LatencyModel(median_ms=base_ms, ms_per_output_token=ms_per_token))
+        service.compact_output = compact
+        tokens_before, times = _output_tokens(), []
+        for i in range(prompts):
+            started = time.perf_counter()
+            asyncio.run(service.generate_from_prompt(f"{PROMPTS[i % len(PROMPTS)]} ({i})"))
+            times.append(time.perf_counter() - started)
+        p95 = sorted(times)[max(0, int(len(times) * 0.95) - 1)]
+        print(f"{'compact' if compact else 'verbose':<8} | {(_output_tokens() - tokens_before) / prompts:>15.0f} | "
+              f"{statistics.mean(times):>8.3f} | {p95:>7.3f}")
+
+
+def bench_fake_server(fixtures: list, repeat: int):
+    from tests.fake_gemini import FakeGeminiServer
+    print(f"\nFake Gemini server (real client over HTTP), {repeat} calls per fixture")
+    print(f"{'schema':<8} | {'bytes/deck':>10} | {'mean (ms)':>9}")
+    for compact in (False, True):
+        sizes, times = [], []
+        for _, deck in fixtures:
+            body = compact_deck(deck) if compact else deck
+            with FakeGeminiServer(response_json=body) as server:
+                with patch.object(settings, "GEMINI_BASE_URL", server.url), \
+                        patch.object(settings, "CONTEXT_CACHE_ENABLED", False):
+                    service = IntelligenceService(api_key="benchmark")
+                    service.warm_up()
+                service.compact_output = compact
+
+                async def run(service: IntelligenceService, times: list):
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        await service.generate_from_prompt(PROMPTS[0])
+                        times.append(time.perf_counter() - started)
+                asyncio.run(run(service, times))
+            sizes.append(len(json.dumps(body)))
+        print(f"{'compact' if compact else 'verbose':<8} | {statistics.mean(sizes):>10.0f} | "
+              f"{statistics.mean(times) * 1000:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=10, help="Simulated decks to generate")
+    parser.add_argument("--base-ms", type=float, default=300, help="Simulator latency per call before output")
+    parser.add_argument("--ms-per-token", type=float, default=5, help="Simulator latency per output token")
+    parser.add_argument("--fixtures", nargs="*", default=[], help="Recorded deck responses (JSON files)")
+    parser.add_argument("--repeat", type=int, default=5, help="Fake server calls per fixture")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    fixtures = load_fixtures(args.fixtures, args.prompts)
+    bench_fixtures(fixtures)
+    bench_simulator(args.prompts, args.base_ms, args.ms_per_token)
+    bench_fake_server(fixtures, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Synthetic upload corpora for benchmarks.
+
+Writes CSV, XLSX and DOCX files shaped like real uploads (sales tables,
+multi-sheet workbooks, report prose) at a few fixed sizes, deterministic
+for a given seed so runs are comparable.
+"""
+import os
+import random
+
+import pandas as pd
+from docx import Document
+
+# Rows per table (CSV/XLSX) or paragraphs (DOCX) per size class
+SIZES = {"small": 100, "medium": 2_000, "large": 20_000}
+
+_REGIONS = ["Norte", "Sur", "Este", "Oeste", "LATAM", "EMEA"]
+_PRODUCTS = ["Core", "Pro", "Enterprise", "Add-on", "Services"]
+_STATES = ["Activo", "Pendiente", "Cerrado", "En revisión"]
+_SENTENCES = [
+    "Quarterly revenue grew {n}% across all regions.",
+    "El equipo revisó el presupuesto y el flujo de caja de {region}.",
+    "Customer retention improved to {n}% after the product launch.",
+    "Operating margin reached {n}% while hiring stayed on plan.",
+    "Los costos logísticos en {region} bajaron un {n}% interanual.",
+]
+
+
+def sales_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "id": range(1, rows + 1),
+        "region": [rng.choice(_REGIONS) for _ in range(rows)],
+        "product": [rng.choice(_PRODUCTS) for _ in range(rows)],
+        "amount": [round(rng.uniform(100, 50_000), 2) for _ in range(rows)],
+        "units": [rng.randint(1, 500) for _ in range(rows)],
+        "status": [rng.choice(_STATES) for _ in range(rows)],
+    })
+
+
+def write_csv(path: str, rows: int, seed: int = 42) -> str:
+    sales_frame(rows, seed).to_csv(path, index=False)
+    return path
+
+
+def write_xlsx(path: str, rows: int, sheets: int = 3, seed: int = 42) -> str:
+    with pd.ExcelWriter(path) as writer:
+        for i in range(sheets):
+            sales_frame(max(1, rows // sheets), seed + i).to_excel(writer, sheet_name=f"Q{i + 1}", index=False)
+    return path
+
+
+def write_docx(path: str, paragraphs: int, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading("Informe de resultados", level=1)
+    for _ in range(paragraphs):
+        sentences = [rng.choice(_SENTENCES).format(n=rng.randint(1, 40), region=rng.choice(_REGIONS))
+                     for _ in range(3)]
+        doc.add_paragraph(" ".join(sentences))
+    doc.save(path)
+    return path
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "docx": write_docx}
+
+
+def make_corpora(directory: str, sizes: list | None = None, kinds: list | None = None, seed: int = 42) -> dict:
+    """Write one file per (kind, size). Returns {"csv-small": path, ...}."""
+    os.makedirs(directory, exist_ok=True)
+    corpora = {}
+    for size in sizes or list(SIZES):
+        for kind in kinds or list(WRITERS):
+            path = os.path.join(directory, f"bench_{size}.{kind}")
+            if not os.path.exists(path):
+                WRITERS[kind](path, SIZES[size], seed=seed)
+            corpora[f"{kind}-{size}"] = path
+    return corpora
@@ -0,0 +1,358 @@
+"""
+Load test: end-to-end latency, throughput and resource usage per endpoint.
+
+Drives /analyze, /generate and /generate-from-prompt with synthetic
+CSV/XLSX/DOCX uploads at a fixed concurrency, either against main.app
+in-process (httpx ASGI transport) or against a uvicorn subprocess. The LLM
+is the offline simulator (no API key) or, with --llm fake, the real Gemini
+client talking to tests/fake_gemini.py over HTTP.
+
+Reports p50/p95/p99 latency, throughput, error rate, peak RSS and peak
+open file descriptors per endpoint. --save-baseline stores the report;
+--baseline compares against one and exits 1 when a metric regresses by
+more than --threshold.
+
+Usage (from backend/):
+    python -m benchmarks.load_test [--mode inprocess|uvicorn] [--concurrency 8] [--requests 40]
+        [--sizes small medium] [--llm mock|fake] [--llm-latency-ms 100]
+        [--save-baseline benchmarks/baselines/load.json | --baseline benchmarks/baselines/load.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.corpora import make_corpora
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ["/analyze", "/generate", "/generate-from-prompt"]
+MIME_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+PROMPTS = [
+    "Presentación de resultados trimestrales para el comité de dirección",
+    "Quarterly business review for the enterprise sales team, focus on churn",
+    "Plan de lanzamiento de producto en LATAM con presupuesto y riesgos",
+]
+
+# metric -> direction in which it gets worse
+REGRESSION_METRICS = {
+    "p50_ms": "higher",
+    "p95_ms": "higher",
+    "p99_ms": "higher",
+    "throughput_rps": "lower",
+    "peak_rss_mb": "higher",
+    "peak_fds": "higher",
+}
+# Error rates are compared in absolute terms
+ERROR_RATE_TOLERANCE = 0.01
+
+
+# =========================================================================
+# Measurement
+# =========================================================================
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def read_rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == os.getpid():
+        # ru_maxrss is KB on Linux (peak, not current)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return 0.0
+
+
+def count_fds(pid: int):
+    try:
+        return len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return None
+
+
+class ResourceSampler:
+    """Polls RSS and open fds of a process in a background thread."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_fds = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.peak_rss_mb = max(self.peak_rss_mb, read_rss_mb(self.pid))
+        fds = count_fds(self.pid)
+        if fds is not None:
+            self.peak_fds = max(self.peak_fds, fds)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def summarize(latencies: list, errors: int, wall_seconds: float, sampler: ResourceSampler) -> dict:
+    values = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "throughput_rps": round(len(values) / wall_seconds, 2) if wall_seconds else 0.0,
+        "peak_rss_mb": round(sampler.peak_rss_mb, 1),
+        "peak_fds": sampler.peak_fds,
+    }
+
+
+# =========================================================================
+# Workload
+# =========================================================================
+
+def _upload(path: str) -> tuple:
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        return name, f.read(), MIME_TYPES[name.rsplit(".", 1)[1]]
+
+
+async def _open_sessions(client: httpx.AsyncClient, uploads: list) -> list:
+    """One /analyze per corpus file so /generate can reuse the extracted text."""
+    sessions = []
+    for upload in uploads:
+        response = await client.post("/analyze", files=[("files", upload)])
+        response.raise_for_status()
+        body = response.json()
+        sessions.append({"session_id": body["session_id"], "session_token": body["session_token"]})
+    return sessions
+
+
+def _request_factory(endpoint: str, uploads: list, sessions: list):
+    def build(i: int) -> dict:
+        if endpoint == "/analyze":
+            return {"files": [("files", uploads[i % len(uploads)])]}
+        if endpoint == "/generate":
+            return {"data": {**sessions[i % len(sessions)], "theme": "corporate_navy", "style": "executive"}}
+        return {"data": {"prompt": PROMPTS[i % len(PROMPTS)], "theme": "corporate_navy"}}
+    return build
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, build, requests: int,
+                       concurrency: int, pid: int) -> dict:
+    latencies, errors = [], 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.post(endpoint, **build(i))
+                await response.aread()
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    with ResourceSampler(pid) as sampler:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return summarize(latencies, errors, wall, sampler)
+
+
+async def run_workload(client: httpx.AsyncClient, corpora: dict, args, pid: int) -> dict:
+    uploads = [_upload(path) for path in corpora.values()]
+    sessions = await _open_sessions(client, uploads)
+    results = {}
+    for endpoint in args.endpoints:
+        build = _request_factory(endpoint, uploads, sessions)
+        results[endpoint] = await run_endpoint(client, endpoint, build, args.requests, args.concurrency, pid)
+        print(f"  {endpoint}: {json.dumps(results[endpoint])}", flush=True)
+    return results
+
+
+# =========================================================================
+# Targets
+# =========================================================================
+
+def server_env(args, fake_url: str | None = None) -> dict:
+    """Settings for the app under test: no rate limits, mock or fake LLM."""
+    env = {
+        "RATE_LIMIT_ENABLED": "false",
+        "GENERATION_MAX_CONCURRENT": "1000",
+        "MOCK_LATENCY_MS": str(args.llm_latency_ms),
+        "MOCK_LATENCY_MODE": args.llm_latency_mode,
+        "MOCK_SEED": "1",
+        "GEMINI_API_KEY": "",
+        "GEMINI_BASE_URL": "",
+    }
+    if fake_url:
+        env.update({"GEMINI_API_KEY": "load-test", "GEMINI_BASE_URL": fake_url})
+    return env
+
+
+async def run_inprocess(corpora: dict, args, workdir: str, env: dict) -> dict:
+    # Settings are read at import time
+    os.environ.update(env)
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        return await run_workload(client, corpora, args, os.getpid())
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_uvicorn(corpora: dict, args, workdir: str, env: dict) -> dict:
+    port = _free_port()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+        "--port", str(port), "--log-level", "warning",
+        cwd=workdir,
+        env={**os.environ, **env, "PYTHONPATH": BACKEND_DIR},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    (await client.get("/")).raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    if time.monotonic() > deadline or process.returncode is not None:
+                        raise RuntimeError("uvicorn did not start")
+                    await asyncio.sleep(0.2)
+            return await run_workload(client, corpora, args, process.pid)
+    finally:
+        if process.returncode is None:
+            process.terminate()
+        await asyncio.wait_for(process.wait(), timeout=10)
+
+
+# =========================================================================
+# Baselines
+# =========================================================================
+
+def compare_to_baseline(current: dict, baseline: dict, threshold: float) -> list:
+    """Return human-readable regressions of `current` against `baseline`."""
+    regressions = []
+    for endpoint, metrics in current.items():
+        base = baseline.get(endpoint)
+        if not base:
+            continue
+        for metric, worse in REGRESSION_METRICS.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (worse == "higher" and change > threshold) or (worse == "lower" and -change > threshold):
+                regressions.append(f"{endpoint} {metric}: {old} -> {new} ({change:+.0%})")
+        if metrics["error_rate"] > base.get("error_rate", 0) + ERROR_RATE_TOLERANCE:
+            regressions.append(f"{endpoint} error_rate: {base.get('error_rate', 0)} -> {metrics['error_rate']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=40, help="Requests per endpoint")
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=["small", "medium", "large"])
+    parser.add_argument("--kinds", nargs="+", default=["csv", "xlsx", "docx"], choices=list(MIME_TYPES))
+    parser.add_argument("--llm", choices=["mock", "fake"], default="mock")
+    parser.add_argument("--llm-latency-ms", type=float, default=100)
+    parser.add_argument("--llm-latency-mode", choices=["fixed", "lognormal"], default="fixed")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--save-baseline", help="Store this run as the baseline")
+    parser.add_argument("--baseline", help="Compare against this baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="smartdeck-load-")
+    corpora = make_corpora(os.path.join(workdir, "corpora"), args.sizes, args.kinds)
+    config = {k: getattr(args, k) for k in ("mode", "concurrency", "requests", "sizes", "kinds",
+                                            "llm", "llm_latency_ms", "llm_latency_mode")}
+    print(f"Load test: {json.dumps(config)}")
+
+    fake = None
+    if args.llm == "fake":
+        sys.path.insert(0, BACKEND_DIR)
+        from services.llm_simulator import MOCK_ANALYSIS_DECK
+        from tests.fake_gemini import FakeGeminiServer
+        fake = FakeGeminiServer(response_json=MOCK_ANALYSIS_DECK).__enter__()
+    env = server_env(args, fake.url if fake else None)
+
+    try:
+        runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+        results = asyncio.run(runner(corpora, args, workdir, env))
+    finally:
+        if fake:
+            fake.__exit__(None, None, None)
+
+    report = {"config": config, "results": results}
+    for path in filter(None, [args.output, args.save_baseline]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("Warning: baseline was recorded with a different configuration")
+        regressions = compare_to_baseline(results, baseline["results"], args.threshold)
+        if regressions:
+            print("REGRESSIONS:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
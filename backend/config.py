@@ -12,6 +12,7 @@ class Settings(BaseSettings):
     
     # API Keys
     GEMINI_API_KEY: Optional[str] = Field(None, description="API Key for Google Gemini")
+    GEMINI_BASE_URL: str | None = Field(None, description="Override the Gemini endpoint (e.g. a local fake)")
     
     # Security Constants
     MAX_FILE_SIZE: int = Field(50 * 1024 * 1024, description="50MB")
@@ -19,9 +20,152 @@ class Settings(BaseSettings):
     MAX_TOTAL_UPLOAD_SIZE: int = Field(200 * 1024 * 1024, description="200MB")
     ALLOWED_EXTENSIONS: Set[str] = {'.txt', '.csv', '.xlsx', '.xls', '.docx', '.doc', '.pdf'}
     
-    # Rate Limiting
-    RATE_LIMIT_ANALYZE: str = "5/minute"
-    RATE_LIMIT_GENERATE: str = "10/minute"
+    # LLM Prompt Budget
+    MODEL_CONTEXT_TOKENS: int = Field(1_048_576, description="Context window of the Gemini model")
+    MODEL_OUTPUT_TOKEN_RESERVE: int = Field(8192, description="Tokens kept free for the generated deck")
+    PROMPT_INPUT_TOKEN_BUDGET: int = Field(12_000, description="Max tokens of extracted data sent per structuring call")
+
+    # Gemini HTTP transport: one pooled keep-alive client per process
+    LLM_HTTP_MAX_CONNECTIONS: int = Field(32, description="Connections to the Gemini API per process (LLM_GOVERNOR_MAX_LIMIT calls fit)")
+    LLM_HTTP_MAX_KEEPALIVE: int = Field(16, description="Idle connections kept open for reuse")
+    LLM_HTTP_KEEPALIVE_SECONDS: float = Field(120, description="Idle time before a pooled connection is closed")
+    LLM_HTTP2: bool = Field(False, description="HTTP/2 to the Gemini API (needs the h2 package)")
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS: float = 10
+    LLM_HTTP_READ_TIMEOUT_SECONDS: float = Field(180, description="Longest wait for response data (a whole deck is slow)")
+    LLM_HTTP_WRITE_TIMEOUT_SECONDS: float = 30
+    LLM_HTTP_POOL_TIMEOUT_SECONDS: float = Field(30, description="Longest wait for a free pooled connection")
+    LLM_HTTP_WARM_CONNECTIONS: int = Field(4, description="Connections opened at warm-up, before traffic (0: off)")
+
+    # Provider-side context caching of the static prompt prefix
+    CONTEXT_CACHE_ENABLED: bool = False
+    CONTEXT_CACHE_TTL_SECONDS: int = 3600
+    CONTEXT_CACHE_MIN_TOKENS: int = Field(1024, description="Provider minimum; shorter prefixes are sent inline")
+
+    # Retrieval: large inputs are chunked and indexed (BM25, cached per input);
+    # over-budget calls get the most informative chunks of every source, slide
+    # calls the chunks matching their section
+    RETRIEVAL_ENABLED: bool = True
+    RETRIEVAL_CHUNK_TOKENS: int = Field(200, description="Target tokens per indexed chunk")
+    RETRIEVAL_INDEX_CACHE_SIZE: int = Field(16, description="Inputs whose index is kept in memory")
+
+    # Structuring Mode: "auto" | "single" | "map_reduce"
+    STRUCTURING_MODE: str = "auto"
+    MAP_REDUCE_MIN_OVERFLOW: float = Field(1.5, description="Auto mode uses map-reduce above budget x this factor")
+    MAP_REDUCE_CHUNK_TOKENS: int = Field(8000, description="Target tokens per map chunk")
+    MAP_REDUCE_CONCURRENCY: int = Field(4, description="Max concurrent map calls per request")
+    MAP_REDUCE_MAX_CHUNKS: int = Field(48, description="Chunks grow beyond MAP_REDUCE_CHUNK_TOKENS to stay under this")
+
+    # Structuring pipeline: "single" (one call writes every slide) or
+    # "outline" (a short outline call, then the slides in parallel)
+    STRUCTURING_PIPELINE: str = "single"
+    OUTLINE_FILL_CONCURRENCY: int = Field(6, description="Slide calls in flight per deck in the outline pipeline")
+    OUTLINE_SOURCE_CHARS: int = Field(6000, description="Source excerpt sent with each slide call of the outline pipeline")
+
+    # LLM concurrency governor (AIMD on quota errors)
+    LLM_GOVERNOR_ENABLED: bool = True
+    LLM_GOVERNOR_INITIAL_LIMIT: float = Field(4, description="LLM calls in flight before any feedback")
+    LLM_GOVERNOR_MIN_LIMIT: float = 1
+    LLM_GOVERNOR_MAX_LIMIT: float = 32
+    LLM_GOVERNOR_DECREASE_FACTOR: float = Field(0.5, description="Limit multiplier on a quota error")
+    LLM_GOVERNOR_LATENCY_TARGET_SECONDS: float = Field(0, description="Calls slower than this do not raise the limit (0: off)")
+    LLM_GOVERNOR_DEADLINE_SECONDS: float = Field(60, description="Longest an LLM call may wait for a slot, including quota retries")
+    LLM_GOVERNOR_RETRY_BASE_SECONDS: float = Field(1.0, description="First backoff after a quota error; doubles per retry")
+    LLM_GOVERNOR_STORE: str = Field("memory", description="memory (per process) or sqlite (shared by the workers on a host)")
+    LLM_GOVERNOR_SQLITE_PATH: str = "ratelimit/llm_governor.sqlite3"
+
+    # Model tiers: every task runs on the "fast" or the "strong" model; strong
+    # calls move to the fast one under load or after a quota error
+    LLM_MODEL_FAST: str = "gemini-2.0-flash-lite"
+    LLM_MODEL_STRONG: str = "gemini-2.0-flash"
+    LLM_TASK_TIERS: dict[str, str] = Field(
+        default_factory=lambda: {
+            "summary": "fast", "outline": "fast", "insights": "fast", "notes": "fast", "repair": "fast",
+            "structure": "strong", "prompt": "strong", "fill": "strong", "slide": "strong",
+        },
+        description="Tier per LLM task (tasks not listed use the strong model)")
+    LLM_DOWNGRADE_QUEUE_DEPTH: int = Field(8, description="Governor queue depth from which strong calls use the fast model (0: never)")
+    LLM_DOWNGRADE_QUOTA_COOLDOWN_SECONDS: float = Field(60, description="Strong calls use the fast model this long after a quota error on the strong one")
+
+    # Output format: short keys the model emits, expanded locally (fewer output tokens)
+    LLM_COMPACT_OUTPUT: bool = True
+
+    # Speaker notes: "inline" (written with the slides) or "deferred" (the deck
+    # is returned without them; a background pass adds them to the stored deck)
+    SPEAKER_NOTES_MODE: str = "inline"
+    NOTES_SOURCE_CHARS: int = Field(4000, description="Source excerpt sent with the deferred speaker-notes call")
+    NOTES_WAIT_MAX_SECONDS: float = Field(30, description="Longest GET /decks/{id}/notes holds a request while notes are pending")
+
+    # Slide validation: re-prompt rounds for slides that fail the schema
+    SLIDE_REPAIR_MAX_ROUNDS: int = 1
+
+    # Single slide regeneration / editing
+    REGENERATE_SOURCE_CHARS: int = Field(6000, description="Source excerpt sent with a slide regeneration")
+    DECKS_DIR: str = Field("generated_pptx/decks", description="Stored deck JSON and slide fragments")
+
+    # Content Analysis
+    MAX_ACTIVE_SESSIONS: int = Field(10_000, description="Analyzed sessions kept in memory; the oldest are dropped first")
+    ANALYZE_LLM_SUMMARY: bool = Field(False, description="Also request a Gemini summary in the background after /analyze")
+
+    # Mock mode (no API key): offline LLM simulator
+    MOCK_LATENCY_MODE: str = Field("fixed", description="fixed or lognormal")
+    MOCK_LATENCY_MS: float = Field(2000, description="Fixed latency, or the median in lognormal mode")
+    MOCK_LATENCY_SIGMA: float = Field(0.5, description="Log-normal spread")
+    MOCK_TAIL_PROBABILITY: float = Field(0.0, description="Chance of a tail-latency spike per call")
+    MOCK_TAIL_MULTIPLIER: float = Field(5.0, description="Latency multiplier for a spike")
+    MOCK_MS_PER_OUTPUT_TOKEN: float = Field(0.0, description="Extra latency per generated token")
+    MOCK_FAILURE_RATE: float = Field(0.0, description="Share of calls failing with 429/503")
+    MOCK_QUOTA_ERROR_SHARE: float = Field(0.5, description="Share of failures that are 429 rather than 503")
+    MOCK_MALFORMED_RATE: float = Field(0.0, description="Share of calls returning truncated JSON")
+    MOCK_SEED: int | None = Field(None, description="Seed for latency and fault injection")
+
+    # Startup: load heavy dependencies before the first request
+    WARM_UP: str = Field("background", description="off, startup (before serving) or background")
+
+    # Rendering
+    RENDER_WORKERS: int | None = Field(None, description="Render worker processes (default: CPU count, max 4; 0 = threads in the API process)")
+    RENDER_MAX_JOBS_PER_WORKER: int = Field(50, description="Recycle a render worker after this many decks")
+
+    SLIDE_CACHE_MAX_BYTES: int = Field(32 * 1024 * 1024, description="Slide fragment LRU per render process (0 = off)")
+
+    # Tracing
+    TRACING_ENABLED: bool = Field(True, description="Per-request spans, X-Request-ID and Server-Timing headers")
+    TRACE_EXPORTER: str = Field("none", description="none, file (OTLP/JSON lines) or otlp (OTLP/HTTP collector)")
+    TRACE_FILE: str = Field("traces/spans.jsonl", description="Output of the file exporter")
+    TRACE_OTLP_ENDPOINT: str = Field("http://localhost:4318/v1/traces", description="OTLP/HTTP JSON traces endpoint")
+    TRACE_SERVICE_NAME: str = "smartdeck-backend"
+
+    # Rate Limiting: cost-aware token buckets (1 unit ~ one cheap request)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_CAPACITY: float = Field(60, description="Bucket size in work units (largest burst)")
+    RATE_LIMIT_REFILL_PER_MINUTE: float = Field(60, description="Work units regained per minute")
+    RATE_LIMIT_STORE: str = Field("memory", description="memory (per process) or sqlite (shared by the workers on a host)")
+    RATE_LIMIT_SQLITE_PATH: str = "ratelimit/buckets.sqlite3"
+    RATE_LIMIT_PROXY_HOPS: int = Field(0, description="Trusted reverse proxies in front of the app (0: use the socket address, ignore X-Forwarded-For)")
+    RATE_LIMIT_API_KEYS: set[str] = Field(set(), description="API keys with their own bucket (JSON list); other X-API-Key values are ignored")
+    RATE_LIMIT_COST_ANALYZE: float = Field(1, description="Base units for /analyze")
+    RATE_LIMIT_COST_GENERATE: float = Field(5, description="Base units for an LLM generation")
+    RATE_LIMIT_COST_SLIDE: float = Field(1, description="Base units for regenerating one slide")
+    RATE_LIMIT_COST_RENDER: float = Field(0.5, description="Base units for an edit or theme re-render")
+    RATE_LIMIT_BYTES_PER_UNIT: int = Field(1_000_000, description="Uploaded bytes charged as one unit")
+    RATE_LIMIT_TOKENS_PER_UNIT: int = Field(4000, description="Estimated LLM input tokens charged as one unit")
+
+    # Admission: concurrent generations per process, queued by priority
+    GENERATION_MAX_CONCURRENT: int = Field(8, description="Generations running at once; the rest wait in line")
+    GENERATION_QUEUE_TIMEOUT_SECONDS: float = Field(30, description="Longest wait for a slot before a 503")
+
+    # Single-flight: concurrent identical generations share one LLM call and render
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_TIMEOUT_SECONDS: float = Field(180, description="Longest a request waits on a shared generation before a 503")
+
+    # Semantic cache: /generate-from-prompt serves the deck of a near-duplicate
+    # earlier prompt (same style) instead of calling the LLM
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = Field(0.8, description="Least Jaccard similarity of the normalized prompts for a hit")
+    SEMANTIC_CACHE_MAX_ENTRIES: int = Field(2000, description="Cached decks per process (least recently used evicted)")
+    SEMANTIC_CACHE_TTL_SECONDS: float = Field(86400, description="Age after which a cached deck is no longer served")
+    SEMANTIC_CACHE_NUM_PERM: int = Field(64, description="MinHash signature length")
+    SEMANTIC_CACHE_BANDS: int = Field(16, description="LSH bands (more bands: more candidates checked)")
+    SEMANTIC_CACHE_FLAG_HITS: bool = Field(True, description="Tell the client a deck came from the cache (X-Semantic-Cache header)")
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', extra="ignore")
 
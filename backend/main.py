@@ -1,33 +1,46 @@
 import shutil
 import os
 import re
+import copy
+import json
 import uuid
 import sys
+import time
 import logging
+import asyncio
 import secrets
-from typing import List, Optional
+import hashlib
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from typing import Annotated, List, Optional
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request, BackgroundTasks, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+from fastapi.responses import FileResponse, JSONResponse, Response
 
 from config import settings
+from services import metrics, tracing
+from services.deck_store import DeckStore
 from services.extractor import DataExtractor
 from services.intelligence import IntelligenceService
-from services.pptx_builder import PPTXBuilder
 from services.themes import get_all_themes
+from services.render_pool import RenderPool, default_workers, patch_notes_to_path, render_to_path
+from services.rate_limiter import (
+    CostRateLimiter, PriorityGate, QueueTimeout, RateLimitExceeded, estimate_tokens, request_priority,
+)
 from services.presentation_styles import get_all_styles
+from services.semantic_cache import SemanticCache
+from services.single_flight import FlightTimeout, SingleFlight, flight_key
+from services.slide_schema import validate_slide
 
 # Configure Logging
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.addFilter(tracing.RequestIdFilter())
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
+    format='%(asctime)s | %(levelname)-8s | %(request_id)s | %(name)s | %(message)s',
+    handlers=[_log_handler]
 )
 logger = logging.getLogger("SmartDeck")
 
@@ -37,15 +50,74 @@ logger = logging.getLogger("SmartDeck")
 # MAX_TOTAL_UPLOAD_SIZE = settings.MAX_TOTAL_UPLOAD_SIZE
 # ALLOWED_EXTENSIONS = settings.ALLOWED_EXTENSIONS
 
-app = FastAPI(title="Smart Presentation Generator", version="2.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connections = None
+    if settings.WARM_UP == "startup":
+        warm_up()
+        await _warm_connections()
+    elif settings.WARM_UP == "background":
+        thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        thread.start()
+        connections = asyncio.create_task(_warm_connections(thread))
+    yield
+    if connections:
+        connections.cancel()
+    await intelligence.aclose()
+    if render_pool:
+        render_pool.shutdown(wait=False)
+
+app = FastAPI(title="Smart Presentation Generator", version="2.0.0", lifespan=lifespan)
+
+# Configure Rate Limiter (cost-aware token buckets) and generation admission
+limiter = CostRateLimiter.from_settings(settings)
+generation_gate = PriorityGate(settings.GENERATION_MAX_CONCURRENT)
+flights = SingleFlight()
+semantic_cache = SemanticCache.from_settings(settings)
+
+
+@app.exception_handler(RateLimitExceeded)
+async def _rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    metrics.RATE_LIMIT_REJECTIONS.labels(request.url.path).inc()
+    retry_after = max(1, round(exc.retry_after))
+    logger.warning(f"Rate limited {exc.key} on {request.url.path} (cost {exc.cost:.1f}, retry in {retry_after}s)")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Demasiadas solicitudes. Intenta de nuevo en {retry_after} s."},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+@app.exception_handler(QueueTimeout)
+async def _queue_timeout_handler(request: Request, exc: QueueTimeout):
+    metrics.ADMISSION_TIMEOUTS.labels(exc.priority).inc()
+    logger.warning(f"Admission timeout on {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "El servidor está ocupado. Intenta de nuevo en unos segundos."},
+        headers={"Retry-After": "5"},
+    )
+
 
-# Configure Rate Limiter
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+@app.exception_handler(FlightTimeout)
+async def _flight_timeout_handler(request: Request, exc: FlightTimeout):
+    logger.warning(f"Coalesced generation timed out on {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "La generación está tardando demasiado. Intenta de nuevo en unos segundos."},
+        headers={"Retry-After": "5"},
+    )
 
 # Memory Store for Sessions
 ACTIVE_SESSIONS = {}
+# Background LLM summaries per session: {"status": "pending"|"ready"|"failed", "summary": str}
+SESSION_SUMMARIES = {}
+# Set when a deck's deferred speaker notes are done (GET /decks/{id}/notes waits on it)
+NOTES_READY = {}
+# One lock per deck (while in use): a stored deck is read, changed and saved
+# under it, so concurrent edits, regenerations and the notes pass do not
+# overwrite each other or issue the same version twice
+DECK_LOCKS = weakref.WeakValueDictionary()
 
 # Configure CORS
 app.add_middleware(
@@ -54,7 +126,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition", "Server-Timing", "X-Request-ID", "X-Deck-ID", "X-Deck-Token",
+                    "X-Deck-Version", "X-Notes-Status", "X-Semantic-Cache"],
 )
 
 # Security Headers Middleware
@@ -74,6 +147,43 @@ async def add_security_headers(request: Request, call_next):
     response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
     return response
 
+# Request Metrics Middleware
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_SECONDS.labels(request.method, route, "500").observe(time.perf_counter() - started)
+        raise
+    # Route template (not the raw path) keeps label cardinality bounded
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.HTTP_SECONDS.labels(request.method, route, str(response.status_code)).observe(
+        time.perf_counter() - started)
+    return response
+
+# Tracing Middleware (outermost: covers the other middlewares too)
+span_exporter = tracing.build_exporter(settings)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not settings.TRACING_ENABLED:
+        return await call_next(request)
+    request_id = tracing.new_request_id(request.headers.get("X-Request-ID"))
+    with tracing.trace_request(request_id, f"{request.method} {request.url.path}") as (trace, root):
+        response = await call_next(request)
+        route = getattr(request.scope.get("route"), "path", None)
+        if route:
+            root.name = f"{request.method} {route}"
+        root.attributes.update({"http.method": request.method, "http.route": route or "",
+                                "http.status_code": response.status_code})
+    response.headers["X-Request-ID"] = request_id
+    response.headers["Server-Timing"] = tracing.server_timing(trace)
+    if span_exporter:
+        span_exporter.export(trace)
+    return response
+
 # Global Exception Handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -92,7 +202,47 @@ os.makedirs(GENERATED_DIR, exist_ok=True)
 GEMINI_API_KEY = settings.GEMINI_API_KEY
 extractor = DataExtractor()
 intelligence = IntelligenceService(api_key=GEMINI_API_KEY)
-builder = PPTXBuilder()
+deck_store = DeckStore(settings.DECKS_DIR)
+_builder = None
+
+# CPU-bound rendering runs in worker processes (RENDER_WORKERS=0: API process threads)
+_render_workers = default_workers() if settings.RENDER_WORKERS is None else settings.RENDER_WORKERS
+render_pool = RenderPool(_render_workers, settings.RENDER_MAX_JOBS_PER_WORKER) if _render_workers else None
+
+def get_builder():
+    """PPTXBuilder, importing python-pptx on first use."""
+    global _builder
+    if _builder is None:
+        from services.pptx_builder import PPTXBuilder
+        _builder = PPTXBuilder()
+    return _builder
+
+def warm_up():
+    """
+    Load the heavy dependencies (pandas, python-docx, python-pptx,
+    google-genai) and create the Gemini client ahead of traffic. Runs at
+    startup per settings.WARM_UP, or by hand: python -c "import main; main.warm_up()"
+    """
+    started = time.perf_counter()
+    extractor.warm_up()
+    get_builder().warm_up()
+    if render_pool:
+        render_pool.start()
+    intelligence.warm_up()
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+async def _warm_connections(warm_up_thread: threading.Thread | None = None):
+    """
+    Open Gemini API connections before traffic arrives. Runs on the serving
+    event loop, which the pooled connections belong to, once the client
+    has been built by warm_up().
+    """
+    if warm_up_thread:
+        await asyncio.to_thread(warm_up_thread.join)
+    try:
+        await intelligence.warm_connections()
+    except Exception:
+        logger.warning("Connection warm-up failed", exc_info=True)
 
 logger.info("Backend v2.0 initialized")
 logger.info(f"Gemini AI: {'ENABLED' if GEMINI_API_KEY else 'MOCK MODE (no API key)'}")
@@ -151,6 +301,242 @@ def generate_smart_filename(original_filenames: list, ai_title: str) -> str:
         result = "SmartDeck_Presentation.pptx"
     return result
 
+# =========================================================================
+# Pipeline Stages
+# =========================================================================
+
+def _save_upload(upload: UploadFile, file_path: str) -> None:
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+
+def _read_text(path: str | None) -> str | None:
+    """A saved text (e.g. a session's extracted text), or None if there is none."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def _write_text(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def _extract_file(file_path: str, filename: str) -> str:
+    """Extract text from a saved upload, recording size and timing."""
+    file_type = metrics.file_type(filename, settings.ALLOWED_EXTENSIONS)
+    metrics.UPLOAD_BYTES.labels(file_type).observe(os.path.getsize(file_path))
+    started = time.perf_counter()
+    with tracing.span("extract", file_type=file_type):
+        text = extractor.extract(file_path)
+    metrics.EXTRACTION_SECONDS.labels(file_type).observe(time.perf_counter() - started)
+    metrics.EXTRACTED_CHARS.labels(file_type).observe(len(text))
+    return text
+
+async def _render(structure_json: dict, internal_filename: str, theme: str, fragment_dir: str | None = None) -> str:
+    """
+    Build the PPTX off the event loop, recording render time and output size.
+    With `fragment_dir`, slides unchanged since the deck's last render are reused.
+    """
+    started = time.perf_counter()
+    output_path = os.path.join(GENERATED_DIR, internal_filename)
+    with tracing.span("render", theme=theme, slides=len(structure_json.get("slides", []))) as span:
+        if render_pool:
+            result = await render_pool.render(structure_json, output_path, theme, fragment_dir)
+            metrics.RENDER_QUEUE_SECONDS.observe(result.queue_seconds)
+            counts = {"rendered": result.rendered, "reused": result.reused, "cache_hits": result.cache_hits,
+                      "bytes": result.bytes}
+            meta = {"render.pid": result.pid, "render.queue_ms": round(result.queue_seconds * 1000, 1)}
+        else:
+            counts = await asyncio.to_thread(render_to_path, structure_json, output_path, theme, fragment_dir)
+            meta = {}
+        if span:
+            span.attributes.update(meta)
+            span.attributes.update({"render.rendered": counts["rendered"], "render.reused": counts["reused"]})
+    metrics.SLIDE_FRAGMENTS.labels("hit").inc(counts["cache_hits"])
+    metrics.SLIDE_FRAGMENTS.labels("deck").inc(counts["reused"] - counts["cache_hits"])
+    metrics.SLIDE_FRAGMENTS.labels("miss").inc(counts["rendered"])
+    metrics.RENDER_SECONDS.observe(time.perf_counter() - started)
+    metrics.OUTPUT_BYTES.observe(counts["bytes"])
+    return output_path
+
+def _charge(request: Request, base: float, input_bytes: int = 0, llm_chars: int = 0,
+            sub_key: str | None = None):
+    """
+    Charge the caller's bucket for a request's estimated work (429 when empty).
+    sub_key ("session:<id>", "deck:<id>") is charged as well, as an extra
+    limit on one session or deck, never instead of the caller's bucket.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    cost = limiter.cost(base, input_bytes=input_bytes, llm_tokens=estimate_tokens(llm_chars))
+    metrics.RATE_LIMIT_UNITS.labels(request.url.path).observe(cost)
+    limiter.check(limiter.client_key(request), cost)
+    if sub_key:
+        limiter.check(sub_key, cost)
+
+@asynccontextmanager
+async def _generation_slot(request: Request):
+    """Wait for a generation slot; interactive requests go before batch ones."""
+    priority = request_priority(request)
+    started = time.perf_counter()
+    with tracing.span("admission", priority=priority):
+        await generation_gate.acquire(priority, settings.GENERATION_QUEUE_TIMEOUT_SECONDS)
+    metrics.ADMISSION_WAIT_SECONDS.labels(priority).observe(time.perf_counter() - started)
+    try:
+        yield
+    finally:
+        generation_gate.release()
+
+async def _generate_once(request: Request, kind: str, text: str, style: str, theme: str,
+                         sid: str, structure) -> tuple:
+    """
+    Structure and render a deck once for concurrent identical requests
+    (same normalized input, style and theme). `structure(on_outline)` is
+    the LLM call; only the first request's runs, rendering under its `sid`.
+    Returns (structure_json, pptx_path, rendered_sid), shared by every
+    coalesced request.
+    """
+    async def work():
+        skeleton = []
+
+        def on_outline(skeleton_deck: dict):
+            # Outline pipeline: render the skeleton while the slides are
+            # written, so the finished slides it already has are reused
+            skeleton.append(asyncio.create_task(_render_skeleton(skeleton_deck, sid, theme)))
+
+        async with _generation_slot(request):
+            structure_json = await structure(on_outline)
+            if skeleton:
+                await skeleton[0]
+            pptx_path = await _render(structure_json, f"SmartDeck_{sid}.pptx", theme, deck_store.fragment_dir(sid))
+        return structure_json, pptx_path, sid
+
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await work()
+    key = flight_key(kind, text, style, theme)
+    if not flights.running(key):
+        return await flights.run(key, work, settings.SINGLE_FLIGHT_TIMEOUT_SECONDS, kind=kind)
+    # The leader's llm/render spans belong to its own trace; ours shows the wait
+    with tracing.span("coalesced", kind=kind):
+        return await flights.run(key, work, settings.SINGLE_FLIGHT_TIMEOUT_SECONDS, kind=kind)
+
+async def _render_skeleton(skeleton_deck: dict, sid: str, theme: str):
+    """Render an outline's skeleton into the deck's fragment store (the file itself is dropped)."""
+    try:
+        path = await _render(skeleton_deck, f"SmartDeck_{sid}_skeleton.pptx", theme, deck_store.fragment_dir(sid))
+        await asyncio.to_thread(os.remove, path)
+    except Exception:
+        logger.warning(f"Skeleton render failed for {sid}", exc_info=True)
+
+def _adopt_fragments(rendered_sid: str, sid: str):
+    """Give a coalesced request's deck the fragments rendered for the shared one."""
+    source = deck_store.fragment_dir(rendered_sid)
+    if rendered_sid != sid and os.path.isdir(source):
+        shutil.copytree(source, deck_store.fragment_dir(sid), dirs_exist_ok=True)
+
+def _notes_status() -> str:
+    """Speaker-notes status of a deck just generated."""
+    return "pending" if intelligence.deferred_notes else "ready"
+
+def _deck_lock(deck_id: str) -> asyncio.Lock:
+    lock = DECK_LOCKS.get(deck_id)
+    if lock is None:
+        lock = DECK_LOCKS[deck_id] = asyncio.Lock()
+    return lock
+
+def _defer_notes(background_tasks: BackgroundTasks, record: dict, source_text: str):
+    """Write the speaker notes of a deck generated without them after the response is sent."""
+    if record["notes_status"] != "pending":
+        return
+    NOTES_READY[record["deck_id"]] = asyncio.Event()
+    background_tasks.add_task(_enrich_notes, record["deck_id"], source_text, time.perf_counter())
+
+async def _enrich_notes(deck_id: str, source_text: str, started: float):
+    """
+    Background task: one notes call for the whole deck, then the notes are
+    patched into the stored deck and its PPTX (no slide is re-rendered).
+    Coalesced requests got identical decks, so they share the call too.
+    Slides edited in the meantime keep what the user gave them.
+    """
+    record = deck_store.load(deck_id)
+    deck, style = copy.deepcopy(record["deck"]), record["style"]
+    key = flight_key("notes", json.dumps(deck, sort_keys=True, ensure_ascii=False), style)
+    try:
+        notes = await flights.run(key, lambda: intelligence.write_speaker_notes(deck, source_text, style),
+                                  settings.SINGLE_FLIGHT_TIMEOUT_SECONDS, kind="notes")
+        status = "ready"
+    except Exception:
+        logger.exception(f"Deferred speaker notes failed for deck {deck_id}")
+        notes, status = [], "failed"
+
+    # Merge into the deck as it is now, not as it was when the call started
+    async with _deck_lock(deck_id):
+        record = deck_store.load(deck_id)
+        slides = record["deck"].get("slides", [])
+        rendered = copy.deepcopy(slides)
+        patch = {i: text for i, text in enumerate(notes)
+                 if text and i < len(slides) and i < len(deck["slides"]) and slides[i] == deck["slides"][i]}
+        for index, text in patch.items():
+            slides[index]["speaker_notes"] = text
+        if patch:
+            record["version"] += 1
+            pptx_path = os.path.join(GENERATED_DIR, f"SmartDeck_{deck_id}.pptx")
+            try:
+                await asyncio.to_thread(patch_notes_to_path, rendered, patch, pptx_path, record["theme"],
+                                        deck_store.fragment_dir(deck_id))
+            except Exception:
+                logger.warning(f"Patching notes into {pptx_path} failed; re-rendering the deck", exc_info=True)
+                await _render(record["deck"], f"SmartDeck_{deck_id}.pptx", record["theme"],
+                              deck_store.fragment_dir(deck_id))
+        record["notes_status"] = status
+        deck_store.save(record)
+    metrics.DEFERRED_NOTES_SECONDS.labels(status).observe(time.perf_counter() - started)
+    logger.info(f"Speaker notes {status} for deck {deck_id}: {len(patch)} slides")
+    event = NOTES_READY.pop(deck_id, None)
+    if event:
+        event.set()
+
+def _upload_size(file: UploadFile) -> int:
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+# =========================================================================
+# Sessions
+# =========================================================================
+
+def _open_session(session_id: str) -> str:
+    """Register an analyzed session and return its token, dropping the oldest beyond the limit."""
+    while len(ACTIVE_SESSIONS) >= settings.MAX_ACTIVE_SESSIONS:
+        oldest = next(iter(ACTIVE_SESSIONS))
+        del ACTIVE_SESSIONS[oldest]
+        SESSION_SUMMARIES.pop(oldest, None)
+    session_token = secrets.token_urlsafe(32)
+    ACTIVE_SESSIONS[session_id] = session_token
+    metrics.ACTIVE_SESSIONS.set(len(ACTIVE_SESSIONS))
+    return session_token
+
+
+def _validate_session(session_id: str, session_token: str | None):
+    """Strict token validation for a previously analyzed session."""
+    if session_id not in ACTIVE_SESSIONS:
+        raise HTTPException(status_code=403, detail="Sesión expirada o inválida. Por favor sube tus archivos de nuevo.")
+
+    if ACTIVE_SESSIONS[session_id] != session_token:
+        logger.warning(f"Session hijack attempt? {session_id} token mismatch")
+        raise HTTPException(status_code=403, detail="Token de sesión inválido.")
+
+
+async def _summarize_session(session_id: str, text: str):
+    """Background task: fetch the Gemini summary for an analyzed session."""
+    summary = await intelligence.summarize_with_llm(text)
+    if session_id not in ACTIVE_SESSIONS:
+        return  # dropped while the summary was running
+    SESSION_SUMMARIES[session_id] = {
+        "status": "ready" if summary else "failed",
+        "summary": summary,
+    }
+
 # =========================================================================
 # API Endpoints
 # =========================================================================
@@ -164,6 +550,26 @@ def read_root():
         "version": "2.0.0"
     }
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics for the whole generation pipeline"""
+    payload, content_type = metrics.render_latest()
+    return Response(content=payload, media_type=content_type)
+
+@app.get("/render-pool")
+def get_render_pool_stats():
+    """Render worker pool statistics"""
+    if not render_pool:
+        return {"enabled": False}
+    return {"enabled": True, **render_pool.stats()}
+
+@app.get("/semantic-cache")
+def get_semantic_cache_stats():
+    """Semantic prompt cache statistics: hit rate and reported false positives"""
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **semantic_cache.snapshot()}
+
 @app.get("/themes")
 def list_themes():
     """Return all available design themes"""
@@ -180,8 +586,11 @@ def list_styles():
 # -------------------------------------------------------------------------
 
 @app.post("/analyze")
-@limiter.limit(settings.RATE_LIMIT_ANALYZE)
-async def analyze_content(request: Request, files: List[UploadFile] = File(...)):
+async def analyze_content(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    files: Annotated[list[UploadFile], File()],
+):
     """
     Upload files, extract text, and analyze content type.
     Returns style suggestions based on content.
@@ -214,9 +623,7 @@ async def analyze_content(request: Request, files: List[UploadFile] = File(...))
             )
         
         # Check Size
-        file.file.seek(0, 2)
-        size = file.file.tell()
-        file.file.seek(0)
+        size = _upload_size(file)
         
         if size > settings.MAX_FILE_SIZE:
              logger.warning(f"Rejected file {file.filename} (size: {size} bytes > {settings.MAX_FILE_SIZE})")
@@ -233,6 +640,8 @@ async def analyze_content(request: Request, files: List[UploadFile] = File(...))
             detail=f"Total upload size exceeds {settings.MAX_TOTAL_UPLOAD_SIZE / (1024 * 1024):.0f}MB limit."
         )
 
+    _charge(request, settings.RATE_LIMIT_COST_ANALYZE, input_bytes=total_upload_size)
+
     all_text = ""
     session_id = str(uuid.uuid4())
     logger.info(f"Starting analysis for session {session_id} with {len(files)} files")
@@ -240,9 +649,9 @@ async def analyze_content(request: Request, files: List[UploadFile] = File(...))
     for file in files:
         file_path = os.path.join(UPLOAD_DIR, f"{session_id}_{file.filename}")
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            extracted_text = extractor.extract(file_path)
+            with tracing.span("upload.copy", file=file.filename):
+                await asyncio.to_thread(_save_upload, file, file_path)
+            extracted_text = await asyncio.to_thread(_extract_file, file_path, file.filename)
             all_text += f"\n\n--- Source: {file.filename} ---\n{extracted_text}"
         except Exception as e:
             logger.error(f"Error processing {file.filename}: {e}", exc_info=True)
@@ -251,33 +660,52 @@ async def analyze_content(request: Request, files: List[UploadFile] = File(...))
     if not all_text:
         raise HTTPException(status_code=400, detail="No text could be extracted.")
 
-    # Detect content type and suggest styles
+    # Detect content type and suggest styles (local, no API round trip)
     logger.info("Detecting content type...")
     analysis = intelligence.detect_content_type(all_text)
 
     # Save extracted text in session for later use
     session_path = os.path.join(UPLOAD_DIR, f"{session_id}_extracted.txt")
-    with open(session_path, "w", encoding="utf-8") as f:
-        f.write(all_text)
+    await asyncio.to_thread(_write_text, session_path, all_text)
 
     # Create Session Token
-    session_token = secrets.token_urlsafe(32)
-    ACTIVE_SESSIONS[session_id] = session_token
+    session_token = _open_session(session_id)
+
+    # Optional AI summary, fetched after the response is sent
+    summary_status = "local"
+    if settings.ANALYZE_LLM_SUMMARY and GEMINI_API_KEY:
+        SESSION_SUMMARIES[session_id] = {"status": "pending", "summary": ""}
+        background_tasks.add_task(_summarize_session, session_id, all_text)
+        summary_status = "pending"
     
     return {
         "session_id": session_id,
         "session_token": session_token,
         "filenames": original_filenames,
         "summary": analysis["summary"],
+        "summary_status": summary_status,
         "suggested_styles": analysis["suggested_styles"],
         "text_preview": all_text[:500] + "..." if len(all_text) > 500 else all_text
     }
 
 
+@app.get("/analyze/{session_id}/summary")
+async def get_analysis_summary(session_id: str, session_token: str | None = None):
+    """
+    Poll for the background AI summary of an analyzed session.
+    Status is "pending", "ready", "failed" or "local" (no AI summary requested).
+    """
+    _validate_session(session_id, session_token)
+    entry = SESSION_SUMMARIES.get(session_id)
+    if entry is None:
+        return {"status": "local", "summary": ""}
+    return entry
+
+
 @app.post("/generate")
-@limiter.limit(settings.RATE_LIMIT_GENERATE)
 async def generate_presentation(
     request: Request,
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(None),
     theme: Optional[str] = Form("corporate_navy"),
     style: Optional[str] = Form("executive"),
@@ -288,60 +716,75 @@ async def generate_presentation(
     Generate presentation from uploaded files.
     If session_id is provided, uses previously analyzed text.
     """
-    sid = session_id or str(uuid.uuid4())
+    # Every deck gets its own id: a session can be generated from many times
+    sid = str(uuid.uuid4())
     all_text = ""
+    source_path = None
     original_filenames = []
 
     # Try to load from previous session
     if session_id:
         # Strict Token Validation
-        if session_id not in ACTIVE_SESSIONS:
-            raise HTTPException(status_code=403, detail="Sesión expirada o inválida. Por favor sube tus archivos de nuevo.")
-        
-        if ACTIVE_SESSIONS[session_id] != session_token:
-            logger.warning(f"Session hijack attempt? {session_id} token mismatch")
-            raise HTTPException(status_code=403, detail="Token de sesión inválido.")
+        _validate_session(session_id, session_token)
         
         session_path = os.path.join(UPLOAD_DIR, f"{session_id}_extracted.txt")
-        if os.path.exists(session_path):
-            with open(session_path, "r", encoding="utf-8") as f:
-                all_text = f.read()
+        saved_text = await asyncio.to_thread(_read_text, session_path)
+        if saved_text is not None:
+            all_text = saved_text
+            source_path = session_path
             logger.info(f"Loaded text from session {session_id}")
 
+    # Charge by the work ahead: extracted text is already known for a
+    # session; for fresh uploads the raw size stands in for both
+    if all_text:
+        _charge(request, settings.RATE_LIMIT_COST_GENERATE, llm_chars=len(all_text), sub_key=f"session:{session_id}")
+    else:
+        upload_bytes = sum(_upload_size(file) for file in files or [])
+        _charge(request, settings.RATE_LIMIT_COST_GENERATE, input_bytes=upload_bytes,
+                llm_chars=upload_bytes)
+
     # If no session text, process uploaded files
     if not all_text and files:
-        for file in files:
-            original_filenames.append(file.filename or "untitled")
-            file_path = os.path.join(UPLOAD_DIR, f"{sid}_{file.filename}")
-            try:
-                with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
-                extracted_text = extractor.extract(file_path)
-                all_text += f"\n\n--- Source: {file.filename} ---\n{extracted_text}"
-            except Exception as e:
-                logger.error(f"Error processing {file.filename}: {e}")
-                continue
+        async with _generation_slot(request):
+            for file in files:
+                original_filenames.append(file.filename or "untitled")
+                file_path = os.path.join(UPLOAD_DIR, f"{sid}_{file.filename}")
+                try:
+                    with tracing.span("upload.copy", file=file.filename):
+                        await asyncio.to_thread(_save_upload, file, file_path)
+                    extracted_text = await asyncio.to_thread(_extract_file, file_path, file.filename)
+                    all_text += f"\n\n--- Source: {file.filename} ---\n{extracted_text}"
+                except Exception:
+                    logger.exception(f"Error processing {file.filename}")
+                    continue
 
     if not all_text:
         raise HTTPException(status_code=400, detail="No text available. Upload files or provide a session_id.")
 
-    # Analyze with selected style
-    logger.info(f"Analyzing text (style: {style})...")
-    structure_json = intelligence.analyze_and_structure(all_text, style_id=style)
+    # Analyze with selected style and build the PPTX (shared by identical requests in flight)
+    logger.info(f"Analyzing text (style: {style}, theme: {theme})...")
+    structure_json, pptx_path, rendered_sid = await _generate_once(
+        request, "analyze", all_text, style, theme, sid,
+        lambda on_outline: intelligence.analyze_and_structure(all_text, style_id=style, on_outline=on_outline))
 
     # Generate smart filename
     ai_title = structure_json.get("presentation_title", "")
     smart_name = generate_smart_filename(original_filenames, ai_title)
 
-    # Build PPTX
-    logger.info(f"Building PPTX (theme: {theme}, style: {style})...")
-    internal_filename = f"SmartDeck_{sid}.pptx"
-    pptx_path = builder.build(structure_json, internal_filename, theme_id=theme)
+    # Keep the deck (and the text it came from) for slide-level edits
+    if source_path is None:
+        source_path = os.path.join(UPLOAD_DIR, f"{sid}_extracted.txt")
+        await asyncio.to_thread(_write_text, source_path, all_text)
+    record = deck_store.create(sid, structure_json, theme, style, smart_name, source_path=source_path,
+                               notes_status=_notes_status())
+    await asyncio.to_thread(_adopt_fragments, rendered_sid, sid)
+    _defer_notes(background_tasks, record, all_text)
 
     return FileResponse(
         path=pptx_path,
         filename=smart_name,
-        media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation'
+        media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        headers=_deck_headers(record),
     )
 
 
@@ -349,40 +792,225 @@ async def generate_presentation(
 # MODE 2: Generate from prompt/context
 # -------------------------------------------------------------------------
 
+def _cache_scope(request: Request, style: str) -> str:
+    """Semantic-cache scope: the style, per caller (API key or client address, hashed for the audit log)."""
+    caller = hashlib.sha256(limiter.client_key(request).encode("utf-8")).hexdigest()[:16]
+    return f"{style}:{caller}"
+
 @app.post("/generate-from-prompt")
-@limiter.limit(settings.RATE_LIMIT_GENERATE)
 async def generate_from_prompt(
     request: Request,
+    background_tasks: BackgroundTasks,
     prompt: str = Form(...),
     theme: Optional[str] = Form("corporate_navy"),
     style: Optional[str] = Form("executive"),
+    no_cache: bool = Form(False),
 ):
     """
     Generate a presentation from a text prompt/context.
-    No file upload required.
+    No file upload required. With the semantic cache on, a near-duplicate
+    of an earlier prompt (same caller and style) is served that prompt's deck;
+    `no_cache` always calls the LLM.
     """
     if not prompt or len(prompt.strip()) < 10:
         raise HTTPException(status_code=400, detail="Prompt must be at least 10 characters.")
 
-    logger.info(f"Prompt generation request (style: {style})...")
-    structure_json = intelligence.generate_from_prompt(prompt, style_id=style)
+    hit = None
+    cache_scope = _cache_scope(request, style)
+    if settings.SEMANTIC_CACHE_ENABLED and not no_cache:
+        with tracing.span("semantic_cache"):
+            hit = semantic_cache.lookup(prompt, scope=cache_scope)
+    sid = str(uuid.uuid4())
+    if hit:
+        _charge(request, settings.RATE_LIMIT_COST_RENDER)
+        logger.info(f"Prompt generation served from the semantic cache (similarity {hit.similarity})")
+        structure_json = copy.deepcopy(hit.deck)
+        pptx_path = await _render(structure_json, f"SmartDeck_{sid}.pptx", theme, deck_store.fragment_dir(sid))
+        rendered_sid = sid
+    else:
+        _charge(request, settings.RATE_LIMIT_COST_GENERATE, llm_chars=len(prompt))
+        logger.info(f"Prompt generation request (style: {style}, theme: {theme})...")
+        structure_json, pptx_path, rendered_sid = await _generate_once(
+            request, "prompt", prompt, style, theme, sid,
+            lambda on_outline: intelligence.generate_from_prompt(prompt, style_id=style, on_outline=on_outline))
+        if settings.SEMANTIC_CACHE_ENABLED and not intelligence.is_fallback(structure_json):
+            semantic_cache.store(prompt, structure_json, scope=cache_scope)
 
     # Use AI title for filename
     ai_title = structure_json.get("presentation_title", "Prompt_Presentation")
     smart_name = f"SmartDeck_{_sanitize_for_filename(ai_title)}.pptx"
 
-    # Build PPTX
-    logger.info(f"Building PPTX from prompt (theme: {theme}, style: {style})...")
-    sid = str(uuid.uuid4())
-    internal_filename = f"SmartDeck_{sid}.pptx"
-    pptx_path = builder.build(structure_json, internal_filename, theme_id=theme)
+    record = deck_store.create(sid, structure_json, theme, style, smart_name, prompt=prompt,
+                               notes_status=_notes_status(),
+                               cache_hit={"entry_id": hit.entry_id, "similarity": hit.similarity} if hit else None)
+    await asyncio.to_thread(_adopt_fragments, rendered_sid, sid)
+    _defer_notes(background_tasks, record, prompt)
 
+    headers = _deck_headers(record)
+    if hit and settings.SEMANTIC_CACHE_FLAG_HITS:
+        headers["X-Semantic-Cache"] = f"hit; similarity={hit.similarity}"
     return FileResponse(
         path=pptx_path,
         filename=smart_name,
-        media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation'
+        media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        headers=headers,
+    )
+
+
+# -------------------------------------------------------------------------
+# MODE 3: Edit a generated deck slide by slide
+# -------------------------------------------------------------------------
+
+def _deck_headers(record: dict) -> dict:
+    return {"X-Deck-ID": record["deck_id"], "X-Deck-Token": record["token"],
+            "X-Notes-Status": record.get("notes_status", "ready")}
+
+def _load_deck(deck_id: str, deck_token: str | None) -> dict:
+    """Stored deck, after checking its access token."""
+    record = deck_store.load(deck_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Presentación no encontrada.")
+    if not deck_token or not secrets.compare_digest(record["token"], deck_token):
+        raise HTTPException(status_code=403, detail="Token de presentación inválido.")
+    return record
+
+def _slide_index(record: dict, index: int) -> int:
+    if not 0 <= index < len(record["deck"].get("slides", [])):
+        raise HTTPException(status_code=404, detail=f"Slide {index} no existe.")
+    return index
+
+async def _render_deck(record: dict) -> FileResponse:
+    """
+    Save a changed deck and re-render it; only changed slides are rebuilt.
+    Call it holding the deck's lock, with the record loaded under it.
+    """
+    record["version"] += 1
+    deck_store.save(record)
+    deck_id = record["deck_id"]
+    pptx_path = await _render(record["deck"], f"SmartDeck_{deck_id}.pptx", record["theme"],
+                              deck_store.fragment_dir(deck_id))
+    return FileResponse(
+        path=pptx_path,
+        filename=record["filename"],
+        media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        headers={**_deck_headers(record), "X-Deck-Version": str(record["version"])},
     )
 
+@app.get("/decks/{deck_id}")
+def get_deck(deck_id: str, deck_token: str | None = None):
+    """Slide JSON of a generated deck"""
+    record = _load_deck(deck_id, deck_token)
+    return {"deck_id": deck_id, "version": record["version"], "theme": record["theme"],
+            "style": record["style"], "notes_status": record.get("notes_status", "ready"),
+            "deck": record["deck"]}
+
+@app.get("/decks/{deck_id}/notes")
+async def get_deck_notes(deck_id: str, deck_token: str | None = None, wait: float = 0):
+    """
+    Status of a deck's deferred speaker notes: "pending", "ready" or "failed".
+    With `wait` (seconds, at most NOTES_WAIT_MAX_SECONDS) a pending request
+    is held until the notes are in, so clients need not poll; then fetch
+    GET /decks/{deck_id}/pptx.
+    """
+    record = _load_deck(deck_id, deck_token)
+    event = NOTES_READY.get(deck_id)
+    if record.get("notes_status") == "pending" and event and wait > 0:
+        try:
+            await asyncio.wait_for(event.wait(), min(wait, settings.NOTES_WAIT_MAX_SECONDS))
+        except TimeoutError:
+            pass
+        record = _load_deck(deck_id, deck_token)
+    return {"deck_id": deck_id, "status": record.get("notes_status", "ready"), "version": record["version"]}
+
+@app.get("/decks/{deck_id}/pptx")
+async def download_deck(request: Request, deck_id: str, deck_token: str | None = None):
+    """Current PPTX of a stored deck, e.g. once its deferred speaker notes are in."""
+    record = _load_deck(deck_id, deck_token)
+    pptx_path = os.path.join(GENERATED_DIR, f"SmartDeck_{deck_id}.pptx")
+    if not await asyncio.to_thread(os.path.exists, pptx_path):
+        # Coalesced requests were served the shared file: render this deck's own
+        _charge(request, settings.RATE_LIMIT_COST_RENDER, sub_key=f"deck:{deck_id}")
+        pptx_path = await _render(record["deck"], f"SmartDeck_{deck_id}.pptx", record["theme"],
+                                  deck_store.fragment_dir(deck_id))
+    return FileResponse(
+        path=pptx_path,
+        filename=record["filename"],
+        media_type='application/vnd.openxmlformats-officedocument.presentationml.presentation',
+        headers={**_deck_headers(record), "X-Deck-Version": str(record["version"])},
+    )
+
+@app.post("/decks/{deck_id}/cache-report")
+def report_cache_hit(deck_id: str, deck_token: str = Form(...)):
+    """
+    The deck served from the semantic cache does not fit its prompt: the hit
+    is logged as a false positive and not served for that prompt again
+    (generate it anew with `no_cache`).
+    """
+    record = _load_deck(deck_id, deck_token)
+    if not record.get("cache_hit"):
+        raise HTTPException(status_code=404, detail="Esta presentación no proviene de la caché.")
+    semantic_cache.report_false_positive(record["cache_hit"]["entry_id"], record.get("prompt") or "")
+    return {"deck_id": deck_id, "reported": True}
+
+@app.post("/decks/{deck_id}/slides/{index}/regenerate")
+async def regenerate_slide(
+    request: Request,
+    deck_id: str,
+    index: int,
+    deck_token: str = Form(...),
+    instruction: str | None = Form(""),
+):
+    """
+    Rewrite one slide with the LLM (optionally following `instruction`)
+    and return the re-rendered deck.
+    """
+    record = _load_deck(deck_id, deck_token)
+    _slide_index(record, index)
+    _charge(request, settings.RATE_LIMIT_COST_SLIDE,
+            llm_chars=settings.REGENERATE_SOURCE_CHARS + len(instruction or ""), sub_key=f"deck:{deck_id}")
+
+    source_text = await asyncio.to_thread(_read_text, record.get("source_path"))
+    if source_text is None:
+        source_text = record.get("prompt") or ""
+
+    async with _generation_slot(request):
+        try:
+            slide = await intelligence.regenerate_slide(record["deck"], index, instruction or "",
+                                                        source_text, style_id=record["style"])
+        except Exception:
+            logger.exception(f"Slide regeneration failed for deck {deck_id}")
+            raise HTTPException(status_code=502, detail="No se pudo regenerar la slide. Intenta de nuevo.")
+        # The deck may have changed during the call (notes, edits): replace
+        # just this slide in its current version
+        async with _deck_lock(deck_id):
+            record = _load_deck(deck_id, deck_token)
+            record["deck"]["slides"][_slide_index(record, index)] = slide
+            return await _render_deck(record)
+
+@app.put("/decks/{deck_id}/slides/{index}")
+async def edit_slide(request: Request, deck_id: str, index: int, slide: Annotated[dict, Body()],
+                     deck_token: str | None = None):
+    """Replace one slide with client-edited JSON and return the re-rendered deck."""
+    async with _deck_lock(deck_id):
+        record = _load_deck(deck_id, deck_token)
+        _slide_index(record, index)
+        normalized, error = validate_slide(slide)
+        if error:
+            raise HTTPException(status_code=422, detail=f"Slide inválida: {error}")
+        _charge(request, settings.RATE_LIMIT_COST_RENDER, sub_key=f"deck:{deck_id}")
+        record["deck"]["slides"][index] = normalized
+        return await _render_deck(record)
+
+@app.post("/decks/{deck_id}/render")
+async def rerender_deck(request: Request, deck_id: str, deck_token: str = Form(...),
+                        theme: str = Form(...)):
+    """Re-render a stored deck in another theme (no LLM call)."""
+    async with _deck_lock(deck_id):
+        record = _load_deck(deck_id, deck_token)
+        _charge(request, settings.RATE_LIMIT_COST_RENDER, sub_key=f"deck:{deck_id}")
+        record["theme"] = theme
+        return await _render_deck(record)
+
 
 if __name__ == "__main__":
     import uvicorn
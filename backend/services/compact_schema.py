@@ -0,0 +1,173 @@
+"""
+Compact Wire Schema for SmartDeck AI
+
+Generation latency is dominated by output tokens, and the verbose slide
+schema repeats long keys (bullet_points, speaker_notes, left_points, ...)
+on every slide. The model emits this compact form instead and it is
+expanded locally into the dicts PPTXBuilder consumes:
+- Deck: {"t": presentation title, "s": [slides]}
+- Slide: "k" slide type (short names), "h" title, "u" subtitle,
+  "b" bullets, "n" speaker notes, "lh"/"rh" column titles, "l"/"r"
+  column points, "f" the focus of an outline entry
+- Metrics are positional triples: "m": [[value, label, change], ...]
+- Expansion passes verbose slides through unchanged, so either form (or
+  a mix, e.g. from a salvaged response) is accepted
+"""
+from typing import Literal
+
+from pydantic import BaseModel
+
+# Heading of the compact spec; the offline simulator answers in the
+# compact form when it sees it in the prompt
+COMPACT_MARKER = "=== COMPACT OUTPUT FORMAT ==="
+
+TYPE_CODES = {
+    "title_slide": "title",
+    "executive_summary": "summary",
+    "metrics_slide": "metrics",
+    "content_slide": "content",
+    "two_column": "compare",
+    "section_divider": "section",
+    "challenges_slide": "risks",
+}
+_TYPES_BY_CODE = {code: slide_type for slide_type, code in TYPE_CODES.items()}
+
+# Verbose slide key -> compact key ("metrics" is handled separately)
+_KEYS = {
+    "title": "h",
+    "subtitle": "u",
+    "bullet_points": "b",
+    "speaker_notes": "n",
+    "left_title": "lh",
+    "right_title": "rh",
+    "left_points": "l",
+    "right_points": "r",
+    "focus": "f",
+}
+_VERBOSE_KEYS = {short: key for key, short in _KEYS.items()}
+
+COMPACT_SLIDE_TYPES_SPEC = f"""
+    {COMPACT_MARKER}
+
+    Slides use SHORT KEYS to save output. Keys per slide:
+    "k" slide type, "h" title, "u" subtitle, "b" bullet points, "n" speaker notes,
+    "m" metrics as [value, label, change] triples,
+    "lh"/"rh" left/right column titles, "l"/"r" left/right column points.
+
+    === AVAILABLE SLIDE TYPES (use at least 4 different types) ===
+
+    "title" (exactly once, as first slide): {{"k": "title", "h": "The Big Headline Insight", "u": "Supporting context line"}}
+
+    "summary" (key takeaways, 3-4 bullets in card layout):
+    {{"k": "summary", "h": "Revenue Exceeded All Targets in Q4", "b": ["Short insight 1", "Short insight 2", "Short insight 3"], "n": "talking points"}}
+
+    "metrics" (KPIs as big-number cards):
+    {{"k": "metrics", "h": "Key Performance Indicators Beat Targets", "m": [["$6.6M", "Total Revenue", "+75% YoY"], ["95%", "Customer Retention", "+2pts vs Q3"]], "n": "talking points"}}
+
+    "content" (standard bullets for analysis):
+    {{"k": "content", "h": "Action-Oriented Insight Title", "b": ["Insight with data", "Another with context"], "n": "talking points"}}
+
+    "compare" (before/after, pros/cons, comparison):
+    {{"k": "compare", "h": "Strengths Outweigh Challenges", "lh": "Strengths", "rh": "Challenges", "l": ["Point A", "Point B"], "r": ["Challenge 1", "Challenge 2"], "n": "talking points"}}
+
+    "section" (bold transition between sections): {{"k": "section", "h": "Strategic Recommendations", "u": "Actionable next steps"}}
+
+    "risks" (risks/challenges with warning style):
+    {{"k": "risks", "h": "Three Risks Require Immediate Attention", "b": ["Risk 1 with specifics", "Risk 2 with impact"], "n": "talking points"}}
+    """
+
+
+class CompactSlide(BaseModel):
+    """One flat model for every kind: a much smaller response schema than the verbose Union."""
+    k: Literal["title", "summary", "metrics", "content", "compare", "section", "risks"]
+    h: str
+    u: str = ""
+    b: list[str] = []
+    n: str = ""
+    m: list[list[str]] = []
+    lh: str = ""
+    rh: str = ""
+    l: list[str] = []
+    r: list[str] = []
+
+
+class CompactDeckSchema(BaseModel):
+    t: str
+    s: list[CompactSlide]
+
+
+class CompactSlidesSchema(BaseModel):
+    """Compact response schema for repair and single-slide calls."""
+    s: list[CompactSlide]
+
+
+class CompactOutlineEntry(BaseModel):
+    k: Literal["title", "summary", "metrics", "content", "compare", "section", "risks"]
+    h: str
+    u: str = ""
+    f: str = ""
+
+
+class CompactOutlineSchema(BaseModel):
+    t: str
+    s: list[CompactOutlineEntry]
+
+
+# =========================================================================
+# Expansion (model output -> builder dicts) and compaction (for prompts)
+# =========================================================================
+
+def expand_slide(slide):
+    """Verbose slide dict from a compact one; anything else is returned as is."""
+    if not isinstance(slide, dict) or "k" not in slide:
+        return slide
+    expanded = {"type": _TYPES_BY_CODE.get(slide["k"], slide["k"])}
+    for key, value in slide.items():
+        if key == "k":
+            continue
+        if key == "m":
+            expanded["metrics"] = [_expand_metric(m) for m in value or []]
+        else:
+            expanded[_VERBOSE_KEYS.get(key, key)] = value
+    return expanded
+
+
+def _expand_metric(metric):
+    if isinstance(metric, (list, tuple)):
+        values = [str(v) for v in metric[:3]] + [""] * (3 - min(len(metric), 3))
+        return {"value": values[0], "label": values[1], "change": values[2]}
+    return metric
+
+
+def expand_deck(data):
+    """Verbose deck ({"presentation_title", "slides"}) from a compact or verbose response."""
+    if not isinstance(data, dict):
+        return data
+    deck = dict(data)
+    if "t" in deck and "presentation_title" not in deck:
+        deck["presentation_title"] = deck.pop("t")
+    if "s" in deck and "slides" not in deck:
+        deck["slides"] = deck.pop("s")
+    if isinstance(deck.get("slides"), list):
+        deck["slides"] = [expand_slide(s) for s in deck["slides"]]
+    return deck
+
+
+def compact_slide(slide):
+    """Compact form of a verbose slide (unknown keys are kept as they are)."""
+    if not isinstance(slide, dict) or "type" not in slide:
+        return slide
+    compact = {"k": TYPE_CODES.get(slide["type"], slide["type"])}
+    for key, value in slide.items():
+        if key == "type":
+            continue
+        if key == "metrics":
+            compact["m"] = [[m.get("value", ""), m.get("label", ""), m.get("change", "")]
+                            if isinstance(m, dict) else m for m in value]
+        else:
+            compact[_KEYS.get(key, key)] = value
+    return compact
+
+
+def compact_deck(deck: dict) -> dict:
+    return {"t": deck.get("presentation_title", ""), "s": [compact_slide(s) for s in deck.get("slides", [])]}
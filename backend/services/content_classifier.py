@@ -0,0 +1,200 @@
+"""
+Offline Content Classifier for SmartDeck AI
+
+Ranks presentation styles and writes a short summary of the extracted text
+without calling the LLM, so /analyze answers in milliseconds:
+- Hashed unigram/bigram features compared against per-style prototypes
+- Structural signals (number density, tables, currency, sources)
+- The keyword matcher from presentation_styles
+"""
+import math
+import re
+import zlib
+from collections import Counter
+from itertools import pairwise
+
+from services.presentation_styles import PRESENTATION_STYLES, detect_best_styles
+
+# Number of hashed feature buckets (unigrams + bigrams share the space)
+FEATURE_DIM = 1 << 14
+
+# Only a bounded sample of very large inputs is featurized
+SAMPLE_CHARS = 200_000
+SAMPLE_WINDOWS = 8
+
+_TOKEN_RE = re.compile(r"[^\W\d_][\w&]*|\d[\d.,]*")
+_TABLE_SEPARATOR_RE = re.compile(r"^\|(?:\s*:?-{3,}:?\s*\|)+\s*$", re.MULTILINE)
+_TABLE_ROW_RE = re.compile(r"^\|", re.MULTILINE)
+_CURRENCY_RE = re.compile(r"[$€£]|\b(?:usd|eur|mxn|ars|clp)\b", re.IGNORECASE)
+_PERCENT_RE = re.compile(r"\d\s?%")
+
+STOPWORDS = {
+    # English
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "were",
+    "have", "has", "not", "but", "all", "our", "their", "will", "can", "into",
+    "per", "its", "you", "your", "been", "also", "than", "more", "nan",
+    # Spanish
+    "los", "las", "del", "que", "por", "para", "con", "una", "uno", "como",
+    "más", "sus", "este", "esta", "estos", "son", "fue", "han", "entre", "sin",
+    "sobre", "también", "cada", "hasta", "desde", "pero", "muy", "ser",
+    # Markers added by DataExtractor / main.py
+    "source", "sheet", "csv", "data", "unnamed",
+}
+
+# Linear weights over normalized structural signals, per style.
+# Signals are in [0, 1]; a weight of 2.0 adds up to 2 points to match_score.
+STRUCTURAL_PRIORS = {
+    "executive": {"number_density": 1.0, "percent_density": 1.5, "tabular": 0.5},
+    "sales": {"currency_density": 0.5, "prose": 0.5},
+    "financial": {"number_density": 1.5, "currency_density": 2.0, "tabular": 1.0},
+    "product": {"prose": 1.0},
+    "informal": {"prose": 1.5},
+}
+
+# Weight of the prototype cosine similarity in the final score
+SIMILARITY_WEIGHT = 4.0
+
+
+def _sample(text: str) -> str:
+    """Return the head of the text plus evenly spaced windows from the rest."""
+    if len(text) <= SAMPLE_CHARS:
+        return text
+    window = SAMPLE_CHARS // (2 * SAMPLE_WINDOWS)
+    head = text[:SAMPLE_CHARS // 2]
+    step = (len(text) - len(head)) // SAMPLE_WINDOWS
+    windows = [text[len(head) + i * step:len(head) + i * step + window]
+               for i in range(SAMPLE_WINDOWS)]
+    return "\n".join([head] + windows)
+
+
+def _find_sources(text: str) -> list:
+    """Filenames from the '--- Source: name ---' markers main.py inserts."""
+    marker = "--- Source: "
+    sources = []
+    pos = text.find(marker)
+    while pos != -1:
+        end = text.find(" ---", pos + len(marker))
+        if end == -1:
+            break
+        sources.append(text[pos + len(marker):end])
+        pos = text.find(marker, end)
+    return sources
+
+
+def _tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _hashed_features(tokens: list) -> dict:
+    """Sublinear-TF, L2-normalized hashed unigram + bigram vector (sparse)."""
+    words = [t for t in tokens if not t[0].isdigit() and t not in STOPWORDS]
+    grams = Counter(words)
+    grams.update(f"{a} {b}" for a, b in pairwise(words))
+    vec = {}
+    for gram, count in grams.items():
+        bucket = zlib.crc32(gram.encode("utf-8")) % FEATURE_DIM
+        vec[bucket] = vec.get(bucket, 0.0) + 1.0 + math.log(count)
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {k: v / norm for k, v in vec.items()}
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+def _build_prototypes() -> dict:
+    """One feature vector per style from its keywords, description and prompt."""
+    prototypes = {}
+    for style_id, style in PRESENTATION_STYLES.items():
+        # Keywords are repeated so they dominate the descriptive prose
+        corpus = " ".join(style["keywords"] * 3)
+        corpus += f" {style['description']} {style['prompt_modifier']}"
+        prototypes[style_id] = _hashed_features(_tokenize(corpus))
+    return prototypes
+
+
+_PROTOTYPES = _build_prototypes()
+
+
+def structural_signals(text: str, tokens: list) -> dict:
+    """Cheap layout statistics of the (sampled) extracted text."""
+    total = max(len(tokens), 1)
+    numeric = sum(1 for t in tokens if t[0].isdigit())
+    tables = len(_TABLE_SEPARATOR_RE.findall(text))
+    rows = len(_TABLE_ROW_RE.findall(text))
+    lines = max(text.count("\n") + 1, 1)
+    return {
+        "tokens": len(tokens),
+        "tables": tables,
+        "table_rows": rows,
+        "number_density": numeric / total,
+        "currency_density": min(1.0, 10 * len(_CURRENCY_RE.findall(text)) / total),
+        "percent_density": min(1.0, 10 * len(_PERCENT_RE.findall(text)) / total),
+        "tabular": min(1.0, rows / lines),
+        "prose": max(0.0, 1.0 - rows / lines - numeric / total),
+    }
+
+
+def top_terms(tokens: list, n: int = 5) -> list:
+    words = Counter(t for t in tokens
+                    if len(t) > 3 and not t[0].isdigit() and t not in STOPWORDS)
+    return [w for w, _ in words.most_common(n)]
+
+
+def classify_content(raw_text: str) -> dict:
+    """
+    Rank presentation styles and build a templated summary, fully offline.
+    Returns {"summary", "suggested_styles", "signals"}; suggested_styles has
+    the same shape as detect_best_styles().
+    """
+    sample = _sample(raw_text)
+    tokens = _tokenize(sample)
+    signals = structural_signals(sample, tokens)
+    # Source markers may sit outside the sample, so look for them in the full text
+    signals["sources"] = _find_sources(raw_text)
+    features = _hashed_features(tokens)
+
+    # Keyword matches are the backbone of the ranking
+    ranking = detect_best_styles(sample, recommend_default=False)
+    for entry in ranking:
+        style_id = entry["id"]
+        similarity = _cosine(features, _PROTOTYPES[style_id])
+        prior = sum(weight * signals[name]
+                    for name, weight in STRUCTURAL_PRIORS.get(style_id, {}).items())
+        entry["match_score"] = round(entry["match_score"] + SIMILARITY_WEIGHT * similarity + prior, 1)
+
+    ranking.sort(key=lambda x: x["match_score"], reverse=True)
+    for entry in ranking:
+        entry["is_recommended"] = entry["match_score"] >= 3
+    if not any(r["is_recommended"] for r in ranking):
+        ranking[0]["is_recommended"] = True
+        if not ranking[0]["reason"].startswith("Detectado"):
+            ranking[0]["reason"] = "Estilo recomendado por defecto"
+
+    return {
+        "summary": build_summary(signals, top_terms(tokens), ranking[0]),
+        "suggested_styles": ranking,
+        "signals": {k: v for k, v in signals.items() if k != "sources"},
+    }
+
+
+def build_summary(signals: dict, terms: list, best_style: dict) -> str:
+    """Three-sentence Spanish summary from the computed signals."""
+    if signals["tables"]:
+        kind = f"Datos tabulares ({signals['tables']} tabla{'s' if signals['tables'] != 1 else ''}, " \
+               f"{signals['table_rows']} filas)"
+    else:
+        kind = "Documento de texto"
+    if signals["number_density"] > 0.3:
+        kind += " con alta densidad numérica"
+    sources = signals["sources"]
+    if sources:
+        kind += f" proveniente{'s' if len(sources) != 1 else ''} de {len(sources)} archivo{'s' if len(sources) != 1 else ''}"
+
+    parts = [kind + "."]
+    if terms:
+        parts.append(f"Temas principales: {', '.join(terms)}.")
+    parts.append(f"Se recomienda el estilo «{best_style['name']}» para presentarlo.")
+    return " ".join(parts)
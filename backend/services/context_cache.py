@@ -0,0 +1,146 @@
+"""
+Gemini Context Cache Registry for SmartDeck AI
+
+The structuring prompts share a large static prefix (role, design rules,
+the style's prompt_modifier and SLIDE_TYPES_SPEC). This registry uploads
+each distinct prefix once as provider-side cached content and hands out its
+handle, so calls only send the variable data:
+- Keyed by sha256(model + prefix); one creation per key even under concurrency
+- Handles are refreshed shortly before they expire
+- Creation failures (prefix below the provider minimum, quota, network)
+  put the key on a cooldown and callers simply send the full prompt
+- Superseded handles, and all handles at shutdown, are deleted on the
+  provider instead of lingering until their TTL
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+logger = logging.getLogger(__name__)
+
+
+def is_cached_content_error(exc: BaseException) -> bool:
+    """
+    The provider rejected a call's cached content itself (expired, deleted or
+    invalid: a 400/403/404 naming it), as opposed to quota, timeouts or 5xx,
+    which say nothing about the cache.
+    """
+    if getattr(exc, "code", None) not in (400, 403, 404):
+        return False
+    message = str(exc).lower().replace("_", "").replace(" ", "")
+    return "cachedcontent" in message
+
+
+@dataclass
+class CacheEntry:
+    name: str
+    expires_at: float
+    hits: int = 0
+
+
+class ContextCacheRegistry:
+    def __init__(self, client, ttl_seconds: int = 3600, min_tokens: int = 0,
+                 refresh_margin_seconds: int = 60, failure_cooldown_seconds: int = 600,
+                 token_estimator=None):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.failure_cooldown_seconds = failure_cooldown_seconds
+        self.token_estimator = token_estimator
+        self._entries = {}
+        self._failures = {}
+        self._locks = {}
+        self.stats = {"hits": 0, "creates": 0, "failures": 0, "skipped": 0, "invalidations": 0, "deletes": 0}
+
+    @staticmethod
+    def prefix_key(model: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model}\x00{prefix}".encode()).hexdigest()
+
+    async def get(self, model: str, prefix: str):
+        """Return a cached-content name for this prefix, or None to send it inline."""
+        if self.token_estimator and self.token_estimator.estimate(prefix) < self.min_tokens:
+            self.stats["skipped"] += 1
+            return None
+
+        key = self.prefix_key(model, prefix)
+        entry = self._fresh_entry(key)
+        if entry:
+            return entry.name
+        if time.monotonic() < self._failures.get(key, 0):
+            self.stats["skipped"] += 1
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another request may have created it while we waited
+            entry = self._fresh_entry(key)
+            if entry:
+                return entry.name
+            return await self._create(key, model, prefix)
+
+    def invalidate(self, name: str):
+        """Forget a handle the provider no longer recognizes."""
+        for key, entry in list(self._entries.items()):
+            if entry.name == name:
+                del self._entries[key]
+                self.stats["invalidations"] += 1
+
+    async def close(self):
+        """Delete every handle on the provider (at shutdown)."""
+        entries, self._entries = list(self._entries.values()), {}
+        await asyncio.gather(*(self._delete(entry.name) for entry in entries))
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries)}
+
+    def _fresh_entry(self, key: str):
+        entry = self._entries.get(key)
+        if entry and entry.expires_at - self.refresh_margin_seconds > time.time():
+            entry.hits += 1
+            self.stats["hits"] += 1
+            return entry
+        return None
+
+    async def _create(self, key: str, model: str, prefix: str):
+        from google.genai import types
+        try:
+            cached = await self.client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                    display_name=f"smartdeck-{key[:16]}",
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"Context cache unavailable, sending full prompt: {e}", exc_info=True)
+            self._failures[key] = time.monotonic() + self.failure_cooldown_seconds
+            self.stats["failures"] += 1
+            return None
+
+        expires_at = time.time() + self.ttl_seconds
+        if isinstance(cached.expire_time, datetime):
+            expire = cached.expire_time
+            if expire.tzinfo is None:
+                expire = expire.replace(tzinfo=UTC)
+            expires_at = expire.timestamp()
+        superseded = self._entries.get(key)
+        self._entries[key] = CacheEntry(name=cached.name, expires_at=expires_at)
+        self._failures.pop(key, None)
+        self.stats["creates"] += 1
+        logger.info(f"Context cache created: {cached.name} (prefix {key[:12]})")
+        if superseded:
+            # Refreshed before it expired: calls already use the new handle
+            await self._delete(superseded.name)
+        return cached.name
+
+    async def _delete(self, name: str):
+        try:
+            await self.client.aio.caches.delete(name=name)
+            self.stats["deletes"] += 1
+        except Exception as e:
+            logger.warning(f"Could not delete context cache {name}: {e}", exc_info=True)
@@ -0,0 +1,72 @@
+"""
+Deck Store for SmartDeck AI
+
+Keeps every generated deck so single slides can be regenerated or edited
+later without running the whole pipeline again:
+- One directory per deck: deck.json (slides, theme, style, access token,
+  source reference, version, speaker-notes status) and the slide
+  fragments of its last render
+- Writes go to a temp file and are renamed into place
+- Deck ids are validated before they touch the filesystem
+"""
+import json
+import os
+import re
+import secrets
+import time
+import uuid
+
+_DECK_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class DeckStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, deck_id: str) -> str:
+        if not _DECK_ID_RE.match(deck_id or ""):
+            raise KeyError(deck_id)
+        return os.path.join(self.root, deck_id)
+
+    def fragment_dir(self, deck_id: str) -> str:
+        return os.path.join(self._dir(deck_id), "fragments")
+
+    def create(self, deck_id: str, deck: dict, theme: str, style: str, filename: str,
+               source_path: str | None = None, prompt: str | None = None, notes_status: str = "ready",
+               cache_hit: dict | None = None) -> dict:
+        """
+        Store a freshly generated deck under a new access token.
+        `notes_status` is "pending" while deferred speaker notes are written;
+        `cache_hit` records the semantic cache entry a deck was served from.
+        """
+        record = {
+            "deck_id": deck_id,
+            "token": secrets.token_urlsafe(32),
+            "deck": deck,
+            "theme": theme,
+            "style": style,
+            "filename": filename,
+            "source_path": source_path,
+            "prompt": prompt,
+            "version": 1,
+            "notes_status": notes_status,
+            "cache_hit": cache_hit,
+        }
+        self.save(record)
+        return record
+
+    def load(self, deck_id: str):
+        try:
+            with open(os.path.join(self._dir(deck_id), "deck.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (KeyError, OSError, ValueError):
+            return None
+
+    def save(self, record: dict):
+        directory = self._dir(record["deck_id"])
+        os.makedirs(directory, exist_ok=True)
+        record["updated_at"] = time.time()
+        tmp_path = os.path.join(directory, f".deck.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, "deck.json"))
@@ -1,8 +1,14 @@
-import pandas as pd
-from docx import Document
 import os
 
+# pandas and python-docx are imported on first use: they dominate the
+# backend's import time and most processes never extract a file.
+
 class DataExtractor:
+    def warm_up(self):
+        """Import the parsing libraries ahead of the first upload."""
+        import docx  # noqa: F401
+        import pandas  # noqa: F401
+
     def extract(self, file_path: str) -> str:
         ext = os.path.splitext(file_path)[1].lower()
         if ext in ['.xlsx', '.xls']:
@@ -17,6 +23,7 @@ class DataExtractor:
             return f"Unsupported file type: {ext}"
 
     def _extract_excel(self, file_path: str) -> str:
+        import pandas as pd
         try:
             # Read all sheets
             xls = pd.ExcelFile(file_path)
@@ -30,6 +37,7 @@ class DataExtractor:
             return f"Error reading Excel: {str(e)}"
 
     def _extract_csv(self, file_path: str) -> str:
+        import pandas as pd
         try:
             df = pd.read_csv(file_path)
             return f"--- CSV Data ---\n{df.to_markdown(index=False)}"
@@ -37,6 +45,7 @@ class DataExtractor:
              return f"Error reading CSV: {str(e)}"
 
     def _extract_word(self, file_path: str) -> str:
+        from docx import Document
         try:
             doc = Document(file_path)
             full_text = []
@@ -1,68 +1,217 @@
-from google import genai
-from google.genai import types
+import asyncio
+import copy
 import json
-import time
 import logging
-from services.presentation_styles import get_style_prompt_modifier, detect_best_styles
+import random
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import ClassVar
+
+from config import settings
+from services import metrics
+from services.compact_schema import (
+    COMPACT_MARKER,
+    COMPACT_SLIDE_TYPES_SPEC,
+    TYPE_CODES,
+    CompactDeckSchema,
+    CompactOutlineSchema,
+    CompactSlidesSchema,
+    compact_slide,
+    expand_deck,
+)
+from services.content_classifier import classify_content
+from services.context_cache import ContextCacheRegistry, is_cached_content_error
+from services.llm_governor import LLMGovernor, is_quota_error
+from services.llm_simulator import MOCK_ANALYSIS_DECK, LLMSimulator
+from services.model_router import ModelRouter
+from services.presentation_styles import get_style_prompt_modifier
+from services.prompt_packer import PromptPacker, chunk_sources
+from services.retrieval import IndexCache
+from services.slide_schema import (
+    NOTES_DEFERRED_RULE,
+    DeckSchema,
+    NotesSchema,
+    OutlineSchema,
+    SlidesSchema,
+    coerce_slide,
+    salvage_deck,
+    validate_outline_entry,
+    validate_slide,
+    validate_slides,
+)
+from services.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# google-genai takes ~0.5 s to import; it is loaded with the first client
+genai = None
+types = None
+
+
+def _load_genai():
+    global genai, types
+    if genai is None:
+        from google import genai as genai_module
+        genai = genai_module
+    if types is None:
+        from google.genai import types as types_module
+        types = types_module
+
+
+@dataclass
+class MapReduceStats:
+    """Cost and timing of one map-reduce structuring run."""
+    input_chars: int = 0
+    input_tokens: int = 0
+    chunks: int = 0
+    failed_chunks: int = 0
+    concurrency: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    map_seconds: float = 0.0
+    reduce_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
 
 class IntelligenceService:
     def __init__(self, api_key: str = None):
         self.api_key = api_key
+        self.packer = PromptPacker()
+        # BM25 chunk indexes of recent inputs, for over-budget packing and excerpts
+        self.retrieval = IndexCache(settings.RETRIEVAL_INDEX_CACHE_SIZE, settings.RETRIEVAL_CHUNK_TOKENS,
+                                    self.packer.estimator)
+        self.context_cache = None
+        self.simulator = None
+        self._client = None
+        # Pooled HTTP client under the Gemini client, and its connection reuse
+        self.http = None
+        self.connection_stats = None
+        # Process-wide cap on LLM calls in flight, adapted to quota errors
+        self.governor = LLMGovernor.from_settings(settings) if settings.LLM_GOVERNOR_ENABLED else None
+        # Fast or strong model per task, downgraded under load and quota pressure
+        self.router = ModelRouter.from_settings(settings)
+        # Slides come back with short keys and are expanded locally
+        self.compact_output = settings.LLM_COMPACT_OUTPUT
+        # Decks are written without speaker notes; write_speaker_notes adds them later
+        self.deferred_notes = settings.SPEAKER_NOTES_MODE == "deferred"
+        # Schema validation / repair counters
+        self.validation_stats = {
+            "decks_validated": 0, "invalid_slides": 0, "repair_calls": 0,
+            "slides_repaired": 0, "slides_coerced": 0, "slides_dropped": 0,
+            "json_salvaged": 0,
+        }
         if api_key:
-            self.client = genai.Client(api_key=api_key)
-            self.model_name = 'gemini-2.0-flash'
+            # The Gemini client is created on first use (see `client`);
+            # model_name is the strong tier, which structures the decks
+            self.model_name = settings.LLM_MODEL_STRONG
         else:
-            self.client = None
             self.model_name = None
+            # Mock mode runs the normal pipeline against an offline simulator
+            self.simulator = LLMSimulator.from_settings(settings)
+
+    @property
+    def client(self):
+        """Gemini client, created (with its HTTP pool and context cache) on first access."""
+        if self._client is None and self.api_key:
+            _load_genai()
+            from services.llm_transport import ConnectionStats, build_http_client
+            self.connection_stats = ConnectionStats()
+            self.http = build_http_client(settings, self.connection_stats)
+            http_options = {
+                "httpx_async_client": self.http,
+                # Also sent to the API as its server-side deadline
+                "timeout": int(settings.LLM_HTTP_READ_TIMEOUT_SECONDS * 1000),
+            }
+            if settings.GEMINI_BASE_URL:
+                http_options["base_url"] = settings.GEMINI_BASE_URL
+            self._client = genai.Client(api_key=self.api_key, http_options=types.HttpOptions(**http_options))
+            if settings.CONTEXT_CACHE_ENABLED:
+                self.context_cache = ContextCacheRegistry(
+                    self._client,
+                    ttl_seconds=settings.CONTEXT_CACHE_TTL_SECONDS,
+                    min_tokens=settings.CONTEXT_CACHE_MIN_TOKENS,
+                    token_estimator=self.packer.estimator,
+                )
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+
+    def warm_up(self):
+        """Import google-genai and build the client ahead of the first request."""
+        _load_genai()
+        return self.client
+
+    async def warm_connections(self) -> int:
+        """
+        Open settings.LLM_HTTP_WARM_CONNECTIONS pooled connections to the
+        Gemini API. Run it on the serving event loop (pooled connections
+        belong to the loop that opened them), after warm_up().
+        """
+        if not self.api_key or settings.LLM_HTTP_WARM_CONNECTIONS <= 0 or self.client is None:
+            return 0
+        from services.llm_transport import warm_connections
+        base_url = settings.GEMINI_BASE_URL or "https://generativelanguage.googleapis.com/"
+        return await warm_connections(self.http, base_url, settings.LLM_HTTP_WARM_CONNECTIONS)
+
+    async def aclose(self):
+        """Delete the provider-side context caches and close the pooled connections."""
+        if self.context_cache is not None:
+            await self.context_cache.close()
+        if self.http is not None:
+            await self.http.aclose()
 
     # =========================================================================
     # SLIDE TYPE DEFINITIONS (shared across all methods)
     # =========================================================================
 
+    # Inserted into f-strings as a value, so braces are literal (not doubled)
     SLIDE_TYPES_SPEC = """
     === AVAILABLE SLIDE TYPES (use at least 4 different types) ===
 
     TYPE 1 - "title_slide" (use exactly once, as first slide):
-    {{
+    {
         "type": "title_slide",
         "title": "The Big Headline Insight",
         "subtitle": "Supporting context line"
-    }}
+    }
 
     TYPE 2 - "executive_summary" (use for key takeaways, 3-4 bullets in card layout):
-    {{
+    {
         "type": "executive_summary",
         "title": "Revenue Exceeded All Targets in Q4",
         "bullet_points": ["Short insight 1", "Short insight 2", "Short insight 3", "Short insight 4"],
         "speaker_notes": "talking points"
-    }}
+    }
 
     TYPE 3 - "metrics_slide" (use for KPIs, showing big numbers as cards):
-    {{
+    {
         "type": "metrics_slide",
         "title": "Key Performance Indicators Beat Targets",
         "metrics": [
-            {{"value": "$6.6M", "label": "Total Revenue", "change": "+75% YoY"}},
-            {{"value": "95%", "label": "Customer Retention", "change": "+2pts vs Q3"}},
-            {{"value": "150", "label": "New Customers", "change": "+25% vs Q3"}},
-            {{"value": "$14K", "label": "Avg Deal Size", "change": "+17% YoY"}}
+            {"value": "$6.6M", "label": "Total Revenue", "change": "+75% YoY"},
+            {"value": "95%", "label": "Customer Retention", "change": "+2pts vs Q3"},
+            {"value": "150", "label": "New Customers", "change": "+25% vs Q3"},
+            {"value": "$14K", "label": "Avg Deal Size", "change": "+17% YoY"}
         ],
         "speaker_notes": "talking points"
-    }}
+    }
 
     TYPE 4 - "content_slide" (standard bullets for analysis):
-    {{
+    {
         "type": "content_slide",
         "title": "Action-Oriented Insight Title",
         "bullet_points": ["Insight with data", "Another with context", "Third point"],
         "speaker_notes": "talking points"
-    }}
+    }
 
     TYPE 5 - "two_column" (for before/after, pros/cons, comparison):
-    {{
+    {
         "type": "two_column",
         "title": "Strengths Outweigh Challenges",
         "left_title": "Strengths",
@@ -70,47 +219,104 @@ class IntelligenceService:
         "left_points": ["Point A", "Point B", "Point C"],
         "right_points": ["Challenge 1", "Challenge 2", "Challenge 3"],
         "speaker_notes": "talking points"
-    }}
+    }
 
     TYPE 6 - "section_divider" (bold transition between sections):
-    {{
+    {
         "type": "section_divider",
         "title": "Strategic Recommendations",
         "subtitle": "Actionable next steps for Q1 2025"
-    }}
+    }
 
     TYPE 7 - "challenges_slide" (risks/challenges with warning style):
-    {{
+    {
         "type": "challenges_slide",
         "title": "Three Risks Require Immediate Attention",
         "bullet_points": ["Risk 1 with specifics", "Risk 2 with impact", "Risk 3"],
         "speaker_notes": "talking points"
-    }}
+    }
     """
 
+    def _slide_spec(self, notes: bool | None = None) -> str:
+        """Slide types in the wire format in use; without the notes examples when notes are deferred."""
+        spec = COMPACT_SLIDE_TYPES_SPEC if self.compact_output else self.SLIDE_TYPES_SPEC
+        if notes is None:
+            notes = not self.deferred_notes
+        return spec if notes else _NOTES_EXAMPLE_RE.sub("", spec)
+
+    def _notes_rule(self) -> str:
+        return NOTES_DEFERRED_RULE if self.deferred_notes else "Every slide must have speaker_notes."
+
+    def _output_spec(self, whole_deck: bool = True) -> str:
+        """The '=== OUTPUT ===' section matching the slide spec in use."""
+        if self.compact_output:
+            shape = '{"t": "Main insight title", "s": [ ... slides ... ]}' if whole_deck else '{"s": [ ... slides ... ]}'
+        else:
+            shape = ('{"presentation_title": "Main insight title", "slides": [ ... slide objects ... ]}'
+                     if whole_deck else '{"slides": [ ... slide objects ... ]}')
+        return f"""
+        === OUTPUT ===
+
+        Return ONLY valid JSON:
+        {shape}
+        """
+
+    def _response_schemas(self) -> tuple:
+        """(deck schema, slides schema) for response_schema."""
+        if self.compact_output:
+            return CompactDeckSchema, CompactSlidesSchema
+        return DeckSchema, SlidesSchema
+
     # =========================================================================
     # MODE 1: Analyze uploaded files
     # =========================================================================
 
-    def analyze_and_structure(self, raw_text: str, style_id: str = "executive") -> dict:
-        """Analyze uploaded data and generate a structured presentation."""
+    async def analyze_and_structure(self, raw_text: str, style_id: str = "executive",
+                                    mode: str | None = None, on_outline=None) -> dict:
+        """Analyze uploaded data and generate a structured presentation.
+
+        mode: "single" packs the input into one call, "map_reduce" condenses
+        chunks first, "auto" (default: settings.STRUCTURING_MODE) picks
+        map-reduce when the input overflows the single-call budget.
+        on_outline: called with a skeleton deck as soon as the outline is
+        known (outline pipeline only), e.g. to start rendering early.
+        """
         if not self.api_key:
-            logger.warning("No API key found - using MOCK response")
-            return self._mock_response()
+            logger.warning("No API key found - using the offline LLM simulator")
 
         logger.info(f"Analyzing with Gemini AI (style: {style_id})...")
 
-        style_modifier = get_style_prompt_modifier(style_id)
+        mode = mode or settings.STRUCTURING_MODE
+        prefix = self._structure_prefix(style_id, data_label="RAW DATA")
+        packed = self.pack_input(raw_text, fixed_prompt=prefix)
+
+        if mode == "map_reduce" or (
+            mode == "auto"
+            and packed.original_tokens > packed.budget * settings.MAP_REDUCE_MIN_OVERFLOW
+        ):
+            deck, _ = await self.map_reduce_structure(raw_text, style_id, on_outline=on_outline)
+            return deck
 
-        prompt = f"""
+        if settings.RETRIEVAL_ENABLED and packed.original_tokens > packed.budget:
+            with span("retrieval.pack"):
+                packed = (await self.retrieval.aget(raw_text)).pack(packed.budget)
+            logger.info(f"Retrieval packing: {packed.original_tokens} -> {packed.packed_tokens} tokens "
+                        f"(budget {packed.budget})")
+        return await self._structure("RAW DATA", packed.text, prefix, style_id, on_outline=on_outline,
+                                     source_text=raw_text)
+
+    def _structure_prefix(self, style_id: str, data_label: str) -> str:
+        """Static part of the deck-structuring prompt (cacheable per style)."""
+        style_modifier = get_style_prompt_modifier(style_id)
+        return f"""
         You are an ELITE business intelligence analyst and presentation designer.
 
         Transform the raw data below into a professional presentation.
 
-        CRITICAL RULE: DETECT the language of the RAW DATA below (English or Spanish).
-        ALL GENERATED CONTENT (Titles, subtitles, bullet points, metrics labels, speaker notes) MUST BE IN THE SAME LANGUAGE AS THE RAW DATA.
+        CRITICAL RULE: DETECT the language of the {data_label} below (English or Spanish).
+        ALL GENERATED CONTENT (Titles, subtitles, bullet points, metrics labels, speaker notes) MUST BE IN THE SAME LANGUAGE AS THE {data_label}.
 
-        CRITICAL RULE: Include a 'SOURCES' slide at the end listing the filenames found in the raw data markers (--- Source: filename ---).
+        CRITICAL RULE: Include a 'SOURCES' slide at the end listing the filenames found in the {data_label.lower()} markers (--- Source: filename ---).
 
         === DESIGN RULES ===
 
@@ -118,42 +324,162 @@ class IntelligenceService:
         2. Keep bullets SHORT: max 12 words each, max 5 bullets per slide.
         3. Be SPECIFIC: exact numbers, percentages, comparisons.
         4. Use VARIETY of slide types. DO NOT use only content_slide.
-        5. Total: 8-12 slides. Every slide must have speaker_notes.
+        5. Total: 8-12 slides. {self._notes_rule()}
 
         {style_modifier}
 
-        {self.SLIDE_TYPES_SPEC}
+        {self._slide_spec()}
+        {self._output_spec()}"""
 
-        === RAW DATA ===
+    @staticmethod
+    def _data_section(label: str, data: str) -> str:
+        """Variable part of a prompt, sent after the (possibly cached) prefix."""
+        return f"""
+        === {label} ===
 
-        {raw_text[:50000]}
+        {data}
+        """
 
-        === OUTPUT ===
+    def pack_input(self, raw_text: str, fixed_prompt: str = ""):
+        """Fit extracted text into the model's token budget for one call."""
+        estimator = self.packer.estimator
+        window_left = (settings.MODEL_CONTEXT_TOKENS
+                       - settings.MODEL_OUTPUT_TOKEN_RESERVE
+                       - estimator.estimate(fixed_prompt))
+        budget = max(0, min(settings.PROMPT_INPUT_TOKEN_BUDGET, window_left))
+        packed = self.packer.pack(raw_text, budget)
+        logger.info(
+            f"Packed input: {packed.original_tokens} -> {packed.packed_tokens} tokens "
+            f"(budget {budget}, {len(packed.sources)} sources)"
+        )
+        return packed
 
-        Return ONLY valid JSON:
-        {{
-            "presentation_title": "Main insight title",
-            "slides": [ ... slide objects ... ]
-        }}
+    # =========================================================================
+    # MODE 1b: Map-reduce structuring for inputs beyond one context window
+    # =========================================================================
+
+    INSIGHTS_PROMPT = """
+    You are a business intelligence analyst condensing ONE PART of a larger dataset.
+    Another step will build a presentation from the condensed notes of all parts.
+
+    Extract only what matters for an executive presentation:
+    - Key findings, trends, outliers and comparisons, with exact numbers
+    - Headline metrics (value, label, change vs previous period if present)
+    Keep the language of the data. Do not invent facts.
+
+    === OUTPUT ===
+
+    Return ONLY valid JSON:
+    {
+        "summary": "one sentence describing this part",
+        "key_points": ["finding with numbers", "..."],
+        "metrics": [{"value": "$1.2M", "label": "Revenue", "change": "+8% QoQ"}]
+    }
+    """
+
+    async def map_reduce_structure(self, raw_text: str, style_id: str = "executive",
+                                   chunk_tokens: int | None = None, concurrency: int | None = None, on_outline=None):
         """
+        Structure inputs larger than one context window.
 
-        return self._call_gemini(prompt)
+        Map: every chunk is condensed into insights by concurrent calls
+        (at most `concurrency` in flight). Reduce: one structuring call over
+        the condensed insights. Returns (deck, MapReduceStats).
+        """
+        chunk_tokens = chunk_tokens or settings.MAP_REDUCE_CHUNK_TOKENS
+        concurrency = concurrency or settings.MAP_REDUCE_CONCURRENCY
+        started = time.perf_counter()
+
+        chunks = chunk_sources(raw_text, chunk_tokens, self.packer.estimator)
+        if len(chunks) > settings.MAP_REDUCE_MAX_CHUNKS:
+            # Bound the number of calls: grow chunks (up to the context window)
+            # and sample inside each one if even that is not enough
+            total = sum(c.tokens for c in chunks)
+            window = (settings.MODEL_CONTEXT_TOKENS - settings.MODEL_OUTPUT_TOKEN_RESERVE
+                      - self.packer.estimator.estimate(self.INSIGHTS_PROMPT))
+            chunk_tokens = min(window, -(-total // settings.MAP_REDUCE_MAX_CHUNKS))
+            chunks = chunk_sources(raw_text, chunk_tokens, self.packer.estimator)
+            logger.warning(f"Input needs {total} tokens; map chunks enlarged to {chunk_tokens} tokens")
+        stats = MapReduceStats(
+            input_chars=len(raw_text),
+            input_tokens=sum(c.tokens for c in chunks),
+            chunks=len(chunks),
+            concurrency=concurrency,
+        )
+        logger.info(f"Map-reduce: {len(chunks)} chunks of <= {chunk_tokens} tokens, concurrency {concurrency}")
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def extract(chunk):
+            async with semaphore:
+                data = chunk.text
+                if chunk.tokens > chunk_tokens:
+                    data = self.packer.pack(data, chunk_tokens).text
+                prompt = self._data_section(f"DATA ({chunk.header})", data)
+                try:
+                    response = await self._generate(prompt, temperature=0.2, usage=stats,
+                                                    prefix=self.INSIGHTS_PROMPT, task="insights")
+                    return chunk, json.loads(response.text)
+                except Exception:
+                    logger.exception(f"Map step failed for {chunk.header}")
+                    stats.failed_chunks += 1
+                    return chunk, None
+
+        results = await asyncio.gather(*(extract(c) for c in chunks))
+        stats.map_seconds = time.perf_counter() - started
+
+        insights = self._format_insights(results)
+        if not insights:
+            logger.warning("Map step produced no insights - falling back to a single packed call")
+            prefix = self._structure_prefix(style_id, data_label="RAW DATA")
+            packed = self.pack_input(raw_text, fixed_prompt=prefix)
+            deck = await self._structure("RAW DATA", packed.text, prefix, style_id, on_outline=on_outline)
+            return deck, stats
+
+        reduce_started = time.perf_counter()
+        prefix = self._structure_prefix(style_id, data_label="CONDENSED INSIGHTS")
+        packed = self.pack_input(insights, fixed_prompt=prefix)
+        deck = await self._structure("CONDENSED INSIGHTS", packed.text, prefix, style_id,
+                                     usage=stats, on_outline=on_outline)
+        stats.reduce_seconds = time.perf_counter() - reduce_started
+        stats.total_seconds = time.perf_counter() - started
+
+        logger.info(f"Map-reduce stats: {json.dumps(stats.as_dict())}")
+        return deck, stats
+
+    @staticmethod
+    def _format_insights(results: list) -> str:
+        """Render per-chunk insights as text, keeping the source markers."""
+        parts = []
+        for chunk, insight in results:
+            if not isinstance(insight, dict):
+                continue
+            lines = [chunk.header]
+            if insight.get("summary"):
+                lines.append(str(insight["summary"]))
+            lines += [f"- {point}" for point in insight.get("key_points", [])]
+            for metric in insight.get("metrics", []):
+                if isinstance(metric, dict):
+                    change = f" ({metric['change']})" if metric.get("change") else ""
+                    lines.append(f"* {metric.get('label', '')}: {metric.get('value', '')}{change}")
+            parts.append("\n".join(lines))
+        return "\n\n".join(parts)
 
     # =========================================================================
     # MODE 2: Generate from user prompt/context
     # =========================================================================
 
-    def generate_from_prompt(self, user_prompt: str, style_id: str = "executive") -> dict:
+    async def generate_from_prompt(self, user_prompt: str, style_id: str = "executive",
+                                   on_outline=None) -> dict:
         """Generate a presentation from a user-written prompt or context."""
         if not self.api_key:
-            logger.warning("No API key found - using MOCK response")
-            return self._mock_prompt_response(user_prompt)
+            logger.warning("No API key found - using the offline LLM simulator")
 
         logger.info(f"Generating from prompt (style: {style_id})...")
 
         style_modifier = get_style_prompt_modifier(style_id)
 
-        prompt = f"""
+        prefix = f"""
         You are an ELITE presentation designer and business storyteller.
 
         A user wants you to CREATE a professional presentation based on their instructions.
@@ -163,10 +489,6 @@ class IntelligenceService:
         CRITICAL RULE: DETECT the language of the USER'S REQUEST below.
         ALL GENERATED CONTENT MUST BE IN THE SAME LANGUAGE AS THE USER'S REQUEST.
 
-        === USER'S REQUEST ===
-
-        {user_prompt}
-
         === YOUR TASK ===
 
         1. Understand WHAT the user wants to present
@@ -180,254 +502,666 @@ class IntelligenceService:
         2. Keep bullets SHORT: max 12 words each, max 5 bullets per slide.
         3. Be SPECIFIC: invent realistic numbers, percentages, comparisons.
         4. Use VARIETY of slide types. DO NOT use only content_slide.
-        5. Every slide must have speaker_notes.
+        5. {self._notes_rule()}
 
         {style_modifier}
 
-        {self.SLIDE_TYPES_SPEC}
+        {self._slide_spec()}
+        {self._output_spec()}"""
 
-        === OUTPUT ===
+        return await self._structure("USER'S REQUEST", user_prompt, prefix, style_id,
+                                     task="prompt", on_outline=on_outline)
 
-        Return ONLY valid JSON:
-        {{
-            "presentation_title": "Main insight title",
-            "slides": [ ... slide objects ... ]
-        }}
+    # =========================================================================
+    # Outline-then-slides pipeline
+    # =========================================================================
+
+    OUTLINE_PROMPT = """
+    You are an ELITE presentation designer planning a presentation.
+
+    Write ONLY the outline of an 8-12 slide presentation for the {data_label}
+    below: for every slide its type and its final, action-oriented title
+    (state the conclusion, with numbers). Title slides and section dividers
+    also get their subtitle. Every other slide gets a one-line "focus": what
+    its body must show, with the key numbers to use. Use at least 4
+    different slide types.
+
+    CRITICAL RULE: write in the same language as the {data_label}.
+    """
+
+    FILL_PROMPT = """
+    You are writing ONE slide of a presentation whose outline is fixed.
+
+    You get the presentation title, the outline, the slide to write (type,
+    title and focus) and an excerpt of the source. Write that slide only:
+    keep its type and title, follow its focus, do
+    not repeat what other slides of the outline cover, and use specific
+    numbers from the excerpt (invent realistic ones if the source is a
+    request rather than data). Keep the presentation's language.
+    Keep bullets SHORT: max 12 words each, max 5 bullets.
+    Return exactly one slide.
+    """
+
+    # Outline entries of these types are already complete slides
+    _OUTLINE_COMPLETE_TYPES = frozenset({"title_slide", "section_divider"})
+    _SLIDE_PURPOSES: ClassVar[dict] = {
+        "title_slide": "exactly once, first",
+        "executive_summary": "key takeaways",
+        "metrics_slide": "KPIs as big numbers",
+        "content_slide": "bullets for analysis",
+        "two_column": "comparison",
+        "section_divider": "transition between sections",
+        "challenges_slide": "risks",
+    }
+
+    def _outline_spec(self) -> str:
+        """Slide types and the outline's output format, in the wire format in use."""
+        if self.compact_output:
+            names = TYPE_CODES
+            keys = f"""
+    {COMPACT_MARKER}
+    Short keys: "k" slide type, "h" title, "u" subtitle, "f" focus.
+"""
+            shape = ('{"t": "Main insight title", "s": [{"k": "title", "h": "...", "u": "..."}, '
+                     '{"k": "metrics", "h": "...", "f": "..."}, ... ]}')
+        else:
+            names, keys = {t: t for t in self._SLIDE_PURPOSES}, ""
+            shape = ('{"presentation_title": "Main insight title", "slides": [{"type": "title_slide", '
+                     '"title": "...", "subtitle": "..."}, {"type": "metrics_slide", "title": "...", "focus": "..."}, ... ]}')
+        types = "\n".join(f"    - {names[t]}: {purpose}" for t, purpose in self._SLIDE_PURPOSES.items())
+        return f"""{keys}
+    === SLIDE TYPES ===
+{types}
+
+    === OUTPUT ===
+
+    Return ONLY valid JSON:
+    {shape}
+    """
+
+    async def _structure(self, data_label: str, data: str, prefix: str, style_id: str,
+                         usage: MapReduceStats | None = None, task: str = "structure", on_outline=None,
+                         source_text: str | None = None) -> dict:
+        """
+        Deck for a structuring prompt, per settings.STRUCTURING_PIPELINE.
+        `source_text` (default: `data`) is what the slide calls take their
+        excerpts from: the whole input when `data` is a packed part of it.
+        """
+        if settings.STRUCTURING_PIPELINE == "outline":
+            deck = await self.outline_and_fill(data_label, data, style_id, usage, task, on_outline, source_text)
+            if deck is not None:
+                return deck
+            logger.warning("Outline failed - falling back to a single structuring call")
+        return await self._call_gemini(self._data_section(data_label, data), prefix=prefix, usage=usage, task=task)
+
+    async def outline_and_fill(self, data_label: str, data: str, style_id: str = "executive",
+                               usage: MapReduceStats | None = None, task: str = "structure", on_outline=None,
+                               source_text: str | None = None):
+        """
+        Two-phase structuring: one short call for the outline (types and
+        titles), then every slide body in concurrent
+        calls (at most settings.OUTLINE_FILL_CONCURRENCY in flight),
+        assembled in outline order. Wall time is the outline plus the
+        slowest slide instead of one completion of the whole deck.
+        Returns None if no usable outline came back.
+        """
+        with span("llm.outline_pipeline", task=task):
+            outline = await self._outline(data_label, data, style_id, usage, task)
+            if outline is None:
+                return None
+            if on_outline:
+                try:
+                    on_outline(skeleton_deck(outline))
+                except Exception:
+                    logger.warning("Outline callback failed", exc_info=True)
+
+            semaphore = asyncio.Semaphore(settings.OUTLINE_FILL_CONCURRENCY)
+
+            async def fill(index: int, entry: dict) -> dict:
+                if entry["type"] in self._OUTLINE_COMPLETE_TYPES:
+                    return {"type": entry["type"], "title": entry["title"], "subtitle": entry["subtitle"]}
+                async with semaphore:
+                    return await self._fill_slide(outline, index, source_text or data, style_id, usage, task)
+
+            slides = await asyncio.gather(*(fill(i, e) for i, e in enumerate(outline["slides"])))
+            deck = {"presentation_title": outline["presentation_title"], "slides": list(slides)}
+            result = await self._validate_and_repair(deck, usage)
+            logger.info(f"Outline pipeline: {len(result['slides'])} slides, "
+                        f"{sum(1 for e in outline['slides'] if e['type'] not in self._OUTLINE_COMPLETE_TYPES)} slide calls")
+            return result
+
+    async def _outline(self, data_label: str, data: str, style_id: str,
+                       usage: MapReduceStats, task: str):
+        """{"presentation_title", "slides": [outline entries]} or None."""
+        prefix = (self.OUTLINE_PROMPT.replace("{data_label}", data_label)
+                  + get_style_prompt_modifier(style_id) + self._outline_spec())
+        schema = CompactOutlineSchema if self.compact_output else OutlineSchema
+        try:
+            response = await self._generate(self._data_section(data_label, data), temperature=0.4, usage=usage,
+                                            prefix=prefix, response_schema=schema, task="outline")
+            outline = expand_deck(json.loads(response.text))
+        except Exception:
+            logger.exception(f"Outline call failed ({task})")
+            return None
+        entries = [validate_outline_entry(entry) for entry in outline.get("slides") or []]
+        entries = [entry for entry in entries if entry]
+        if len(entries) < 2:
+            return None
+        return {"presentation_title": str(outline.get("presentation_title") or entries[0]["title"]),
+                "slides": entries}
+
+    async def _fill_slide(self, outline: dict, index: int, data: str, style_id: str,
+                          usage: MapReduceStats, task: str) -> dict:
+        """Body and notes of outline slide `index`; the skeleton slide if the call fails."""
+        entry = outline["slides"][index]
+        wanted = {"type": entry["type"], "title": entry["title"], "focus": entry["focus"]}
+        request = {
+            "presentation_title": outline["presentation_title"],
+            "outline": [f"{i + 1}. [{e['type']}] {e['title']}" for i, e in enumerate(outline["slides"])],
+            "position": index + 1,
+            "slide": compact_slide(wanted) if self.compact_output else wanted,
+            "source_excerpt": await self._source_excerpt(data, [_slide_text(wanted)],
+                                                         settings.OUTLINE_SOURCE_CHARS),
+        }
+        # Static per style, so it is shared (and context-cached) by every slide call
+        prefix = (self.FILL_PROMPT + f"    {self._notes_rule()}\n" + get_style_prompt_modifier(style_id)
+                  + self._slide_spec() + self._output_spec(whole_deck=False))
+        try:
+            with span("llm.fill_slide", index=index, type=entry["type"]):
+                response = await self._generate(
+                    self._data_section("SLIDE TO WRITE", json.dumps(request, ensure_ascii=False)),
+                    temperature=0.4, usage=usage, prefix=prefix,
+                    response_schema=self._response_schemas()[1], task="fill")
+            slide = (expand_deck(json.loads(response.text)).get("slides") or [None])[0]
+        except Exception:
+            logger.exception(f"Slide {index + 1} of the outline failed ({task})")
+            slide = None
+        if not isinstance(slide, dict):
+            return skeleton_slide(entry)
+        slide.setdefault("title", entry["title"])
+        return slide
+
+    async def _source_excerpt(self, text: str, queries: list, max_chars: int) -> str:
+        """
+        The part of `text` that fits `max_chars` and matches `queries` (one
+        per slide the excerpt is for): BM25-ranked chunks taking turns per
+        query, or matching lines when retrieval is off or no chunk fits.
         """
+        if not text or max_chars <= 0:
+            return ""
+        if len(text) <= max_chars:
+            return text
+        if settings.RETRIEVAL_ENABLED:
+            excerpt = (await self.retrieval.aget(text)).excerpt(queries, max_chars)
+            if excerpt:
+                return excerpt
+        return _relevant_excerpt(text, {"queries": queries}, max_chars)
 
-        return self._call_gemini(prompt)
+    # =========================================================================
+    # Single slide regeneration
+    # =========================================================================
+
+    REGENERATE_PROMPT = """
+    You are rewriting ONE slide of an existing presentation.
+
+    You get the presentation title, the outline of all slides, the slide to
+    rewrite (with its position), the user's instruction and an excerpt of
+    the source data. Write a better version of that slide only: keep it
+    consistent with the neighbouring slides, follow the instruction, keep
+    the presentation's language and use specific numbers from the excerpt.
+    Keep the slide type unless the instruction asks for another one.
+    Return exactly one slide.
+    """
+
+    async def regenerate_slide(self, deck: dict, index: int, instruction: str = "",
+                               source_text: str = "", style_id: str = "executive") -> dict:
+        """
+        Rewrite slide `index` of `deck` with a small prompt: the outline,
+        the slide itself and the part of the source that matches it.
+        Raises on LLM errors or an unusable answer (no mock fallback here).
+        """
+        slides = deck.get("slides", [])
+        slide = slides[index]
+        outline = [f"{i + 1}. [{s.get('type', '')}] {s.get('title', '')}" for i, s in enumerate(slides)]
+        request = {
+            "presentation_title": deck.get("presentation_title", ""),
+            "outline": outline,
+            "position": index + 1,
+            "slide": compact_slide(slide) if self.compact_output else slide,
+            "instruction": instruction or "Improve this slide: sharper title, more specific content.",
+            "source_excerpt": await self._source_excerpt(source_text, [f"{_slide_text(slide)} {instruction}"],
+                                                         settings.REGENERATE_SOURCE_CHARS),
+        }
+        # The rest of the deck has (or is getting) notes: write this slide's inline
+        prefix = (self.REGENERATE_PROMPT + get_style_prompt_modifier(style_id)
+                  + self._slide_spec(notes=True) + self._output_spec(whole_deck=False))
+        data = self._data_section("SLIDE TO REWRITE", json.dumps(request, ensure_ascii=False))
+        response = await self._generate(data, temperature=0.5, prefix=prefix,
+                                        response_schema=self._response_schemas()[1], task="slide")
+        candidates = expand_deck(json.loads(response.text)).get("slides") or [None]
+        new_slide, error = validate_slide(candidates[0])
+        if error:
+            new_slide = coerce_slide(candidates[0])
+            if new_slide is None:
+                raise ValueError(f"Regenerated slide is invalid: {error}")
+        return new_slide
+
+    # =========================================================================
+    # Deferred speaker notes
+    # =========================================================================
+
+    NOTES_PROMPT = """
+    You are writing the speaker notes of a finished presentation.
+
+    You get every slide in order and an excerpt of the source. For EACH
+    slide write 2-4 sentences the presenter can say: the story behind the
+    slide, the numbers to stress and the transition to the next slide.
+    Do not change the slides. Keep the presentation's language.
+
+    === OUTPUT ===
+
+    Return ONLY valid JSON, one string per slide, in order:
+    {"notes": ["notes for slide 1", "notes for slide 2", ...]}
+    """
+
+    async def write_speaker_notes(self, deck: dict, source_text: str = "",
+                                  style_id: str = "executive") -> list:
+        """
+        Speaker notes for every slide of `deck` in one call, off the
+        critical path of generation (SPEAKER_NOTES_MODE=deferred). Returns
+        one string per slide ("" where the model gave none); raises on LLM
+        errors or an unusable answer.
+        """
+        slides = deck.get("slides", [])
+        shown = compact_slide if self.compact_output else (lambda slide: slide)
+        request = {
+            "presentation_title": deck.get("presentation_title", ""),
+            "slides": [shown({k: v for k, v in s.items() if k != "speaker_notes"}) for s in slides],
+            "source_excerpt": await self._source_excerpt(
+                source_text, [s.get("title", "") for s in slides], settings.NOTES_SOURCE_CHARS),
+        }
+        with span("llm.speaker_notes", slides=len(slides)):
+            response = await self._generate(
+                self._data_section("PRESENTATION", json.dumps(request, ensure_ascii=False)),
+                temperature=0.4, prefix=self.NOTES_PROMPT + get_style_prompt_modifier(style_id),
+                response_schema=NotesSchema, task="notes")
+        notes = json.loads(response.text).get("notes")
+        if not isinstance(notes, list) or not any(isinstance(n, str) and n.strip() for n in notes):
+            raise ValueError("Speaker notes response has no notes")
+        if len(notes) != len(slides):
+            logger.warning(f"Speaker notes for {len(notes)} of {len(slides)} slides")
+        return [(notes[i] if i < len(notes) and isinstance(notes[i], str) else "").strip()
+                for i in range(len(slides))]
 
     # =========================================================================
     # MODE 3: Detect content type and suggest styles
     # =========================================================================
 
     def detect_content_type(self, raw_text: str) -> dict:
-        """Analyze uploaded text and suggest the best presentation styles."""
-        # Use keyword-based detection (works without API key)
-        style_suggestions = detect_best_styles(raw_text)
-
-        # If we have an API key, also get an AI-powered summary
-        summary = ""
-        if self.api_key:
-            try:
-                summary_prompt = f"""
-                Analyze this data in ONE short paragraph (max 3 sentences).
-                Describe: What type of data is this? What is it about? What would be the best way to present it?
-                Answer in Spanish.
-
-                DATA:
-                {raw_text[:5000]}
-                """
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=summary_prompt
-                )
-                summary = response.text.strip()
-                logger.info(f"Content analysis: {summary[:100]}...")
-            except Exception as e:
-                logger.error(f"Content detection error: {e}")
-                summary = "Análisis de contenido disponible."
-        else:
-            summary = "Sube tu archivo y la IA analizará el mejor formato para tu presentación."
+        """Analyze uploaded text and suggest the best presentation styles.
 
+        Runs fully offline (no API round trip); the LLM summary is available
+        separately through summarize_with_llm().
+        """
+        analysis = classify_content(raw_text)
+        logger.info(f"Content analysis (local): {analysis['summary'][:100]}...")
         return {
-            "summary": summary,
-            "suggested_styles": style_suggestions,
+            "summary": analysis["summary"],
+            "suggested_styles": analysis["suggested_styles"],
         }
 
+    async def summarize_with_llm(self, raw_text: str) -> str:
+        """AI-powered summary of the uploaded data. Returns "" without an API key."""
+        if not self.api_key:
+            return ""
+        try:
+            summary_prompt = f"""
+            Analyze this data in ONE short paragraph (max 3 sentences).
+            Describe: What type of data is this? What is it about? What would be the best way to present it?
+            Answer in Spanish.
+
+            DATA:
+            {raw_text[:5000]}
+            """
+            response = await self._generate(summary_prompt, json_output=False, task="summary")
+            summary = response.text.strip()
+            logger.info(f"Content analysis (LLM): {summary[:100]}...")
+            return summary
+        except Exception:
+            logger.exception("Content detection error")
+            return ""
+
     # =========================================================================
     # Gemini API Call
     # =========================================================================
 
-    def _call_gemini(self, prompt: str) -> dict:
-        """Make a call to Gemini API and parse JSON response."""
+    async def _generate(self, prompt: str, temperature: float = 0.4,
+                        json_output: bool = True, usage: MapReduceStats | None = None,
+                        prefix: str | None = None, response_schema=None, task: str = "structure"):
+        """
+        Single Gemini call; accumulates token usage into `usage` if given.
+
+        `prefix` is the static part of the prompt. With context caching on it
+        is sent as a cached-content handle instead of inline text. `task`
+        ("structure", "prompt", "insights", "outline", "fill", "repair", "slide",
+        "notes", "summary") labels the call, picks its model tier (see
+        services.model_router) and tells the offline simulator what to answer.
+        """
+        full_prompt = (prefix or "") + prompt
+
+        async def call(route):
+            if self.simulator:
+                return await self.simulator.generate(task, prompt, full_prompt=full_prompt)
+            return await self._send(prompt, prefix, temperature, json_output, response_schema, route.model)
+
+        route = self.router.route(task, self.governor.queue_depth() if self.governor else 0)
+        started = time.perf_counter()
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.4,
-                    response_mime_type="application/json"
-                )
+            with span("llm.generate", task=task, model=route.model if self.api_key else "simulator",
+                      tier=route.tier, prompt_chars=len(full_prompt)) as generate_span:
+                response, route = await self._governed(call, task, route)
+                if generate_span:
+                    generate_span.attributes.update({"model": route.model if self.api_key else "simulator",
+                                                     "tier": route.tier})
+        except Exception as e:
+            metrics.LLM_SECONDS.labels(task, "error").observe(time.perf_counter() - started)
+            metrics.LLM_ERRORS.labels(task, metrics.error_class(e)).inc()
+            raise
+        metrics.LLM_SECONDS.labels(task, "ok").observe(time.perf_counter() - started)
+        metrics.LLM_TIER_SECONDS.labels(task, route.tier).observe(time.perf_counter() - started)
+
+        self._observe_usage(full_prompt, response, usage, task, route.tier)
+        return response
+
+    async def _governed(self, call, task: str, route):
+        """
+        Run `call(route)` under the concurrency governor. Quota errors shrink
+        the limit and are retried with jittered backoff until the deadline,
+        on the fast model if the call was on the strong one.
+        Returns (response, route of the call that answered).
+        """
+        metrics.LLM_ROUTES.labels(task, route.tier, route.reason).inc()
+        if not self.governor:
+            try:
+                return await call(route), route
+            except Exception as e:
+                if is_quota_error(e):
+                    self.router.after_quota_error(route)
+                raise
+        deadline = time.monotonic() + settings.LLM_GOVERNOR_DEADLINE_SECONDS
+        backoff = settings.LLM_GOVERNOR_RETRY_BASE_SECONDS
+        while True:
+            with span("llm.queue", task=task):
+                lease = await self.governor.acquire(deadline)
+            call_started, started = time.time(), time.perf_counter()
+            try:
+                response = await call(route)
+            except Exception as e:
+                quota = is_quota_error(e)
+                self.governor.release(lease, "quota" if quota else "error", call_started)
+                delay = min(backoff * random.uniform(0.5, 1.5), deadline - time.monotonic())
+                if not quota or delay <= 0:
+                    if quota:
+                        self.router.after_quota_error(route)
+                    raise
+                # Not a failure yet: count this attempt here, the final one in _generate
+                metrics.LLM_ERRORS.labels(task, metrics.error_class(e)).inc()
+                retry = self.router.after_quota_error(route)
+                if retry != route:
+                    # Another model has its own quota: no need to back off first
+                    route, delay = retry, 0
+                    metrics.LLM_ROUTES.labels(task, route.tier, route.reason).inc()
+                logger.warning(f"LLM quota error ({task}); retrying on {route.model} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                backoff *= 2
+                continue
+            except BaseException:
+                self.governor.release(lease, "cancelled", call_started)
+                raise
+            self.governor.release(lease, "ok", call_started, time.perf_counter() - started)
+            return response, route
+
+    async def _send(self, prompt: str, prefix: str, temperature: float,
+                    json_output: bool, response_schema, model: str | None = None):
+        """Gemini request on `model` (default: the strong tier), using the context cache for `prefix`."""
+        client = self.client
+        _load_genai()
+        model = model or self.model_name
+        cached_name = None
+        if prefix and self.context_cache:
+            cached_name = await self.context_cache.get(model, prefix)
+        full_prompt = (prefix or "") + prompt
+
+        async def call(cached):
+            config = types.GenerateContentConfig(
+                temperature=temperature,
+                response_mime_type="application/json" if json_output else None,
+                response_schema=response_schema,
+                cached_content=cached,
             )
-            result = json.loads(response.text)
+            return await client.aio.models.generate_content(
+                model=model,
+                contents=prompt if cached else full_prompt,
+                config=config,
+            )
+
+        try:
+            return await call(cached_name)
+        except Exception as e:
+            # Quota, timeouts and 5xx go to _generate's retries with the cache kept
+            if not cached_name or not is_cached_content_error(e):
+                raise
+            # Expired or evicted on the provider side: drop it, send inline
+            logger.warning(f"Cached content {cached_name} rejected ({e}); retrying without cache")
+            self.context_cache.invalidate(cached_name)
+            return await call(None)
+
+    async def _call_gemini(self, prompt: str, usage: MapReduceStats = None, prefix: str | None = None,
+                           task: str = "structure") -> dict:
+        """Make a call to Gemini API, parse and validate the deck JSON."""
+        with span("llm.call_gemini", task=task):
+            try:
+                response = await self._generate(prompt, usage=usage, prefix=prefix,
+                                                response_schema=self._response_schemas()[0], task=task)
+            except Exception:
+                logger.exception("Gemini call failed")
+                logger.warning("Falling back to MOCK response")
+                metrics.MOCK_FALLBACKS.labels("llm_error").inc()
+                return self._mock_response()
+
+            try:
+                result = json.loads(response.text)
+            except (TypeError, ValueError) as e:
+                result = salvage_deck(response.text or "")
+                if result is None:
+                    logger.error(f"Unparseable deck JSON: {e}")
+                    logger.warning("Falling back to MOCK response")
+                    metrics.JSON_PARSE_FAILURES.labels("unrecoverable").inc()
+                    metrics.MOCK_FALLBACKS.labels("unparseable_json").inc()
+                    return self._mock_response()
+                metrics.JSON_PARSE_FAILURES.labels("salvaged").inc()
+                self.validation_stats["json_salvaged"] += 1
+                logger.warning(f"Deck JSON was malformed; salvaged {len(result['slides'])} complete slides")
+
+            result = await self._validate_and_repair(expand_deck(result), usage)
             logger.info(f"Generated {len(result.get('slides', []))} slides")
             return result
-        except Exception as e:
-            logger.error(f"Error: {e}")
-            logger.warning("Falling back to MOCK response")
+
+    # =========================================================================
+    # Slide validation and targeted repair
+    # =========================================================================
+
+    REPAIR_PROMPT = """
+    You are fixing individual slides of a presentation that failed validation.
+
+    Rewrite ONLY the slides given below so each one is a valid slide object
+    of one of the available types, fixing the listed errors. Keep the
+    original language, title intent and content. If a slide uses a type that
+    does not exist, convert it to the closest available type.
+    Return exactly one slide per input slide, in order.
+    """
+
+    async def _validate_and_repair(self, deck: dict, usage: MapReduceStats | None = None) -> dict:
+        """
+        Validate every slide on its own; re-prompt only for the slides that
+        fail, then coerce or drop whatever is still invalid.
+        """
+        if not isinstance(deck, dict):
+            metrics.MOCK_FALLBACKS.labels("invalid_deck").inc()
             return self._mock_response()
+        slides = deck.get("slides")
+        if not isinstance(slides, list):
+            slides = []
+        stats = self.validation_stats
+        stats["decks_validated"] += 1
+
+        valid, errors = validate_slides(slides)
+        stats["invalid_slides"] += len(errors)
+
+        # Each round works on the latest attempt at every broken slide
+        current = list(slides)
+        for _ in range(settings.SLIDE_REPAIR_MAX_ROUNDS):
+            if not errors:
+                break
+            broken = sorted(errors)
+            repaired = await self._repair_slides(deck.get("presentation_title", ""), current, errors, usage)
+            if len(repaired) != len(broken):
+                # Slides are matched to the request by position: a short or
+                # long answer cannot be lined up safely
+                logger.warning(f"Repair returned {len(repaired)} slides for {len(broken)}: ignored")
+                continue
+            fixed, still_invalid = validate_slides(repaired)
+            for pos, index in enumerate(broken):
+                if pos in fixed:
+                    valid[index] = fixed[pos]
+                    stats["slides_repaired"] += 1
+                else:
+                    current[index] = repaired[pos]
+            errors = {broken[pos]: error for pos, error in still_invalid.items()}
+
+        for index in errors:
+            coerced = coerce_slide(current[index]) or coerce_slide(slides[index])
+            if coerced:
+                valid[index] = coerced
+                stats["slides_coerced"] += 1
+            else:
+                stats["slides_dropped"] += 1
+        if errors:
+            logger.warning(f"{len(errors)} slides still invalid after repair: coerced or dropped")
+
+        deck["slides"] = [valid[i] for i in sorted(valid)]
+        return deck
+
+    async def _repair_slides(self, title: str, slides: list, errors: dict,
+                             usage: MapReduceStats | None = None) -> list:
+        """One repair call covering all failing slides. Returns the new slides."""
+        self.validation_stats["repair_calls"] += 1
+        shown = compact_slide if self.compact_output else (lambda slide: slide)
+        broken = [{"index": i, "slide": shown(slides[i]), "errors": errors[i]} for i in sorted(errors)]
+        logger.info(f"Repairing {len(broken)} invalid slides: {sorted(errors)}")
+        data = self._data_section(
+            "SLIDES TO FIX",
+            f"Presentation title: {title}\n{json.dumps(broken, ensure_ascii=False)}",
+        )
+        try:
+            response = await self._generate(
+                data, temperature=0.2, usage=usage,
+                prefix=self.REPAIR_PROMPT + self._slide_spec() + self._output_spec(whole_deck=False),
+                response_schema=self._response_schemas()[1], task="repair",
+            )
+            repaired = expand_deck(json.loads(response.text)).get("slides", [])
+            return repaired if isinstance(repaired, list) else []
+        except Exception:
+            logger.exception("Slide repair failed")
+            return []
+
+    def _observe_usage(self, prompt: str, response, stats: MapReduceStats | None = None,
+                       task: str = "structure", tier: str = "strong"):
+        """Calibrate the local token estimator with the API's real count."""
+        metadata = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(metadata, "prompt_token_count", None)
+        output_tokens = getattr(metadata, "candidates_token_count", None)
+        metrics.PROMPT_CHARS.labels(task).observe(len(prompt))
+        if isinstance(prompt_tokens, int):
+            self.packer.estimator.observe(prompt, prompt_tokens)
+            if stats is not None:
+                stats.prompt_tokens += prompt_tokens
+        prompt_tokens = prompt_tokens if isinstance(prompt_tokens, int) else self.packer.estimator.estimate(prompt)
+        metrics.PROMPT_TOKENS.labels(task).observe(prompt_tokens)
+        metrics.LLM_TIER_TOKENS.labels(task, tier, "prompt").inc(prompt_tokens)
+        if isinstance(output_tokens, int):
+            metrics.OUTPUT_TOKENS.labels(task).observe(output_tokens)
+            metrics.LLM_TIER_TOKENS.labels(task, tier, "output").inc(output_tokens)
+            if stats is not None:
+                stats.output_tokens += output_tokens
 
     # =========================================================================
     # Mock Responses
     # =========================================================================
 
     def _mock_response(self):
-        """Mock response with varied slide types"""
-        time.sleep(2)
-        return {
-            "presentation_title": "Q3 2024 Executive Business Review",
-            "slides": [
-                {
-                    "type": "title_slide",
-                    "title": "Revenue Grew 18% to $45.2M, Beating Target by $3.5M",
-                    "subtitle": "Q3 2024 Executive Business Review"
-                },
-                {
-                    "type": "executive_summary",
-                    "title": "Four Key Wins Define Q3 Performance",
-                    "bullet_points": [
-                        "Revenue: $45.2M (+18% YoY), beat target by $3.5M",
-                        "Margins: Operating margin reached 24%, up from 19%",
-                        "Customers: NPS hit 72, retention climbed to 96%",
-                        "Expansion: Launched in 3 new European markets"
-                    ],
-                    "speaker_notes": "Lead with the revenue beat to set positive tone."
-                },
-                {
-                    "type": "metrics_slide",
-                    "title": "All Key Metrics Exceeded Targets",
-                    "metrics": [
-                        {"value": "$45.2M", "label": "Q3 Revenue", "change": "+18% YoY"},
-                        {"value": "24%", "label": "Operating Margin", "change": "+5pts vs Q2"},
-                        {"value": "96%", "label": "Customer Retention", "change": "+3pts vs Q2"},
-                        {"value": "72", "label": "Net Promoter Score", "change": "Highest ever"},
-                        {"value": "$42K", "label": "Avg Contract Value", "change": "+18% YoY"},
-                        {"value": "89%", "label": "Recurring Revenue", "change": "+5pts vs Q2"}
-                    ],
-                    "speaker_notes": "Use this slide as an at-a-glance dashboard."
-                },
-                {
-                    "type": "content_slide",
-                    "title": "Enterprise Segment Drove 62% of Revenue",
-                    "bullet_points": [
-                        "Enterprise: $28M (+25% YoY), now 62% of total",
-                        "SMB segment: $12.5M (+5% YoY), stable",
-                        "New product line: $4.7M in first full quarter",
-                        "Recurring revenue: 89%, up from 84%"
-                    ],
-                    "speaker_notes": "Enterprise is the growth engine."
-                },
-                {
-                    "type": "content_slide",
-                    "title": "Operational Leverage Expanded Margins 500bps",
-                    "bullet_points": [
-                        "Operating margin: 24% (target: 21%)",
-                        "CAC efficiency: $0.42 per $1 LTV",
-                        "R&D shipped 3 major features vs 2 planned",
-                        "G&A reduced to 12% of revenue (from 15%)"
-                    ],
-                    "speaker_notes": "Margin expansion from efficiency, not cuts."
-                },
-                {
-                    "type": "section_divider",
-                    "title": "Risks & Challenges",
-                    "subtitle": "Three areas requiring strategic attention"
-                },
-                {
-                    "type": "challenges_slide",
-                    "title": "Three Risks Require Immediate Action",
-                    "bullet_points": [
-                        "Competition: 2 new entrants in core market",
-                        "Sales cycle: Lengthened to 47 days (+24%)",
-                        "SMB churn: 8% in <$10K accounts (target: 5%)",
-                        "Hiring gap: 12 of 18 engineering hires filled"
-                    ],
-                    "speaker_notes": "Be transparent. Sales cycle fix underway."
-                },
-                {
-                    "type": "two_column",
-                    "title": "Strengths Position Us to Address Challenges",
-                    "left_title": "Strengths",
-                    "right_title": "Actions Needed",
-                    "left_points": [
-                        "Enterprise growth at 25% YoY",
-                        "Best-in-class NPS of 72",
-                        "Strong margins at 24%",
-                        "89% recurring revenue"
-                    ],
-                    "right_points": [
-                        "Hire 5 senior AEs by Nov 1",
-                        "Launch competitive response ($2M)",
-                        "Implement automated SMB onboarding",
-                        "Accelerate engineering hiring"
-                    ],
-                    "speaker_notes": "Frame challenges as opportunities."
-                },
-                {
-                    "type": "content_slide",
-                    "title": "Five Strategic Priorities for Q4",
-                    "bullet_points": [
-                        "Double enterprise sales capacity: 5 new AEs",
-                        "Launch competitive response: $2M budget",
-                        "Ship AI features to widen product moat",
-                        "Automate SMB onboarding to reduce churn",
-                        "Expand partner channel: 10 new partners"
-                    ],
-                    "speaker_notes": "All priorities are funded."
-                },
-                {
-                    "type": "metrics_slide",
-                    "title": "Q4 Targets: Path to $200M ARR",
-                    "metrics": [
-                        {"value": "$52M", "label": "Q4 Revenue Target", "change": "+15% vs Q3"},
-                        {"value": "$175M", "label": "Full Year 2024", "change": "vs $170M target"},
-                        {"value": "28%", "label": "Target Op. Margin", "change": "+4pts vs Q3"},
-                        {"value": "$200M", "label": "ARR Milestone", "change": "By Q1 2025"}
-                    ],
-                    "speaker_notes": "$200M ARR milestone positions us for Series C."
-                }
-            ]
-        }
+        """Canned deck used as the fallback when a call cannot be recovered"""
+        return copy.deepcopy(MOCK_ANALYSIS_DECK)
+
+    def is_fallback(self, deck: dict) -> bool:
+        """True for the canned fallback deck (not worth caching)"""
+        return deck == MOCK_ANALYSIS_DECK
+
+
+def skeleton_slide(entry: dict) -> dict:
+    """Valid placeholder slide for an outline entry: its title, with the focus as body."""
+    slide_type, title = entry["type"], entry["title"]
+    if slide_type in IntelligenceService._OUTLINE_COMPLETE_TYPES:
+        return {"type": slide_type, "title": title, "subtitle": entry.get("subtitle", "")}
+    placeholder = [entry.get("focus") or "…"]
+    if slide_type == "metrics_slide":
+        return {"type": slide_type, "title": title,
+                "metrics": [{"value": "…", "label": placeholder[0], "change": ""}]}
+    if slide_type == "two_column":
+        return {"type": slide_type, "title": title, "left_title": "", "right_title": "",
+                "left_points": placeholder, "right_points": ["…"]}
+    return {"type": slide_type, "title": title, "bullet_points": placeholder}
+
+
+def skeleton_deck(outline: dict) -> dict:
+    """Renderable deck from an outline, before any slide body is written."""
+    return {"presentation_title": outline["presentation_title"],
+            "slides": [skeleton_slide(entry) for entry in outline["slides"]]}
+
+
+_WORD_RE = re.compile(r"\w{4,}")
+# Notes fields of the slide type examples (verbose and compact spec)
+_NOTES_EXAMPLE_RE = re.compile(r',\s*"(?:speaker_notes|n)": "talking points"')
+
+
+def _slide_text(slide: dict) -> str:
+    parts = []
+    for value in slide.values():
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, list):
+            parts.extend(json.dumps(item, ensure_ascii=False) if isinstance(item, dict) else str(item)
+                         for item in value)
+    return " ".join(parts)
+
+
+def _relevant_excerpt(text: str, slide: dict, max_chars: int) -> str:
+    """Source lines sharing the most words with the slide, in source order, within `max_chars`."""
+    if not text or max_chars <= 0:
+        return ""
+    if len(text) <= max_chars:
+        return text
+    terms = {w.lower() for w in _WORD_RE.findall(_slide_text(slide))}
+    lines = [line for line in text.splitlines() if line.strip()]
+    scored = sorted(
+        range(len(lines)),
+        key=lambda i: -len(terms & {w.lower() for w in _WORD_RE.findall(lines[i])}),
+    )
+    chosen, used = set(), 0
+    for i in scored:
+        if used + len(lines[i]) + 1 > max_chars:
+            continue
+        chosen.add(i)
+        used += len(lines[i]) + 1
+    return "\n".join(lines[i] for i in sorted(chosen))
 
-    def _mock_prompt_response(self, user_prompt: str):
-        """Mock response for prompt-based generation"""
-        time.sleep(2)
-        return {
-            "presentation_title": "Presentación Generada desde Prompt",
-            "slides": [
-                {
-                    "type": "title_slide",
-                    "title": "AI-Generated Strategic Presentation",
-                    "subtitle": f"Based on: {user_prompt[:80]}..."
-                },
-                {
-                    "type": "executive_summary",
-                    "title": "Key Points from Your Request",
-                    "bullet_points": [
-                        "Content generated based on your context",
-                        "AI-structured for maximum impact",
-                        "Professional formatting applied",
-                        "Ready for executive review"
-                    ],
-                    "speaker_notes": "This was generated from a user prompt in mock mode."
-                },
-                {
-                    "type": "metrics_slide",
-                    "title": "Projected Impact Metrics",
-                    "metrics": [
-                        {"value": "3x", "label": "Expected ROI", "change": "Year 1"},
-                        {"value": "40%", "label": "Efficiency Gain", "change": "vs Current"},
-                        {"value": "$2.5M", "label": "Cost Savings", "change": "Annual"},
-                        {"value": "95%", "label": "Success Rate", "change": "Industry Avg: 68%"}
-                    ],
-                    "speaker_notes": "Mock metrics for demonstration."
-                },
-                {
-                    "type": "content_slide",
-                    "title": "Strategic Recommendations",
-                    "bullet_points": [
-                        "Phase 1: Foundation and quick wins",
-                        "Phase 2: Scale and optimize",
-                        "Phase 3: Expand and innovate",
-                        "Timeline: 6-12 months to full deployment"
-                    ],
-                    "speaker_notes": "Connect Gemini API for real AI-generated content."
-                },
-                {
-                    "type": "section_divider",
-                    "title": "Next Steps",
-                    "subtitle": "Connect your Gemini API key for full AI generation"
-                }
-            ]
-        }
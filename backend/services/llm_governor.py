@@ -0,0 +1,271 @@
+"""
+LLM Concurrency Governor for SmartDeck AI
+
+Caps the Gemini calls in flight and finds the highest sustainable level
+on its own, like TCP congestion control (AIMD):
+- Every successful call raises the limit by 1/limit (about +1 per round
+  of calls), unless it was slower than the latency target
+- A quota error (HTTP 429) cuts the limit by a factor, once per round:
+  errors from calls started before the last cut do not cut it again
+- Calls over the limit wait in an earliest-deadline-first queue and only
+  fail when their deadline passes; quota errors are retried with backoff
+  within the same deadline instead of falling back to mock content
+- With a SQLite store, the limit and the in-flight leases are shared by
+  every worker process on the host
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class GovernorTimeout(Exception):
+    def __init__(self, waited: float):
+        super().__init__(f"No LLM call slot within the deadline (waited {waited:.1f}s)")
+        self.waited = waited
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    """429 / RESOURCE_EXHAUSTED from google-genai or the simulator."""
+    return getattr(exc, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(exc)
+
+
+def aimd(limit: float, outcome: str, min_limit: float, max_limit: float, decrease_factor: float) -> float:
+    """Next limit after a call: additive increase on "ok", multiplicative decrease on "quota"."""
+    if outcome == "ok":
+        return min(max_limit, limit + 1.0 / max(limit, 1.0))
+    if outcome == "quota":
+        return max(min_limit, limit * decrease_factor)
+    return limit
+
+
+# =========================================================================
+# Limit and lease stores
+# =========================================================================
+
+class MemoryGovernorStore:
+    """Limit and in-flight count of this process."""
+
+    def __init__(self, initial_limit: float):
+        self.limit = initial_limit
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def try_lease(self):
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return None
+            self.in_flight += 1
+            return True
+
+    def release(self, lease):
+        with self._lock:
+            self.in_flight -= 1
+
+    def adjust(self, outcome: str, call_started: float, **aimd_args) -> float:
+        with self._lock:
+            if outcome == "quota" and call_started < self.last_decrease:
+                return self.limit
+            if outcome == "quota":
+                self.last_decrease = time.time()
+            self.limit = aimd(self.limit, outcome, **aimd_args)
+            return self.limit
+
+    def snapshot(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight}
+
+
+class SQLiteGovernorStore:
+    """
+    Limit and in-flight leases in a SQLite file shared by the worker
+    processes on the host. Leases expire, so a crashed worker cannot hold
+    slots forever.
+    """
+
+    def __init__(self, path: str, initial_limit: float, lease_seconds: float = 300):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS governor "
+                         "(id INTEGER PRIMARY KEY CHECK (id = 1), lim REAL NOT NULL, last_decrease REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, expires REAL NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO governor (id, lim, last_decrease) VALUES (1, ?, 0)", (initial_limit,))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def try_lease(self):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            limit = conn.execute("SELECT lim FROM governor WHERE id = 1").fetchone()[0]
+            in_flight = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+            if in_flight >= int(limit):
+                return None
+            lease = uuid.uuid4().hex
+            conn.execute("INSERT INTO leases (id, expires) VALUES (?, ?)", (lease, now + self.lease_seconds))
+            return lease
+
+    def release(self, lease):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease,))
+
+    def adjust(self, outcome: str, call_started: float, **aimd_args) -> float:
+        with self._transaction() as conn:
+            limit, last_decrease = conn.execute("SELECT lim, last_decrease FROM governor WHERE id = 1").fetchone()
+            if outcome == "quota" and call_started < last_decrease:
+                return limit
+            if outcome == "quota":
+                last_decrease = time.time()
+            limit = aimd(limit, outcome, **aimd_args)
+            conn.execute("UPDATE governor SET lim = ?, last_decrease = ? WHERE id = 1", (limit, last_decrease))
+            return limit
+
+    def snapshot(self) -> dict:
+        with self._transaction() as conn:
+            limit = conn.execute("SELECT lim FROM governor WHERE id = 1").fetchone()[0]
+            in_flight = conn.execute("SELECT COUNT(*) FROM leases WHERE expires >= ?", (time.time(),)).fetchone()[0]
+        return {"limit": limit, "in_flight": in_flight}
+
+
+# =========================================================================
+# Governor
+# =========================================================================
+
+class LLMGovernor:
+    def __init__(self, store, min_limit: float = 1, max_limit: float = 32, decrease_factor: float = 0.5,
+                 latency_target_seconds: float = 0.0, poll_seconds: float = 0.05):
+        self.store = store
+        self.aimd_args = {"min_limit": min_limit, "max_limit": max_limit, "decrease_factor": decrease_factor}
+        self.latency_target_seconds = latency_target_seconds
+        self.poll_seconds = poll_seconds
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._poller = None
+        self.stats = {"calls": 0, "quota_errors": 0, "decreases": 0, "queued": 0, "timeouts": 0}
+        metrics.LLM_CONCURRENCY_LIMIT.set(self.store.snapshot()["limit"])
+
+    @classmethod
+    def from_settings(cls, settings):
+        if settings.LLM_GOVERNOR_STORE == "sqlite":
+            store = SQLiteGovernorStore(settings.LLM_GOVERNOR_SQLITE_PATH, settings.LLM_GOVERNOR_INITIAL_LIMIT)
+        else:
+            store = MemoryGovernorStore(settings.LLM_GOVERNOR_INITIAL_LIMIT)
+        return cls(
+            store,
+            min_limit=settings.LLM_GOVERNOR_MIN_LIMIT,
+            max_limit=settings.LLM_GOVERNOR_MAX_LIMIT,
+            decrease_factor=settings.LLM_GOVERNOR_DECREASE_FACTOR,
+            latency_target_seconds=settings.LLM_GOVERNOR_LATENCY_TARGET_SECONDS,
+        )
+
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, deadline: float):
+        """Lease a call slot, waiting until `deadline` (time.monotonic()) at the latest."""
+        if not self.queue_depth():
+            lease = self.store.try_lease()
+            if lease is not None:
+                metrics.LLM_IN_FLIGHT.inc()
+                return lease
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (deadline, next(self._sequence), future))
+        self.stats["queued"] += 1
+        metrics.LLM_QUEUE_DEPTH.inc()
+        self._schedule_poll()
+        try:
+            lease = await asyncio.wait_for(future, max(0.0, deadline - started))
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            metrics.LLM_QUEUE_TIMEOUTS.inc()
+            raise GovernorTimeout(time.monotonic() - started) from None
+        except asyncio.CancelledError:
+            # Cancelled right after being granted a slot: give it back
+            if future.done() and not future.cancelled():
+                self.release(future.result(), "cancelled", time.time())
+            raise
+        finally:
+            metrics.LLM_QUEUE_DEPTH.dec()
+            metrics.LLM_QUEUE_SECONDS.observe(time.monotonic() - started)
+        return lease
+
+    def release(self, lease, outcome: str, call_started: float, latency: float | None = None):
+        """
+        Return the slot and feed the call's outcome ("ok", "quota", "error"
+        or "cancelled") into the limit. `call_started` is time.time().
+        """
+        self.store.release(lease)
+        metrics.LLM_IN_FLIGHT.dec()
+        self.stats["calls"] += 1
+        if outcome == "ok" and self.latency_target_seconds and latency and latency > self.latency_target_seconds:
+            outcome = "slow"  # hold: no increase while the API is slowing down
+        if outcome == "quota":
+            self.stats["quota_errors"] += 1
+        before = self.store.snapshot()["limit"] if outcome == "quota" else None
+        limit = self.store.adjust(outcome, call_started, **self.aimd_args)
+        if before is not None and limit < before:
+            self.stats["decreases"] += 1
+            metrics.LLM_LIMIT_DECREASES.inc()
+            logger.warning(f"LLM quota error: concurrency limit {before:.1f} -> {limit:.1f}")
+        metrics.LLM_CONCURRENCY_LIMIT.set(limit)
+        self._grant()
+
+    def snapshot(self) -> dict:
+        return {**self.store.snapshot(), "queue_depth": self.queue_depth(), **self.stats}
+
+    def _grant(self):
+        """Hand free slots to waiters, earliest deadline first."""
+        while self._waiters:
+            _, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            lease = self.store.try_lease()
+            if lease is None:
+                break
+            heapq.heappop(self._waiters)
+            metrics.LLM_IN_FLIGHT.inc()
+            future.set_result(lease)
+
+    def _schedule_poll(self):
+        # Slots freed by other processes (shared store) or by a higher limit
+        # are not announced here, so waiters re-check on a timer
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _poll(self):
+        while self.queue_depth():
+            self._grant()
+            await asyncio.sleep(self.poll_seconds)
@@ -0,0 +1,409 @@
+"""
+Offline LLM Simulator for SmartDeck AI
+
+Stands in for Gemini when no API key is configured (local dev, CI, load
+tests). Unlike a fixed canned response it behaves like a remote model:
+- Async latency: fixed or log-normal, with optional tail spikes and a
+  per-output-token cost
+- Configurable failure rate (429 quota / 503 unavailable) and rate of
+  malformed (truncated) JSON
+- Deterministic output: the same input always yields the same slides
+- Answers in the compact wire schema when the prompt asks for it, and
+  without speaker notes when they are deferred to a later call
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import math
+import random
+import re
+from types import SimpleNamespace
+
+from services.compact_schema import COMPACT_MARKER, compact_deck, expand_slide
+from services.prompt_packer import TokenEstimator
+from services.slide_schema import NOTES_DEFERRED_RULE, coerce_slide
+
+MOCK_ANALYSIS_DECK = {
+    "presentation_title": "Q3 2024 Executive Business Review",
+    "slides": [
+        {
+            "type": "title_slide",
+            "title": "Revenue Grew 18% to $45.2M, Beating Target by $3.5M",
+            "subtitle": "Q3 2024 Executive Business Review"
+        },
+        {
+            "type": "executive_summary",
+            "title": "Four Key Wins Define Q3 Performance",
+            "bullet_points": [
+                "Revenue: $45.2M (+18% YoY), beat target by $3.5M",
+                "Margins: Operating margin reached 24%, up from 19%",
+                "Customers: NPS hit 72, retention climbed to 96%",
+                "Expansion: Launched in 3 new European markets"
+            ],
+            "speaker_notes": "Lead with the revenue beat to set positive tone."
+        },
+        {
+            "type": "metrics_slide",
+            "title": "All Key Metrics Exceeded Targets",
+            "metrics": [
+                {"value": "$45.2M", "label": "Q3 Revenue", "change": "+18% YoY"},
+                {"value": "24%", "label": "Operating Margin", "change": "+5pts vs Q2"},
+                {"value": "96%", "label": "Customer Retention", "change": "+3pts vs Q2"},
+                {"value": "72", "label": "Net Promoter Score", "change": "Highest ever"},
+                {"value": "$42K", "label": "Avg Contract Value", "change": "+18% YoY"},
+                {"value": "89%", "label": "Recurring Revenue", "change": "+5pts vs Q2"}
+            ],
+            "speaker_notes": "Use this slide as an at-a-glance dashboard."
+        },
+        {
+            "type": "content_slide",
+            "title": "Enterprise Segment Drove 62% of Revenue",
+            "bullet_points": [
+                "Enterprise: $28M (+25% YoY), now 62% of total",
+                "SMB segment: $12.5M (+5% YoY), stable",
+                "New product line: $4.7M in first full quarter",
+                "Recurring revenue: 89%, up from 84%"
+            ],
+            "speaker_notes": "Enterprise is the growth engine."
+        },
+        {
+            "type": "content_slide",
+            "title": "Operational Leverage Expanded Margins 500bps",
+            "bullet_points": [
+                "Operating margin: 24% (target: 21%)",
+                "CAC efficiency: $0.42 per $1 LTV",
+                "R&D shipped 3 major features vs 2 planned",
+                "G&A reduced to 12% of revenue (from 15%)"
+            ],
+            "speaker_notes": "Margin expansion from efficiency, not cuts."
+        },
+        {
+            "type": "section_divider",
+            "title": "Risks & Challenges",
+            "subtitle": "Three areas requiring strategic attention"
+        },
+        {
+            "type": "challenges_slide",
+            "title": "Three Risks Require Immediate Action",
+            "bullet_points": [
+                "Competition: 2 new entrants in core market",
+                "Sales cycle: Lengthened to 47 days (+24%)",
+                "SMB churn: 8% in <$10K accounts (target: 5%)",
+                "Hiring gap: 12 of 18 engineering hires filled"
+            ],
+            "speaker_notes": "Be transparent. Sales cycle fix underway."
+        },
+        {
+            "type": "two_column",
+            "title": "Strengths Position Us to Address Challenges",
+            "left_title": "Strengths",
+            "right_title": "Actions Needed",
+            "left_points": [
+                "Enterprise growth at 25% YoY",
+                "Best-in-class NPS of 72",
+                "Strong margins at 24%",
+                "89% recurring revenue"
+            ],
+            "right_points": [
+                "Hire 5 senior AEs by Nov 1",
+                "Launch competitive response ($2M)",
+                "Implement automated SMB onboarding",
+                "Accelerate engineering hiring"
+            ],
+            "speaker_notes": "Frame challenges as opportunities."
+        },
+        {
+            "type": "content_slide",
+            "title": "Five Strategic Priorities for Q4",
+            "bullet_points": [
+                "Double enterprise sales capacity: 5 new AEs",
+                "Launch competitive response: $2M budget",
+                "Ship AI features to widen product moat",
+                "Automate SMB onboarding to reduce churn",
+                "Expand partner channel: 10 new partners"
+            ],
+            "speaker_notes": "All priorities are funded."
+        },
+        {
+            "type": "metrics_slide",
+            "title": "Q4 Targets: Path to $200M ARR",
+            "metrics": [
+                {"value": "$52M", "label": "Q4 Revenue Target", "change": "+15% vs Q3"},
+                {"value": "$175M", "label": "Full Year 2024", "change": "vs $170M target"},
+                {"value": "28%", "label": "Target Op. Margin", "change": "+4pts vs Q3"},
+                {"value": "$200M", "label": "ARR Milestone", "change": "By Q1 2025"}
+            ],
+            "speaker_notes": "$200M ARR milestone positions us for Series C."
+        }
+    ]
+}
+
+MOCK_PROMPT_DECK = {
+    "presentation_title": "Presentación Generada desde Prompt",
+    "slides": [
+        {
+            "type": "title_slide",
+            "title": "AI-Generated Strategic Presentation",
+            "subtitle": "Based on: {request}"
+        },
+        {
+            "type": "executive_summary",
+            "title": "Key Points from Your Request",
+            "bullet_points": [
+                "Content generated based on your context",
+                "AI-structured for maximum impact",
+                "Professional formatting applied",
+                "Ready for executive review"
+            ],
+            "speaker_notes": "This was generated from a user prompt in mock mode."
+        },
+        {
+            "type": "metrics_slide",
+            "title": "Projected Impact Metrics",
+            "metrics": [
+                {"value": "3x", "label": "Expected ROI", "change": "Year 1"},
+                {"value": "40%", "label": "Efficiency Gain", "change": "vs Current"},
+                {"value": "$2.5M", "label": "Cost Savings", "change": "Annual"},
+                {"value": "95%", "label": "Success Rate", "change": "Industry Avg: 68%"}
+            ],
+            "speaker_notes": "Mock metrics for demonstration."
+        },
+        {
+            "type": "content_slide",
+            "title": "Strategic Recommendations",
+            "bullet_points": [
+                "Phase 1: Foundation and quick wins",
+                "Phase 2: Scale and optimize",
+                "Phase 3: Expand and innovate",
+                "Timeline: 6-12 months to full deployment"
+            ],
+            "speaker_notes": "Connect Gemini API for real AI-generated content."
+        },
+        {
+            "type": "section_divider",
+            "title": "Next Steps",
+            "subtitle": "Connect your Gemini API key for full AI generation"
+        }
+    ]
+}
+
+_NUMBER_RE = re.compile(r"[$€]?\d[\d.,]*%?")
+
+
+class SimulatedLLMError(Exception):
+    """Raised for simulated upstream failures; `code` mirrors the HTTP status."""
+
+    def __init__(self, code: int, status: str):
+        super().__init__(f"{code} {status}: simulated upstream failure")
+        self.code = code
+        self.status = status
+
+
+class LatencyModel:
+    def __init__(self, mode: str = "fixed", median_ms: float = 2000, sigma: float = 0.5,
+                 tail_probability: float = 0.0, tail_multiplier: float = 5.0,
+                 ms_per_output_token: float = 0.0):
+        self.mode = mode
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.tail_probability = tail_probability
+        self.tail_multiplier = tail_multiplier
+        self.ms_per_output_token = ms_per_output_token
+
+    def sample(self, rng: random.Random, output_tokens: int = 0) -> float:
+        """Seconds to wait for one call."""
+        if self.mode == "lognormal":
+            ms = rng.lognormvariate(math.log(max(self.median_ms, 1e-3)), self.sigma)
+        else:
+            ms = self.median_ms
+        if self.tail_probability and rng.random() < self.tail_probability:
+            ms *= self.tail_multiplier
+        ms += self.ms_per_output_token * output_tokens
+        return ms / 1000
+
+
+class LLMSimulator:
+    def __init__(self, latency: LatencyModel | None = None, failure_rate: float = 0.0,
+                 quota_error_share: float = 0.5, malformed_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency or LatencyModel()
+        self.failure_rate = failure_rate
+        self.quota_error_share = quota_error_share
+        self.malformed_rate = malformed_rate
+        # Latency and fault injection; content uses per-input seeds instead
+        self._rng = random.Random(seed)
+        self._estimator = TokenEstimator()
+        self.calls = 0
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            latency=LatencyModel(
+                mode=settings.MOCK_LATENCY_MODE,
+                median_ms=settings.MOCK_LATENCY_MS,
+                sigma=settings.MOCK_LATENCY_SIGMA,
+                tail_probability=settings.MOCK_TAIL_PROBABILITY,
+                tail_multiplier=settings.MOCK_TAIL_MULTIPLIER,
+                ms_per_output_token=settings.MOCK_MS_PER_OUTPUT_TOKEN,
+            ),
+            failure_rate=settings.MOCK_FAILURE_RATE,
+            quota_error_share=settings.MOCK_QUOTA_ERROR_SHARE,
+            malformed_rate=settings.MOCK_MALFORMED_RATE,
+            seed=settings.MOCK_SEED,
+        )
+
+    async def generate(self, task: str, prompt: str, full_prompt: str | None = None):
+        """Simulate one model call. `prompt` is the variable part used as seed."""
+        self.calls += 1
+        full_prompt = full_prompt or ""
+        text = self.build_output(task, prompt, compact=COMPACT_MARKER in full_prompt,
+                                 notes=NOTES_DEFERRED_RULE not in full_prompt)
+        output_tokens = self._estimator.raw_estimate(text)
+        await asyncio.sleep(self.latency.sample(self._rng, output_tokens))
+
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            if self._rng.random() < self.quota_error_share:
+                raise SimulatedLLMError(429, "RESOURCE_EXHAUSTED")
+            raise SimulatedLLMError(503, "UNAVAILABLE")
+        if task != "summary" and self.malformed_rate and self._rng.random() < self.malformed_rate:
+            # Truncated mid-output, like a response cut at max tokens
+            text = text[:self._rng.randint(len(text) // 2, len(text) - 2)]
+
+        usage = SimpleNamespace(
+            prompt_token_count=self._estimator.raw_estimate(full_prompt or prompt),
+            candidates_token_count=output_tokens,
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    # =========================================================================
+    # Deterministic content
+    # =========================================================================
+
+    @staticmethod
+    def _rng_for(prompt: str) -> random.Random:
+        return random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+
+    @staticmethod
+    def _payload(prompt: str) -> str:
+        """Text after the '=== LABEL ===' header of a data section."""
+        parts = prompt.split("===", 2)
+        return parts[2].strip() if len(parts) == 3 else prompt.strip()
+
+    def build_output(self, task: str, prompt: str, compact: bool = False, notes: bool = True) -> str:
+        rng = self._rng_for(prompt)
+        if task == "insights":
+            return json.dumps(self._insights(prompt, rng), ensure_ascii=False)
+        if task == "notes":
+            return json.dumps(self._notes(prompt), ensure_ascii=False)
+        if task == "summary":
+            return "Datos simulados: contenido de negocio con métricas y tendencias. Se recomienda un estilo ejecutivo."
+        if task == "repair":
+            deck = self._repair(prompt)
+        elif task == "prompt":
+            deck = self._prompt_deck(prompt, rng)
+        elif task == "slide":
+            deck = self._slide(prompt, rng)
+        elif task == "outline":
+            deck = self._outline(prompt, rng)
+        elif task == "fill":
+            deck = self._fill(prompt, rng)
+        else:
+            deck = self.sample_deck(rng)
+        if not notes:
+            for slide in deck.get("slides", []):
+                slide.pop("speaker_notes", None)
+        if compact:
+            compacted = compact_deck(deck)
+            deck = compacted if "presentation_title" in deck else {"s": compacted["s"]}
+        return json.dumps(deck, ensure_ascii=False)
+
+    @staticmethod
+    def sample_deck(rng: random.Random) -> dict:
+        """The analysis deck with a deterministic subset of its body slides."""
+        deck = copy.deepcopy(MOCK_ANALYSIS_DECK)
+        cover, body = deck["slides"][0], deck["slides"][1:]
+        drop = set(rng.sample(range(len(body)), rng.randint(0, 2)))
+        deck["slides"] = [cover] + [s for i, s in enumerate(body) if i not in drop]
+        return deck
+
+    def _prompt_deck(self, prompt: str, rng: random.Random) -> dict:
+        request = self._payload(prompt)
+        deck = copy.deepcopy(MOCK_PROMPT_DECK)
+        deck["slides"][0]["subtitle"] = f"Based on: {request[:80]}..."
+        # Pad to a realistic 8-10 slides from the analysis pool
+        pool = copy.deepcopy(MOCK_ANALYSIS_DECK["slides"][1:])
+        extra = rng.sample(pool, rng.randint(3, 5))
+        deck["slides"] = deck["slides"][:-1] + extra + deck["slides"][-1:]
+        return deck
+
+    def _slide(self, prompt: str, rng: random.Random) -> dict:
+        """Another slide of the same type from the analysis pool."""
+        try:
+            current = expand_slide(json.loads(self._payload(prompt)).get("slide")) or {}
+        except (json.JSONDecodeError, AttributeError):
+            current = {}
+        pool = [s for s in MOCK_ANALYSIS_DECK["slides"] if s["type"] == current.get("type") and s != current]
+        slide = copy.deepcopy(rng.choice(pool)) if pool else coerce_slide(current) or copy.deepcopy(
+            MOCK_ANALYSIS_DECK["slides"][2])
+        slide["title"] = f"{slide.get('title', '')} ({rng.randint(2, 99)})".strip()
+        return {"slides": [slide]}
+
+    def _outline(self, prompt: str, rng: random.Random) -> dict:
+        """Types and titles of the deck a single call would have written."""
+        deck = self._prompt_deck(prompt, rng) if "USER'S REQUEST" in prompt else self.sample_deck(rng)
+        entries = []
+        for slide in deck["slides"]:
+            entry = {"type": slide["type"], "title": slide["title"]}
+            if "subtitle" in slide:
+                entry["subtitle"] = slide["subtitle"]
+            else:
+                points = slide.get("bullet_points") or slide.get("left_points") or [
+                    m["label"] for m in slide.get("metrics", [])]
+                entry["focus"] = " ".join(points[0].split()[:8]) if points else ""
+            entries.append(entry)
+        return {"presentation_title": deck["presentation_title"], "slides": entries}
+
+    def _fill(self, prompt: str, rng: random.Random) -> dict:
+        """A body from the analysis pool for the requested type, under the outline's title."""
+        try:
+            wanted = expand_slide(json.loads(self._payload(prompt)).get("slide")) or {}
+        except (json.JSONDecodeError, AttributeError):
+            wanted = {}
+        pool = [s for s in MOCK_ANALYSIS_DECK["slides"] if s["type"] == wanted.get("type")]
+        slide = copy.deepcopy(rng.choice(pool)) if pool else copy.deepcopy(MOCK_ANALYSIS_DECK["slides"][3])
+        slide["title"] = wanted.get("title") or slide["title"]
+        return {"slides": [slide]}
+
+    def _notes(self, prompt: str) -> dict:
+        """Talking points built from each slide's own title and first point."""
+        try:
+            slides = json.loads(self._payload(prompt)).get("slides") or []
+        except (json.JSONDecodeError, AttributeError):
+            slides = []
+        notes = []
+        for slide in (expand_slide(s) for s in slides):
+            points = slide.get("bullet_points") or slide.get("left_points") or [
+                m.get("label", "") for m in slide.get("metrics", [])]
+            lead = f" Stress this first: {points[0]}." if points else ""
+            notes.append(f"{slide.get('title', '')}.{lead} Then move on to the next slide.")
+        return {"notes": notes}
+
+    def _insights(self, prompt: str, rng: random.Random) -> dict:
+        data = self._payload(prompt)
+        numbers = _NUMBER_RE.findall(data)[:40]
+        picks = rng.sample(numbers, min(3, len(numbers))) if numbers else []
+        return {
+            "summary": f"Simulated insights for {len(data)} characters of data.",
+            "key_points": [f"Observed value {n} in this part" for n in picks] or ["No numeric data in this part"],
+            "metrics": [{"value": n, "label": f"Metric {i + 1}", "change": ""} for i, n in enumerate(picks[:2])],
+        }
+
+    def _repair(self, prompt: str) -> dict:
+        payload = self._payload(prompt)
+        start = payload.find("[")
+        try:
+            broken = json.loads(payload[start:]) if start != -1 else []
+        except json.JSONDecodeError:
+            broken = []
+        slides = [coerce_slide(expand_slide(item.get("slide"))) for item in broken if isinstance(item, dict)]
+        return {"slides": [s or {"type": "section_divider", "title": "—"} for s in slides]}
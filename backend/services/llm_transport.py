@@ -0,0 +1,134 @@
+"""
+Gemini HTTP Transport for SmartDeck AI
+
+The google-genai client sends its async calls through one httpx.AsyncClient
+per process, built here instead of with the library defaults:
+- Pool size, idle keep-alive connections and their expiry, HTTP/2 (needs
+  the optional `h2` package; HTTP/1.1 without it) and separate connect /
+  read / write / pool timeouts, all from config.Settings
+- warm_connections() opens pooled connections before traffic arrives, so
+  the first calls skip DNS, TCP and TLS setup
+- Every request records whether it went out on a pooled connection or
+  had to open one (httpcore trace events), and how long connecting took
+"""
+import asyncio
+import logging
+import threading
+import time
+
+import httpx
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStats:
+    """Requests on new vs reused connections, and the time spent connecting."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.new = 0
+        self.reused = 0
+        self.connect_seconds = 0.0
+
+    def record(self, connect_seconds: float | None = None):
+        with self._lock:
+            if connect_seconds is None:
+                self.reused += 1
+            else:
+                self.new += 1
+                self.connect_seconds += connect_seconds
+        metrics.LLM_CONNECTIONS.labels("new" if connect_seconds is not None else "reused").inc()
+        if connect_seconds is not None:
+            metrics.LLM_CONNECT_SECONDS.observe(connect_seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.new + self.reused
+            return {
+                "requests": total,
+                "new_connections": self.new,
+                "reused_connections": self.reused,
+                "reuse_ratio": round(self.reused / total, 3) if total else 0.0,
+                "avg_connect_seconds": round(self.connect_seconds / self.new, 4) if self.new else 0.0,
+            }
+
+
+class TracingTransport(httpx.AsyncHTTPTransport):
+    """
+    Pooled transport that applies the configured timeouts to every request
+    (google-genai passes its own, a single total or none at all) and
+    reports connection reuse.
+    """
+
+    def __init__(self, timeouts: httpx.Timeout, stats: ConnectionStats, **kwargs):
+        super().__init__(**kwargs)
+        self.timeouts = timeouts.as_dict()
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        marks = {}
+
+        async def trace(event: str, info: dict):
+            # connection.connect_tcp.* (and start_tls.*) only fire on a new connection
+            if event.startswith("connection.") and event.endswith((".started", ".complete")):
+                marks.setdefault(event, time.perf_counter())
+
+        request.extensions["timeout"] = self.timeouts
+        request.extensions["trace"] = trace
+        response = await super().handle_async_request(request)
+        started = marks.get("connection.connect_tcp.started")
+        if started is None:
+            self.stats.record()
+        else:
+            finished = marks.get("connection.start_tls.complete") or marks.get("connection.connect_tcp.complete")
+            self.stats.record((finished or time.perf_counter()) - started)
+        return response
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_http_client(settings, stats: ConnectionStats) -> httpx.AsyncClient:
+    """The pooled keep-alive client for the Gemini API."""
+    http2 = settings.LLM_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("LLM_HTTP2 is on but the h2 package is not installed; using HTTP/1.1")
+        http2 = False
+    timeouts = httpx.Timeout(
+        connect=settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS,
+        read=settings.LLM_HTTP_READ_TIMEOUT_SECONDS,
+        write=settings.LLM_HTTP_WRITE_TIMEOUT_SECONDS,
+        pool=settings.LLM_HTTP_POOL_TIMEOUT_SECONDS,
+    )
+    limits = httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_SECONDS,
+    )
+    transport = TracingTransport(timeouts, stats, limits=limits, http2=http2)
+    return httpx.AsyncClient(transport=transport, timeout=timeouts, limits=limits, http2=http2)
+
+
+async def warm_connections(http: httpx.AsyncClient, base_url: str, count: int) -> int:
+    """
+    Open `count` pooled connections to `base_url` at once (concurrent
+    requests to the API root: any answer, even a 404, leaves a connection
+    in the keep-alive pool). Returns how many requests succeeded.
+    """
+    if count <= 0:
+        return 0
+    started = time.perf_counter()
+    results = await asyncio.gather(*(http.get(base_url) for _ in range(count)), return_exceptions=True)
+    opened = sum(1 for r in results if isinstance(r, httpx.Response))
+    for failure in (r for r in results if isinstance(r, BaseException)):
+        logger.warning(f"Connection warm-up to {base_url} failed: {failure}")
+        break
+    logger.info(f"Warmed {opened}/{count} connections to {base_url} in {time.perf_counter() - started:.2f}s")
+    return opened
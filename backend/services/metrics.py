@@ -0,0 +1,164 @@
+"""
+Pipeline Metrics for SmartDeck AI
+
+Prometheus collectors for every stage of a generation request, served by
+GET /metrics:
+- Uploads and extraction (bytes and seconds per file type), retrieval
+  index builds
+- Prompts and LLM calls (size, latency, error class per task; latency
+  and tokens per model tier), model routing decisions, the concurrency
+  governor (limit, in flight, queue depth and wait) and connection reuse
+  of the Gemini HTTP client
+- Deck parsing (malformed JSON, mock fallbacks) and rendering (seconds,
+  bytes, slide fragment cache hits, deferred speaker notes)
+- Sessions, rate-limit charges and rejections, admission queueing,
+  coalesced requests, semantic cache lookups and per-route HTTP latency
+
+Collectors are prometheus_client's, which are thread-safe. To aggregate
+across worker processes, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory before the app starts; every worker then writes its samples
+there and /metrics merges them.
+"""
+import asyncio
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+_BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8, 2e8)
+_FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+_SIZE_BUCKETS = (100, 1e3, 4e3, 1.6e4, 6.4e4, 2.56e5, 1e6)
+
+UPLOAD_BYTES = Histogram(
+    "smartdeck_upload_bytes", "Size of each uploaded file", ["file_type"], buckets=_BYTES_BUCKETS)
+EXTRACTION_SECONDS = Histogram(
+    "smartdeck_extraction_seconds", "Text extraction time per file", ["file_type"], buckets=_FAST_BUCKETS)
+EXTRACTED_CHARS = Histogram(
+    "smartdeck_extracted_chars", "Characters extracted per file", ["file_type"], buckets=_SIZE_BUCKETS)
+
+RETRIEVAL_INDEX_SECONDS = Histogram(
+    "smartdeck_retrieval_index_seconds", "Time to chunk and index an input for retrieval",
+    buckets=_FAST_BUCKETS)
+PROMPT_CHARS = Histogram(
+    "smartdeck_prompt_chars", "Characters sent per LLM call", ["task"], buckets=_SIZE_BUCKETS)
+PROMPT_TOKENS = Histogram(
+    "smartdeck_prompt_tokens", "Prompt tokens per LLM call (reported, else estimated)", ["task"],
+    buckets=_SIZE_BUCKETS)
+OUTPUT_TOKENS = Histogram(
+    "smartdeck_output_tokens", "Generated tokens per LLM call", ["task"], buckets=_SIZE_BUCKETS)
+LLM_SECONDS = Histogram(
+    "smartdeck_llm_request_seconds", "LLM call latency", ["task", "outcome"], buckets=_LLM_BUCKETS)
+LLM_ERRORS = Counter(
+    "smartdeck_llm_errors_total", "Failed LLM calls by error class", ["task", "error_class"])
+LLM_CONNECTIONS = Counter(
+    "smartdeck_llm_connections_total",
+    "Gemini API requests by connection: reused (pooled keep-alive) or new; reuse rate = reused / total",
+    ["connection"])
+LLM_CONNECT_SECONDS = Histogram(
+    "smartdeck_llm_connect_seconds", "TCP and TLS setup time of new Gemini API connections", buckets=_FAST_BUCKETS)
+LLM_ROUTES = Counter(
+    "smartdeck_llm_routes_total",
+    "LLM calls by model tier and why it was chosen (task, load, quota or retry)", ["task", "tier", "reason"])
+LLM_TIER_SECONDS = Histogram(
+    "smartdeck_llm_tier_seconds", "Successful LLM call latency per task and model tier", ["task", "tier"],
+    buckets=_LLM_BUCKETS)
+LLM_TIER_TOKENS = Counter(
+    "smartdeck_llm_tier_tokens_total", "Tokens per task and model tier (direction: prompt or output)",
+    ["task", "tier", "direction"])
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "smartdeck_llm_concurrency_limit", "Current AIMD limit on LLM calls in flight", multiprocess_mode="livemax")
+LLM_IN_FLIGHT = Gauge(
+    "smartdeck_llm_in_flight", "LLM calls holding a governor slot", multiprocess_mode="livesum")
+LLM_QUEUE_DEPTH = Gauge(
+    "smartdeck_llm_queue_depth", "LLM calls waiting for a governor slot", multiprocess_mode="livesum")
+LLM_QUEUE_SECONDS = Histogram(
+    "smartdeck_llm_queue_seconds", "Time an LLM call waited for a governor slot", buckets=_LLM_BUCKETS)
+LLM_QUEUE_TIMEOUTS = Counter(
+    "smartdeck_llm_queue_timeouts_total", "LLM calls whose deadline passed while queued")
+LLM_LIMIT_DECREASES = Counter(
+    "smartdeck_llm_limit_decreases_total", "Times a quota error cut the LLM concurrency limit")
+
+JSON_PARSE_FAILURES = Counter(
+    "smartdeck_json_parse_failures_total", "Deck responses that were not valid JSON", ["outcome"])
+MOCK_FALLBACKS = Counter(
+    "smartdeck_mock_fallbacks_total", "Requests answered with the canned mock deck", ["reason"])
+
+RENDER_SECONDS = Histogram(
+    "smartdeck_render_seconds", "PPTX rendering time, including pool queueing", buckets=_FAST_BUCKETS)
+RENDER_QUEUE_SECONDS = Histogram(
+    "smartdeck_render_queue_seconds", "Time a deck waited for a render worker", buckets=_FAST_BUCKETS)
+SLIDE_FRAGMENTS = Counter(
+    "smartdeck_slide_fragments_total",
+    "Slides by source: hit (fragment cache), deck (the deck's stored fragments) or miss (rendered)",
+    ["outcome"])
+DEFERRED_NOTES_SECONDS = Histogram(
+    "smartdeck_deferred_notes_seconds",
+    "Time from a deck's response to its speaker notes being patched in, by outcome (ready or failed)",
+    ["outcome"], buckets=_LLM_BUCKETS)
+OUTPUT_BYTES = Histogram(
+    "smartdeck_output_bytes", "Size of generated PPTX files", buckets=_BYTES_BUCKETS)
+
+ACTIVE_SESSIONS = Gauge(
+    "smartdeck_active_sessions", "Analyzed sessions held in memory", multiprocess_mode="livesum")
+RATE_LIMIT_REJECTIONS = Counter(
+    "smartdeck_rate_limit_rejections_total", "Requests rejected by the rate limiter", ["route"])
+RATE_LIMIT_UNITS = Histogram(
+    "smartdeck_rate_limit_units", "Work units charged per request", ["route"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 40, 60))
+ADMISSION_WAIT_SECONDS = Histogram(
+    "smartdeck_admission_wait_seconds", "Time a generation waited for a slot", ["priority"],
+    buckets=_FAST_BUCKETS)
+ADMISSION_TIMEOUTS = Counter(
+    "smartdeck_admission_timeouts_total", "Generations that found no slot in time", ["priority"])
+COALESCED_REQUESTS = Counter(
+    "smartdeck_coalesced_requests_total",
+    "Generations by single-flight role; coalescing ratio = follower / (leader + follower)",
+    ["kind", "role"])
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "smartdeck_semantic_cache_total",
+    "Semantic cache outcomes: hit or miss per lookup, rejected per near candidate not served", ["outcome"])
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "smartdeck_semantic_cache_similarity", "Prompt similarity of semantic cache hits",
+    buckets=(0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0))
+SEMANTIC_CACHE_FALSE_POSITIVES = Counter(
+    "smartdeck_semantic_cache_false_positives_total", "Semantic cache hits reported as wrong by users")
+HTTP_SECONDS = Histogram(
+    "smartdeck_http_request_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=_LLM_BUCKETS)
+
+
+def file_type(filename: str, allowed: set) -> str:
+    """Extension label, bounded to the allowed set to keep cardinality low."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext.lstrip(".") if ext in allowed else "other"
+
+
+def error_class(exc: BaseException) -> str:
+    """Low-cardinality label for a failed LLM call."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return f"http_{code}"
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(exc).__name__:
+        return "timeout"
+    if isinstance(exc, (ConnectionError, OSError)) or "Connect" in type(exc).__name__:
+        return "connection"
+    return type(exc).__name__
+
+
+def render_latest() -> tuple:
+    """Exposition payload and content type for GET /metrics."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,81 @@
+"""
+Model Routing for SmartDeck AI
+
+Picks the Gemini model per call instead of one model for every task:
+- Two tiers: "fast" (cheaper, lower latency) and "strong" (best output)
+- Every task ("summary", "outline", "structure", "prompt", ...) has a
+  configured tier; unknown tasks use the strong one
+- Strong calls are downgraded to the fast tier while the process is
+  loaded (the LLM governor's queue at or above a depth) and for a
+  cooldown after a quota error on the strong model, whose quota is
+  usually the scarcer one
+- A strong call that hits a quota error is retried on the fast model
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+FAST = "fast"
+STRONG = "strong"
+
+
+@dataclass(frozen=True)
+class Route:
+    """Model chosen for one call and why: "task" (configured), "load", "quota" or "retry"."""
+    task: str
+    tier: str
+    model: str
+    reason: str = "task"
+
+
+class ModelRouter:
+    def __init__(self, models: dict, task_tiers: dict, downgrade_queue_depth: int = 0,
+                 quota_cooldown_seconds: float = 60.0):
+        self.models = models
+        self.task_tiers = task_tiers
+        self.downgrade_queue_depth = downgrade_queue_depth
+        self.quota_cooldown_seconds = quota_cooldown_seconds
+        self._quota_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"routed": 0, "downgraded_load": 0, "downgraded_quota": 0, "retried_fast": 0}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            {FAST: settings.LLM_MODEL_FAST, STRONG: settings.LLM_MODEL_STRONG},
+            settings.LLM_TASK_TIERS,
+            downgrade_queue_depth=settings.LLM_DOWNGRADE_QUEUE_DEPTH,
+            quota_cooldown_seconds=settings.LLM_DOWNGRADE_QUOTA_COOLDOWN_SECONDS,
+        )
+
+    def route(self, task: str, queue_depth: int = 0) -> Route:
+        """Route for a new call of `task`; `queue_depth` is the governor's."""
+        tier = self.task_tiers.get(task, STRONG)
+        reason = "task"
+        with self._lock:
+            self.stats["routed"] += 1
+            if tier == STRONG and self.models[FAST] != self.models[STRONG]:
+                if time.monotonic() < self._quota_until:
+                    tier, reason = FAST, "quota"
+                    self.stats["downgraded_quota"] += 1
+                elif self.downgrade_queue_depth and queue_depth >= self.downgrade_queue_depth:
+                    tier, reason = FAST, "load"
+                    self.stats["downgraded_load"] += 1
+        return Route(task, tier, self.models[tier], reason)
+
+    def after_quota_error(self, route: Route) -> Route:
+        """
+        Route for retrying a call that hit a quota error. A strong call
+        starts the cooldown and moves to the fast model; a fast one stays.
+        """
+        if route.tier != STRONG or self.models[FAST] == self.models[STRONG]:
+            return route
+        with self._lock:
+            self._quota_until = time.monotonic() + self.quota_cooldown_seconds
+            self.stats["retried_fast"] += 1
+        return Route(route.task, FAST, self.models[FAST], "retry")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cooldown = max(0.0, self._quota_until - time.monotonic())
+            return {**self.stats, "models": dict(self.models), "quota_cooldown_seconds": round(cooldown, 1)}
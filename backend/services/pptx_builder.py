@@ -4,8 +4,14 @@ from pptx.enum.text import PP_ALIGN, MSO_ANCHOR, MSO_AUTO_SIZE
 
 from pptx.enum.shapes import MSO_SHAPE
 from services.themes import get_theme
+from services.tracing import span
+from services.slide_fragments import capture_fragment, fragment_key, shared_cache, splice_fragment
 import os
 
+# Part of every slide-fragment key: bump whenever rendering output changes,
+# so fragments cached by an older builder are never spliced in
+BUILDER_VERSION = "3"
+
 class PPTXBuilder:
     """
     Elite Presentation Builder - McKinsey/Apple/TED Caliber
@@ -17,6 +23,16 @@ class PPTXBuilder:
     SLIDE_W = 13.333
     SLIDE_H = 7.5
 
+    def __init__(self, fragment_cache=None):
+        # Process-wide slide fragment LRU unless a specific one is given
+        self.fragment_cache = fragment_cache if fragment_cache is not None else shared_cache()
+        self.last_build_stats = {}
+
+    def warm_up(self):
+        """Load python-pptx's default template and XML machinery once."""
+        self._load_theme("corporate_navy")
+        Presentation()
+
     def _load_theme(self, theme_id: str):
         """Load color palette and fonts from a theme"""
         t = get_theme(theme_id)
@@ -37,8 +53,16 @@ class PPTXBuilder:
         self.FONT_HEADING = t["font_heading"]
         self.FONT_BODY = t["font_body"]
 
-    def build(self, data: dict, output_filename: str, theme_id: str = "corporate_navy") -> str:
-        """Build an elite-level presentation from structured data"""
+    def build(self, data: dict, output_filename: str, theme_id: str = "corporate_navy",
+              output_dir: str = "generated_pptx", fragments=None) -> str:
+        """
+        Build an elite-level presentation from structured data.
+
+        Slides already rendered with the same content, theme and position
+        are spliced in from the process-wide fragment cache, or else from
+        `fragments` (a deck's FragmentStore), instead of being rebuilt.
+        `last_build_stats` counts rendered and reused slides.
+        """
         self._load_theme(theme_id)
         
         prs = Presentation()
@@ -47,37 +71,80 @@ class PPTXBuilder:
         
         slides_data = data.get("slides", [])
         total_slides = len(slides_data)
+        self.last_build_stats = {"rendered": 0, "reused": 0, "cache_hits": 0, "keys": []}
         
         for i, slide_data in enumerate(slides_data):
             slide_type = slide_data.get("type", "content_slide")
+            key = fragment_key(slide_data, theme_id, i, total_slides, BUILDER_VERSION)
+            self.last_build_stats["keys"].append(key)
             
-            if slide_type == "title_slide":
-                self._create_title_slide(prs, slide_data)
-            elif slide_type == "executive_summary":
-                self._create_executive_summary(prs, slide_data)
-            elif slide_type == "metrics_slide":
-                self._create_metrics_slide(prs, slide_data)
-            elif slide_type == "two_column":
-                self._create_two_column_slide(prs, slide_data)
-            elif slide_type == "section_divider":
-                self._create_section_divider(prs, slide_data)
-            elif slide_type == "challenges_slide":
-                self._create_challenges_slide(prs, slide_data)
-            elif slide_type == "content_slide":
-                self._create_content_slide(prs, slide_data, i, total_slides)
-            else:
-                self._create_content_slide(prs, slide_data, i, total_slides)
-        
-        # Closing slide
-        self._create_closing_slide(prs)
+            with span(f"render.{slide_type}", index=i):
+                if self._splice_cached(prs, key, fragments):
+                    continue
+                if slide_type == "title_slide":
+                    self._create_title_slide(prs, slide_data)
+                elif slide_type == "executive_summary":
+                    self._create_executive_summary(prs, slide_data)
+                elif slide_type == "metrics_slide":
+                    self._create_metrics_slide(prs, slide_data)
+                elif slide_type == "two_column":
+                    self._create_two_column_slide(prs, slide_data)
+                elif slide_type == "section_divider":
+                    self._create_section_divider(prs, slide_data)
+                elif slide_type == "challenges_slide":
+                    self._create_challenges_slide(prs, slide_data)
+                elif slide_type == "content_slide":
+                    self._create_content_slide(prs, slide_data, i, total_slides)
+                else:
+                    self._create_content_slide(prs, slide_data, i, total_slides)
+                self._store_rendered(prs, key, fragments)
+        
+        # Closing slide (identical in every deck of a theme)
+        with span("render.closing_slide"):
+            key = fragment_key({"type": "closing_slide"}, theme_id, 0, 0, BUILDER_VERSION)
+            if not self._splice_cached(prs, key, None):
+                self._create_closing_slide(prs)
+                self._store_rendered(prs, key, None)
         
         # Save
-        output_dir = "generated_pptx"
         os.makedirs(output_dir, exist_ok=True)
         file_path = os.path.join(output_dir, output_filename)
-        prs.save(file_path)
+        with span("render.save"):
+            prs.save(file_path)
         return file_path
 
+    # =========================================================================
+    # FRAGMENT REUSE
+    # =========================================================================
+
+    def _splice_cached(self, prs, key, fragments) -> bool:
+        """Append the slide for `key` from a stored fragment, if there is one."""
+        stats = self.last_build_stats
+        fragment = self.fragment_cache.get(key)
+        if fragment is not None:
+            stats["cache_hits"] += 1
+            if fragments is not None and not fragments.has(key):
+                fragments.put(key, fragment)
+        elif fragments is not None:
+            fragment = fragments.get(key)
+            if fragment is not None:
+                self.fragment_cache.put(key, fragment)
+        if fragment is None:
+            return False
+        splice_fragment(prs, fragment)
+        stats["reused"] += 1
+        return True
+
+    def _store_rendered(self, prs, key, fragments):
+        """Keep the slide just rendered for later builds."""
+        self.last_build_stats["rendered"] += 1
+        if fragments is None and not self.fragment_cache.max_bytes:
+            return
+        fragment = capture_fragment(prs.slides[-1])
+        self.fragment_cache.put(key, fragment)
+        if fragments is not None:
+            fragments.put(key, fragment)
+
     # =========================================================================
     # SHARED HELPERS
     # =========================================================================
@@ -6,7 +6,9 @@ Defines different presentation "personalities" that influence:
 - The tone, language, and visual approach
 - The slide types and flow recommended
 """
-
+import math
+import re
+from collections import Counter
 
 PRESENTATION_STYLES = {
     "executive": {
@@ -116,25 +118,90 @@ PRESENTATION STYLE: INFORMAL & CREATIVE
 }
 
 
-def detect_best_styles(text: str) -> list:
+# =========================================================================
+# Keyword matcher (compiled once at import)
+# =========================================================================
+
+def _build_trie_pattern(words) -> str:
+    """Build a word-boundary aware regex alternation factored as a prefix trie.
+
+    A flat ``a|b|c`` alternation makes the regex engine retry every keyword
+    at every position; factoring common prefixes lets it reject most
+    positions after a single character comparison. The leading-boundary
+    check is placed *after* the first literal so the pattern still starts
+    with a plain character set, which the engine uses to skip ahead.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def _emit(node, first=False) -> str:
+        terminal = "" in node
+        branches = [
+            re.escape(ch) + (r"(?<!\w.)" if first else "") + _emit(child)
+            for ch, child in sorted(node.items()) if ch != ""
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return _emit(trie, first=True) + r"(?!\w)"
+
+
+def _build_keyword_index():
+    """Map each lowercased keyword to the styles (and original spelling) using it."""
+    index = {}
+    for style_id, style in PRESENTATION_STYLES.items():
+        for kw in style["keywords"]:
+            styles = index.setdefault(kw.lower(), {})
+            styles.setdefault(style_id, kw)
+    return index
+
+
+_KEYWORD_INDEX = _build_keyword_index()
+
+# Word-boundary aware: "lead" must not match inside "leadership", "roi" not
+# inside "heroic". Matching runs on lowercased text, so the keywords are too.
+_KEYWORD_PATTERN = re.compile(_build_trie_pattern(_KEYWORD_INDEX))
+
+
+def count_keywords(text: str) -> Counter:
+    """Count occurrences of every style keyword in a single pass over text."""
+    return Counter(_KEYWORD_PATTERN.findall(text.lower()))
+
+
+def detect_best_styles(text: str, recommend_default: bool = True) -> list:
     """
     Analyze text content and return ranked presentation styles
     based on keyword matching and content analysis.
     Returns list of style dicts with match_score and reason.
+
+    Each matched keyword contributes 1 point plus a logarithmic bonus for
+    repeated occurrences, so a style mentioned throughout the data outranks
+    one whose keywords appear only once. With `recommend_default`, the
+    executive style is recommended when no style scores well.
     """
-    text_lower = text.lower()
+    counts = count_keywords(text)
     results = []
 
     for style_id, style in PRESENTATION_STYLES.items():
         matches = []
-        for kw in style["keywords"]:
-            if kw.lower() in text_lower:
-                matches.append(kw)
+        for kw_lower, styles in _KEYWORD_INDEX.items():
+            if style_id in styles and counts[kw_lower]:
+                matches.append((styles[style_id], counts[kw_lower]))
 
-        score = len(matches)
-        if score > 0:
+        # Most frequent keywords first
+        matches.sort(key=lambda m: m[1], reverse=True)
+        score = round(sum(1 + math.log(count) for _, count in matches), 1)
+        if matches:
             # Build a human-readable reason
-            top_keywords = matches[:5]
+            top_keywords = [kw for kw, _ in matches[:5]]
             reason = f"Detectado: {', '.join(top_keywords)}"
         else:
             reason = "Estilo disponible"
@@ -153,7 +220,7 @@ def detect_best_styles(text: str) -> list:
     results.sort(key=lambda x: x["match_score"], reverse=True)
 
     # If nothing matched well, mark executive as recommended by default
-    if not any(r["is_recommended"] for r in results):
+    if recommend_default and not any(r["is_recommended"] for r in results):
         for r in results:
             if r["id"] == "executive":
                 r["is_recommended"] = True
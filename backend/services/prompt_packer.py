@@ -0,0 +1,307 @@
+"""
+Prompt Packing for SmartDeck AI
+
+Fits extracted text into a token budget before it is sent to the LLM:
+- Estimates tokens locally (calibrated against Gemini's reported usage)
+- Compacts markdown tables and drops duplicated header/rows
+- Splits the budget across '--- Source: name ---' sections by importance
+- Samples rows evenly from oversized sources instead of cutting the tail
+"""
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+
+_TOKEN_PIECE_RE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|\s+")
+_CELL_PADDING_RE = re.compile(r" {2,}")
+_SEPARATOR_RE = re.compile(r"^\|?(?:\s*:?-{3,}:?\s*\|)+\s*$")
+_SOURCE_MARKER_RE = re.compile(r"^--- Source: (.+?) ---$", re.MULTILINE)
+
+# Every source keeps at least this share of an even split, however unimportant
+MIN_SOURCE_SHARE = 0.25
+
+
+class TokenEstimator:
+    """
+    Local token estimate for Gemini-style SentencePiece tokenizers.
+
+    Words count roughly one token per 4 characters, every digit group and
+    punctuation mark is its own token and whitespace runs are nearly free.
+    `observe()` feeds back the real prompt_token_count from responses so the
+    estimate converges on the model's actual tokenizer without extra calls.
+    """
+
+    def __init__(self, correction: float = 1.0, smoothing: float = 0.2):
+        self.correction = correction
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def raw_estimate(self, text: str) -> int:
+        tokens = 0
+        for piece in _TOKEN_PIECE_RE.findall(text):
+            first = piece[0]
+            if first.isspace():
+                tokens += 1 if "\n" in piece else 0
+            elif first.isdigit():
+                tokens += math.ceil(len(piece) / 3)
+            elif first.isalpha():
+                tokens += math.ceil(len(piece) / 4)
+            else:
+                tokens += 1
+        return tokens
+
+    def estimate(self, text: str) -> int:
+        return math.ceil(self.raw_estimate(text) * self.correction)
+
+    def tokens_per_char(self, lines: list, sample_lines: int = 400) -> float:
+        """Token density of a list of lines, measured on evenly spread samples."""
+        step = max(1, len(lines) // sample_lines)
+        sample = "\n".join(lines[::step])
+        return self.estimate(sample) / max(len(sample), 1)
+
+    def observe(self, text: str, actual_tokens: int):
+        """Calibrate against the token count the API reported for `text`."""
+        raw = self.raw_estimate(text)
+        if not raw or not actual_tokens:
+            return
+        with self._lock:
+            ratio = actual_tokens / raw
+            self.correction += self.smoothing * (ratio - self.correction)
+
+
+@dataclass
+class SourceReport:
+    name: str
+    original_tokens: int
+    packed_tokens: int = 0
+    duplicate_lines: int = 0
+    omitted_lines: int = 0
+
+
+@dataclass
+class PackedText:
+    text: str
+    budget: int
+    original_tokens: int
+    packed_tokens: int
+    sources: list = field(default_factory=list)
+
+    def report(self) -> dict:
+        return {
+            "budget": self.budget,
+            "original_tokens": self.original_tokens,
+            "packed_tokens": self.packed_tokens,
+            "sources": [vars(s) for s in self.sources],
+        }
+
+
+def split_sources(raw_text: str) -> list:
+    """Split main.py's concatenated text into [(name, body)] by source marker."""
+    markers = list(_SOURCE_MARKER_RE.finditer(raw_text))
+    if not markers:
+        return [("input", raw_text)]
+    sources = []
+    preamble = raw_text[:markers[0].start()].strip()
+    if preamble:
+        sources.append(("input", preamble))
+    for i, m in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(raw_text)
+        sources.append((m.group(1), raw_text[m.end():end].strip("\n")))
+    return sources
+
+
+def compact_lines(body: str) -> tuple:
+    """Strip table padding and collapse runs of repeated lines. Returns (lines, duplicates)."""
+    lines = []
+    duplicates = 0
+    for line in body.splitlines():
+        line = line.rstrip()
+        if line.startswith("|"):
+            line = _CELL_PADDING_RE.sub(" ", line)
+        if not line:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        # Only consecutive copies go: a header shared by two tables, or a row
+        # repeated further down, is data
+        if lines and line == lines[-1] and not _SEPARATOR_RE.match(line):
+            duplicates += 1
+            continue
+        lines.append(line)
+    return lines, duplicates
+
+
+def _importance(lines: list, tokens: int) -> float:
+    """Bigger and more varied sources matter more, with diminishing returns."""
+    if not tokens:
+        return 0.0
+    words = " ".join(lines).split()
+    variety = len(set(words)) / max(len(words), 1)
+    return math.sqrt(tokens) * (0.5 + variety)
+
+
+def _allocate(demands: list, weights: list, budget: int) -> list:
+    """Water-fill the budget: sources below their share keep everything."""
+    n = len(demands)
+    if sum(demands) <= budget:
+        return list(demands)
+    floor = int(budget / max(n, 1) * MIN_SOURCE_SHARE)
+    alloc = [min(d, floor) for d in demands]
+    remaining = budget - sum(alloc)
+    open_ids = [i for i in range(n) if demands[i] > alloc[i]]
+    while remaining > 0 and open_ids:
+        total_w = sum(weights[i] for i in open_ids) or len(open_ids)
+        satisfied = []
+        for i in open_ids:
+            share = remaining * (weights[i] or 1) / total_w
+            if alloc[i] + share >= demands[i]:
+                satisfied.append(i)
+        if not satisfied:
+            for i in open_ids:
+                alloc[i] += int(remaining * (weights[i] or 1) / total_w)
+            break
+        for i in satisfied:
+            remaining -= demands[i] - alloc[i]
+            alloc[i] = demands[i]
+        open_ids = [i for i in open_ids if i not in satisfied]
+    return alloc
+
+
+def _fit_lines(lines: list, line_tokens: list, budget: int) -> tuple:
+    """Keep the head of the source, then rows sampled evenly from the rest."""
+    total = sum(line_tokens)
+    if total <= budget:
+        return lines, 0
+
+    head_budget = budget // 2
+    kept, used, i = [], 0, 0
+    while i < len(lines) and used + line_tokens[i] <= head_budget:
+        kept.append(lines[i])
+        used += line_tokens[i]
+        i += 1
+
+    rest = list(range(i, len(lines)))
+    rest_tokens = sum(line_tokens[j] for j in rest)
+    tail_budget = budget - used - 12  # room for the omission markers
+    if not rest or tail_budget <= 0:
+        omitted = len(rest)
+        if omitted:
+            kept.append(f"[... {omitted} lines omitted ...]")
+        return kept, omitted
+
+    stride = max(1, math.ceil(rest_tokens / tail_budget))
+    sampled = rest[::stride]
+    omitted = len(rest) - len(sampled)
+    if omitted:
+        kept.append(f"[... {omitted} of {len(rest)} remaining lines omitted, evenly sampled below ...]")
+    kept.extend(lines[j] for j in sampled)
+    return kept, omitted
+
+
+class PromptPacker:
+    """Packs extracted multi-source text into a token budget."""
+
+    def __init__(self, estimator: TokenEstimator | None = None):
+        self.estimator = estimator or TokenEstimator()
+
+    def pack(self, raw_text: str, budget: int) -> PackedText:
+        sources = split_sources(raw_text)
+        est = self.estimator.estimate
+        original_tokens = 0
+
+        reports, compacted, demands, weights = [], [], [], []
+        for name, body in sources:
+            lines, duplicates = compact_lines(body)
+            # Per-line costs use the source's sampled density: exact counting
+            # of every line would dominate packing time on large inputs
+            density = self.estimator.tokens_per_char(lines)
+            line_tokens = [math.ceil(len(line) * density) for line in lines]
+            tokens = sum(line_tokens)
+            source_tokens = math.ceil(len(body) * self.estimator.tokens_per_char(body.splitlines()))
+            original_tokens += source_tokens
+            reports.append(SourceReport(name=name, original_tokens=source_tokens, duplicate_lines=duplicates))
+            compacted.append((lines, line_tokens))
+            demands.append(tokens)
+            weights.append(_importance(lines, tokens))
+
+        # Source headers are sent as-is and are not part of the allocation
+        named = len(sources) > 1 or sources[0][0] != "input"
+        header_cost = sum(est(f"--- Source: {name} ---") + 2 for name, _ in sources) if named else 0
+        allocations = _allocate(demands, weights, max(budget - header_cost, 0))
+
+        parts = []
+        for (name, _), (lines, line_tokens), alloc, report in zip(sources, compacted, allocations, reports, strict=True):
+            kept, omitted = _fit_lines(lines, line_tokens, alloc)
+            report.omitted_lines = omitted
+            body = "\n".join(kept)
+            report.packed_tokens = est(body)
+            parts.append(f"--- Source: {name} ---\n{body}" if named else body)
+
+        text = "\n\n".join(parts)
+        return PackedText(
+            text=text,
+            budget=budget,
+            original_tokens=original_tokens,
+            packed_tokens=est(text),
+            sources=reports,
+        )
+
+
+@dataclass
+class TextChunk:
+    source: str
+    part: int
+    parts: int
+    text: str
+    tokens: int
+
+    @property
+    def header(self) -> str:
+        if self.parts == 1:
+            return f"--- Source: {self.source} ---"
+        return f"--- Source: {self.source} (part {self.part}/{self.parts}) ---"
+
+
+def chunk_sources(raw_text: str, chunk_tokens: int, estimator: TokenEstimator | None = None) -> list:
+    """
+    Split extracted text into chunks of at most ~chunk_tokens, never mixing
+    sources. A chunk that starts inside a markdown table repeats the
+    table's header row so each chunk can be read on its own.
+    """
+    estimator = estimator or TokenEstimator()
+    chunks = []
+    for name, body in split_sources(raw_text):
+        lines, _ = compact_lines(body)
+        density = estimator.tokens_per_char(lines)
+        source_chunks = []
+        current, used = [], 0
+        table_header = []
+        for i, line in enumerate(lines):
+            if (line.startswith("|") and i + 1 < len(lines)
+                    and _SEPARATOR_RE.match(lines[i + 1])):
+                table_header = [line, lines[i + 1]]
+            elif not line.startswith("|") and not _SEPARATOR_RE.match(line):
+                table_header = []
+
+            cost = math.ceil(len(line) * density) + 1
+            if current and used + cost > chunk_tokens:
+                source_chunks.append(current)
+                current, used = [], 0
+                if table_header and line not in table_header:
+                    current = list(table_header)
+                    used = sum(math.ceil(len(h) * density) + 1 for h in table_header)
+            current.append(line)
+            used += cost
+        if current:
+            source_chunks.append(current)
+
+        for part, chunk_lines in enumerate(source_chunks, start=1):
+            text = "\n".join(chunk_lines)
+            chunks.append(TextChunk(
+                source=name,
+                part=part,
+                parts=len(source_chunks),
+                text=text,
+                tokens=math.ceil(len(text) * density),
+            ))
+    return chunks
@@ -0,0 +1,262 @@
+"""
+Rate Limiting and Admission for SmartDeck AI
+
+Replaces per-IP fixed-window limits with cost-aware token buckets:
+- Buckets are keyed by API key (only keys listed in RATE_LIMIT_API_KEYS:
+  an unknown X-API-Key is ignored, so rotating it buys no fresh bucket),
+  else the client address (the socket address, or with RATE_LIMIT_PROXY_HOPS
+  the X-Forwarded-For entry added by our own reverse proxy). Session and
+  deck buckets are only charged on top of the caller's, as sub-limits
+- Requests are charged by estimated work: a base cost per route plus input
+  bytes and estimated LLM tokens, so a cheap re-render costs a fraction of
+  a full generation over a large upload
+- Buckets live in memory (one process) or in SQLite, shared by every
+  worker process on the host
+- Admitted generations then wait for a slot in a priority queue:
+  interactive requests are served before batch jobs (X-Priority: batch)
+"""
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, key: str, cost: float, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {key} (cost {cost:.1f}, retry in {retry_after:.1f}s)")
+        self.key = key
+        self.cost = cost
+        self.retry_after = retry_after
+
+
+class QueueTimeout(Exception):
+    def __init__(self, priority: str, waited: float):
+        super().__init__(f"No generation slot for {priority} request after {waited:.1f}s")
+        self.priority = priority
+        self.waited = waited
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+# =========================================================================
+# Bucket stores
+# =========================================================================
+
+def _refill(tokens: float, updated: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryBucketStore:
+    """Token buckets in this process only."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, capacity: float, rate: float, now: float | None = None) -> Decision:
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            decision = _decide(tokens, cost, rate)
+            self._buckets[key] = (tokens - cost if decision.allowed else tokens, now)
+        return decision
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file, so every worker process on the host
+    draws from the same bucket. Each take() is one IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: str, stale_seconds: float = 3600):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self._local = threading.local()
+        self._takes = itertools.count()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, cost: float, capacity: float, rate: float, now: float | None = None) -> Decision:
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*row, now, capacity, rate) if row else capacity
+            decision = _decide(tokens, cost, rate)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens - cost if decision.allowed else tokens, now))
+            # Full buckets carry no state; drop them now and then
+            if next(self._takes) % 256 == 0:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.stale_seconds,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return decision
+
+
+def _decide(tokens: float, cost: float, rate: float) -> Decision:
+    if tokens >= cost:
+        return Decision(True, tokens - cost, 0.0)
+    return Decision(False, tokens, (cost - tokens) / rate if rate > 0 else float("inf"))
+
+
+# =========================================================================
+# Limiter
+# =========================================================================
+
+class CostRateLimiter:
+    def __init__(self, store, capacity: float, refill_per_minute: float, proxy_hops: int = 0,
+                 bytes_per_unit: float = 1_000_000, tokens_per_unit: float = 4000, api_keys=()):
+        self.store = store
+        # Digests only: the configured keys themselves are not kept around
+        self.api_keys = {_digest(key) for key in api_keys}
+        self.capacity = capacity
+        self.rate = refill_per_minute / 60.0
+        self.proxy_hops = proxy_hops
+        self.bytes_per_unit = bytes_per_unit
+        self.tokens_per_unit = tokens_per_unit
+
+    @classmethod
+    def from_settings(cls, settings):
+        if settings.RATE_LIMIT_STORE == "sqlite":
+            store = SQLiteBucketStore(settings.RATE_LIMIT_SQLITE_PATH)
+        else:
+            store = MemoryBucketStore()
+        return cls(
+            store,
+            capacity=settings.RATE_LIMIT_CAPACITY,
+            refill_per_minute=settings.RATE_LIMIT_REFILL_PER_MINUTE,
+            proxy_hops=settings.RATE_LIMIT_PROXY_HOPS,
+            bytes_per_unit=settings.RATE_LIMIT_BYTES_PER_UNIT,
+            tokens_per_unit=settings.RATE_LIMIT_TOKENS_PER_UNIT,
+            api_keys=settings.RATE_LIMIT_API_KEYS,
+        )
+
+    def client_address(self, request) -> str:
+        """The address our own proxies saw; client-supplied X-Forwarded-For entries are ignored."""
+        forwarded = request.headers.get("x-forwarded-for")
+        if self.proxy_hops and forwarded:
+            hops = [part.strip() for part in forwarded.split(",") if part.strip()]
+            if hops:
+                return hops[-min(self.proxy_hops, len(hops))]
+        return request.client.host if request.client else "unknown"
+
+    def client_key(self, request) -> str:
+        api_key = request.headers.get("x-api-key")
+        if api_key and _digest(api_key) in self.api_keys:
+            return "key:" + _digest(api_key)
+        return f"ip:{self.client_address(request)}"
+
+    def cost(self, base: float, input_bytes: int = 0, llm_tokens: int = 0) -> float:
+        """Work units for a request; never more than a full bucket, so any request can eventually pass."""
+        units = base + input_bytes / self.bytes_per_unit + llm_tokens / self.tokens_per_unit
+        return min(units, self.capacity)
+
+    def check(self, key: str, cost: float) -> Decision:
+        decision = self.store.take(key, cost, self.capacity, self.rate)
+        if not decision.allowed:
+            raise RateLimitExceeded(key, cost, decision.retry_after)
+        return decision
+
+
+def _digest(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def estimate_tokens(chars: int) -> int:
+    """Rough LLM token count for rate-limit charging (about 4 characters per token)."""
+    return chars // 4
+
+
+def request_priority(request) -> str:
+    value = (request.headers.get("x-priority") or "").strip().lower()
+    return value if value in PRIORITIES else "interactive"
+
+
+# =========================================================================
+# Priority admission
+# =========================================================================
+
+class PriorityGate:
+    """
+    At most `limit` concurrent holders in this process. When full, waiters
+    are served by priority, then arrival order, so a backlog of batch jobs
+    cannot starve interactive requests.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def depth(self, priority: str | None = None) -> int:
+        return sum(1 for level, _, future in self._waiters
+                   if not future.done() and (priority is None or level == PRIORITIES[priority]))
+
+    async def acquire(self, priority: str = "interactive", timeout: float | None = None):
+        if self.active < self.limit and not self.depth():
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._sequence), future))
+        started = time.monotonic()
+        try:
+            # release() hands its slot straight to the woken waiter
+            await asyncio.wait_for(future, timeout)
+        except TimeoutError:
+            raise QueueTimeout(priority, time.monotonic() - started) from None
+        except asyncio.CancelledError:
+            # Cancelled right after being handed a slot: pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive", timeout: float | None = None):
+        await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,251 @@
+"""
+Render Worker Pool for SmartDeck AI
+
+PPTXBuilder.build is pure-Python, GIL-bound work: one API process renders
+one deck at a time. This pool runs it in warm worker processes:
+- Workers fork from a forkserver that has python-pptx and the themes
+  preloaded (spawn + initializer where forkserver is unavailable), and each
+  loads the default template once
+- Slide JSON goes in; the worker writes the .pptx next to its final path
+  and renames it into place, so no file bytes cross the process boundary
+- Workers are recycled after max_jobs_per_worker jobs to cap memory growth:
+  the executor is swapped for a fresh one once it has taken
+  workers * max_jobs_per_worker jobs (ProcessPoolExecutor's own
+  max_tasks_per_child can deadlock on 3.11 when combined with an initializer)
+- Spans recorded in a worker (per slide, save) come back with the result
+  and join the request's trace
+- A crashed pool is rebuilt and the job rendered in-process instead
+- stats() reports jobs, queue wait, render time and worker turnover
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+from services import tracing
+
+logger = logging.getLogger(__name__)
+
+_PRELOAD = ["services.pptx_builder", "services.themes"]
+
+# Per-worker builder, created by the initializer
+_worker_builder = None
+
+
+def _init_worker():
+    global _worker_builder
+    from services.pptx_builder import PPTXBuilder
+    _worker_builder = PPTXBuilder()
+    _worker_builder.warm_up()
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+def render_to_path(data: dict, output_path: str, theme_id: str, fragment_dir: str | None = None) -> dict:
+    """
+    Render `data` to `output_path` (atomically). Runs in a worker or
+    in-process. With `fragment_dir`, unchanged slides are spliced in from
+    the fragments stored there by earlier renders of the deck.
+    """
+    from services.pptx_builder import PPTXBuilder
+    from services.slide_fragments import FragmentStore
+    builder = _worker_builder or PPTXBuilder()
+    fragments = FragmentStore(fragment_dir) if fragment_dir else None
+    started = time.perf_counter()
+    directory, filename = os.path.split(os.path.abspath(output_path))
+    tmp_name = f".{filename}.{uuid.uuid4().hex[:8]}.tmp"
+    with tracing.capture() as captured:
+        tmp_path = builder.build(data, tmp_name, theme_id=theme_id, output_dir=directory, fragments=fragments)
+    os.replace(tmp_path, output_path)
+    if fragments:
+        fragments.prune(set(builder.last_build_stats["keys"]))
+    return {
+        "path": output_path,
+        "bytes": os.path.getsize(output_path),
+        "render_seconds": time.perf_counter() - started,
+        "pid": os.getpid(),
+        "rendered": builder.last_build_stats["rendered"],
+        "reused": builder.last_build_stats["reused"],
+        "cache_hits": builder.last_build_stats["cache_hits"],
+        "spans": tracing.detach(captured) if captured else [],
+    }
+
+
+def patch_notes_to_path(slides: list, notes: dict, output_path: str, theme_id: str,
+                        fragment_dir: str | None = None) -> int:
+    """
+    Write speaker notes ({slide index: text}) into an already rendered deck
+    without rebuilding any slide. `slides` is the deck as rendered (before
+    the notes); its stored fragments are re-keyed to the slides with notes
+    so the next render still reuses them. Returns the slides patched.
+    """
+    from pptx import Presentation
+
+    from services.pptx_builder import BUILDER_VERSION
+    from services.slide_fragments import FragmentStore, fragment_key
+    patched = 0
+    if os.path.exists(output_path):
+        prs = Presentation(output_path)
+        for index, text in notes.items():
+            if index < len(prs.slides):
+                prs.slides[index].notes_slide.notes_text_frame.text = text
+                patched += 1
+        directory, filename = os.path.split(os.path.abspath(output_path))
+        tmp_path = os.path.join(directory, f".{filename}.{uuid.uuid4().hex[:8]}.tmp")
+        prs.save(tmp_path)
+        os.replace(tmp_path, output_path)
+    if fragment_dir:
+        fragments, total = FragmentStore(fragment_dir), len(slides)
+        for index, text in notes.items():
+            fragment = fragments.get(fragment_key(slides[index], theme_id, index, total, BUILDER_VERSION))
+            if fragment is not None:
+                with_notes = {**slides[index], "speaker_notes": text}
+                fragments.put(fragment_key(with_notes, theme_id, index, total, BUILDER_VERSION),
+                              {**fragment, "notes": text})
+    return patched
+
+
+def _absolute_paths(output_path: str, fragment_dir: str | None) -> tuple:
+    return os.path.abspath(output_path), os.path.abspath(fragment_dir) if fragment_dir else None
+
+
+@dataclass
+class RenderResult:
+    path: str
+    bytes: int
+    render_seconds: float
+    queue_seconds: float
+    pid: int
+    rendered: int = 0
+    reused: int = 0
+    cache_hits: int = 0
+
+
+class RenderPool:
+    def __init__(self, workers: int, max_jobs_per_worker: int = 50, start_method: str | None = None):
+        self.workers = workers
+        self.max_jobs_per_worker = max_jobs_per_worker
+        available = multiprocessing.get_all_start_methods()
+        self.start_method = start_method or ("forkserver" if "forkserver" in available else "spawn")
+        self._executor = None
+        self._executor_jobs = 0
+        self._lock = threading.Lock()
+        self._pids = set()
+        self._stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "in_flight": 0,
+            "pool_restarts": 0, "pool_recycles": 0, "inline_fallbacks": 0,
+            "render_seconds": 0.0, "queue_seconds": 0.0,
+        }
+
+    def _get_executor(self, job: bool = False) -> ProcessPoolExecutor:
+        retired = None
+        with self._lock:
+            if job and self._executor is not None and \
+                    self._executor_jobs >= self.workers * self.max_jobs_per_worker:
+                # Recycle: queued jobs still finish on the old workers, which
+                # then exit; new jobs go to freshly started ones
+                retired, self._executor = self._executor, None
+                self._stats["pool_recycles"] += 1
+            if self._executor is None:
+                context = multiprocessing.get_context(self.start_method)
+                if self.start_method == "forkserver":
+                    context.set_forkserver_preload(_PRELOAD)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                )
+                self._executor_jobs = 0
+                logger.info(f"Render pool started: {self.workers} workers ({self.start_method}), "
+                            f"recycled every {self.max_jobs_per_worker} jobs per worker")
+            if job:
+                self._executor_jobs += 1
+            executor = self._executor
+        if retired:
+            retired.shutdown(wait=False)
+        return executor
+
+    def start(self):
+        """Spawn and warm every worker now instead of on the first render."""
+        executor = self._get_executor()
+        for future in [executor.submit(_worker_ping) for _ in range(self.workers)]:
+            self._pids.add(future.result())
+
+    async def render(self, data: dict, output_path: str, theme_id: str, fragment_dir: str | None = None) -> RenderResult:
+        # Workers may run in another cwd (the forkserver's)
+        output_path, fragment_dir = await asyncio.to_thread(_absolute_paths, output_path, fragment_dir)
+        self._bump("submitted", 1)
+        self._bump("in_flight", 1)
+        submitted = time.perf_counter()
+        try:
+            try:
+                future = self._get_executor(job=True).submit(render_to_path, data, output_path, theme_id, fragment_dir)
+                meta = await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed): rebuild the pool for the next
+                # job and render this one in a thread of the API process
+                logger.error("Render pool broken; restarting it and rendering in-process")
+                self._restart()
+                self._bump("inline_fallbacks", 1)
+                meta = await asyncio.to_thread(render_to_path, data, output_path, theme_id, fragment_dir)
+        except Exception:
+            self._bump("failed", 1)
+            raise
+        finally:
+            self._bump("in_flight", -1)
+
+        # The worker's per-slide and save spans, under the caller's render span
+        tracing.attach(meta["spans"])
+        total = time.perf_counter() - submitted
+        queue_seconds = max(0.0, total - meta["render_seconds"])
+        with self._lock:
+            self._pids.add(meta["pid"])
+            self._stats["completed"] += 1
+            self._stats["render_seconds"] += meta["render_seconds"]
+            self._stats["queue_seconds"] += queue_seconds
+        return RenderResult(
+            path=meta["path"], bytes=meta["bytes"], render_seconds=meta["render_seconds"],
+            queue_seconds=queue_seconds, pid=meta["pid"],
+            rendered=meta["rendered"], reused=meta["reused"], cache_hits=meta["cache_hits"],
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["workers"] = self.workers
+            stats["max_jobs_per_worker"] = self.max_jobs_per_worker
+            # Worker turnover: every recycled or restarted worker has a new pid
+            stats["workers_started"] = len(self._pids)
+        completed = stats["completed"] or 1
+        stats["avg_render_seconds"] = round(stats["render_seconds"] / completed, 4)
+        stats["avg_queue_seconds"] = round(stats["queue_seconds"] / completed, 4)
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _restart(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._stats["pool_restarts"] += 1
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _bump(self, key: str, amount):
+        with self._lock:
+            self._stats[key] += amount
+
+
+def default_workers() -> int:
+    return max(1, min(4, os.cpu_count() or 1))
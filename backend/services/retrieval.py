@@ -0,0 +1,219 @@
+"""
+Chunk Retrieval for SmartDeck AI
+
+Picks which parts of a large input the LLM sees, instead of the head of
+the first source plus evenly sampled lines:
+- The extracted text is split into small chunks (never mixing sources,
+  table headers repeated) and indexed with BM25, locally and without any
+  service; indexes are cached per input text, so every call on one
+  session's data (structuring, slide calls, regenerations, notes) shares one;
+  async callers get a missing index built in a worker thread (aget)
+- pack() fills a token budget with the most informative chunks (most rare
+  terms), starting with the best chunk of every source so all of them are
+  covered
+- excerpt() fills a character budget with the chunks ranked highest for a
+  list of queries, one query at a time in turn: one query per planned
+  slide gives every section of the deck its own evidence
+"""
+import asyncio
+import hashlib
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+from services import metrics
+from services.prompt_packer import (
+    PackedText,
+    SourceReport,
+    TokenEstimator,
+    chunk_sources,
+)
+
+_TERM_RE = re.compile(r"[a-z0-9]+")
+
+# Function words (English and Spanish): frequent everywhere, they only add noise
+_STOPWORDS = frozenset({
+    "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it", "of", "on", "or",
+    "the", "this", "that", "to", "with", "was", "were",
+    "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "para", "por", "que", "se", "su",
+    "sus", "un", "una", "y",
+})
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def terms(text: str) -> list:
+    """Accent- and case-folded words and numbers of `text`, without function words."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return [t for t in _TERM_RE.findall(text) if t not in _STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+class ChunkIndex:
+    """BM25 index over the chunks of one extracted text."""
+
+    def __init__(self, raw_text: str, chunk_tokens: int = 200, estimator: TokenEstimator | None = None):
+        self.estimator = estimator or TokenEstimator()
+        self.chunks = chunk_sources(raw_text, chunk_tokens, self.estimator)
+        self.named = len({c.source for c in self.chunks}) > 1 or any(c.source != "input" for c in self.chunks)
+        self.postings = {}
+        self.lengths = []
+        for i, chunk in enumerate(self.chunks):
+            counts = Counter(terms(chunk.text))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((i, tf))
+        n = len(self.chunks)
+        self.avg_length = sum(self.lengths) / n if n else 0.0
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+        # Rare-term mass of each chunk: how much it says that others do not
+        self.information = [0.0] * n
+        for term, postings in self.postings.items():
+            for i, _ in postings:
+                self.information[i] += self.idf[term]
+
+    def search(self, query: str) -> list:
+        """Indexes of the chunks matching `query`, best BM25 score first."""
+        scores = {}
+        for term in set(terms(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = 1 - BM25_B + BM25_B * self.lengths[i] / (self.avg_length or 1)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        return sorted(scores, key=lambda i: (-scores[i], i))
+
+    def select(self, queries, budget: float, cost, cover_sources: bool = False) -> list:
+        """
+        Chunk indexes (in source order) within `budget`, measured by
+        `cost(chunk)`: the best chunk of every source first if
+        `cover_sources`, then each query's next best match in turn, then
+        the most informative of the rest.
+        """
+        chosen, used = set(), 0.0
+
+        def take(i: int) -> bool:
+            nonlocal used
+            if i in chosen or used + cost(self.chunks[i]) > budget:
+                return False
+            chosen.add(i)
+            used += cost(self.chunks[i])
+            return True
+
+        by_information = sorted(range(len(self.chunks)), key=lambda i: (-self.information[i], i))
+        if cover_sources:
+            covered = set()
+            for i in by_information:
+                if self.chunks[i].source not in covered and take(i):
+                    covered.add(self.chunks[i].source)
+        rankings = [iter(self.search(q)) for q in queries if q]
+        while rankings:
+            for ranking in list(rankings):
+                if not any(take(i) for i in ranking):
+                    rankings.remove(ranking)
+        for i in by_information:
+            take(i)
+        return sorted(chosen)
+
+    def render(self, chosen: list) -> str:
+        """Selected chunks under their source headers, with the gaps marked."""
+        parts, source, previous = [], None, None
+        for i in chosen:
+            chunk = self.chunks[i]
+            lines = []
+            if chunk.source != source:
+                if self.named:
+                    lines.append(f"--- Source: {chunk.source} ---")
+                if chunk.part > 1:
+                    lines.append(f"[... parts 1-{chunk.part - 1} of {chunk.parts} omitted ...]")
+            elif i != previous + 1:
+                lines.append(f"[... {i - previous - 1} parts omitted ...]")
+            lines.append(chunk.text)
+            parts.append("\n".join(lines))
+            source, previous = chunk.source, i
+        return "\n\n".join(parts)
+
+    def pack(self, budget: int) -> PackedText:
+        """The most informative chunks of every source within `budget` tokens."""
+        est = self.estimator.estimate
+        # Headers and omission markers: a source header per chunk is the worst case
+        chosen = self.select((), budget, lambda c: c.tokens + 12, cover_sources=True)
+        text = self.render(chosen)
+        reports = {}
+        for i, chunk in enumerate(self.chunks):
+            report = reports.setdefault(chunk.source, SourceReport(name=chunk.source, original_tokens=0))
+            report.original_tokens += chunk.tokens
+            if i in chosen:
+                report.packed_tokens += chunk.tokens
+            else:
+                report.omitted_lines += chunk.text.count("\n") + 1
+        return PackedText(
+            text=text,
+            budget=budget,
+            original_tokens=sum(r.original_tokens for r in reports.values()),
+            packed_tokens=est(text),
+            sources=list(reports.values()),
+        )
+
+    def excerpt(self, queries: list, max_chars: int) -> str:
+        """The chunks matching `queries` best, taking turns, within `max_chars`."""
+        chosen = self.select(queries, max_chars, lambda c: len(c.text) + len(c.header) + 40)
+        return self.render(chosen)
+
+
+class IndexCache:
+    """Recently used ChunkIndexes, by input text (thread-safe)."""
+
+    def __init__(self, max_entries: int = 16, chunk_tokens: int = 200, estimator: TokenEstimator | None = None):
+        self.max_entries = max_entries
+        self.chunk_tokens = chunk_tokens
+        self.estimator = estimator
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        # Builds in flight for aget(), shared by concurrent callers
+        self._building = {}
+
+    def get(self, raw_text: str) -> ChunkIndex:
+        key = hashlib.blake2b(raw_text.encode("utf-8"), digest_size=16).digest()
+        index = self._cached(key)
+        return index if index is not None else self._build(key, raw_text)
+
+    async def aget(self, raw_text: str) -> ChunkIndex:
+        """
+        get() for the event loop: a missing index is built in a worker
+        thread, once for all the callers waiting on it (e.g. the slide calls
+        of one outline, which start together).
+        """
+        key = hashlib.blake2b(raw_text.encode("utf-8"), digest_size=16).digest()
+        index = self._cached(key)
+        if index is not None:
+            return index
+        building = self._building.get(key)
+        if building is None:
+            building = asyncio.ensure_future(asyncio.to_thread(self._build, key, raw_text))
+            self._building[key] = building
+            building.add_done_callback(lambda _: self._building.pop(key, None))
+        # A cancelled caller must not cancel the build the others wait for
+        return await asyncio.shield(building)
+
+    def _cached(self, key: bytes) -> ChunkIndex | None:
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+            return index
+
+    def _build(self, key: bytes, raw_text: str) -> ChunkIndex:
+        started = time.perf_counter()
+        index = ChunkIndex(raw_text, self.chunk_tokens, self.estimator)
+        metrics.RETRIEVAL_INDEX_SECONDS.observe(time.perf_counter() - started)
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
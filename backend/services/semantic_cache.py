@@ -0,0 +1,251 @@
+"""
+Semantic Prompt Cache for SmartDeck AI
+
+Prompts for /generate-from-prompt are often rewordings of each other
+("Q3 sales deck for LATAM" vs "LATAM Q3 sales presentation"), which an
+exact-match cache misses. This one finds near duplicates in-process,
+without any model or network call:
+- Normalization: accents, case and punctuation are dropped, as are
+  function words and words naming the deliverable ("deck",
+  "presentación", ...); plurals are folded. A prompt becomes a token set
+- MinHash signatures of the token sets, indexed by LSH bands, give the
+  candidates; each candidate is then checked on the exact Jaccard
+  similarity of the token sets against the threshold
+- Numbers are facts: a candidate whose numbers differ ("Q3" vs "Q4",
+  "2025" vs "2026") is never served, whatever its similarity
+- Entries are scoped (by caller and presentation style), expire after a
+  TTL and are evicted least recently used beyond a size bound
+- Every hit and rejected candidate is written to the audit log, and hits
+  reported as wrong by users are logged as false positives and never
+  served for that prompt again
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from services import metrics
+
+audit_logger = logging.getLogger("services.semantic_cache.audit")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_PRIME = (1 << 61) - 1
+
+# Function words (English and Spanish) and words naming the deliverable itself
+_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it", "of", "on",
+    "or", "our", "the", "this", "to", "with", "about", "make", "create", "build", "need", "want", "please",
+    "i", "we", "me", "my", "your", "using", "based",
+    "al", "como", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "mi", "nuestra", "nuestro",
+    "para", "por", "que", "se", "sobre", "su", "sus", "un", "una", "y", "o", "e",
+    "haz", "hacer", "crea", "crear", "genera", "generar", "necesito", "quiero", "favor", "basada", "basado",
+    "deck", "decks", "presentation", "presentations", "slides", "slide", "ppt", "pptx", "powerpoint",
+    "presentacion", "presentaciones", "diapositiva", "diapositivas",
+})
+
+
+def normalize_tokens(text: str) -> frozenset:
+    """Comparable token set of a prompt (see the module docstring)."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    tokens = set()
+    for token in _TOKEN_RE.findall(text):
+        if token in _STOPWORDS:
+            continue
+        if not token.isdigit() and len(token) > 4 and token.endswith("s"):
+            token = token[:-2] if token.endswith("es") and len(token) > 5 else token[:-1]
+        tokens.add(token)
+    return frozenset(tokens)
+
+
+def _numbers(tokens: frozenset) -> frozenset:
+    return frozenset(t for t in tokens if any(c.isdigit() for c in t))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class MinHasher:
+    """MinHash signatures with universal hashing of 64-bit token hashes."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, tokens: frozenset) -> tuple:
+        hashes = [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "big")
+                  for t in tokens]
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self.params)
+
+
+@dataclass
+class CacheHit:
+    entry_id: str
+    deck: dict
+    similarity: float
+    cached_prompt: str
+
+
+@dataclass
+class _Entry:
+    entry_id: str
+    scope: str
+    prompt: str
+    tokens: frozenset
+    bands: list
+    deck: dict
+    created: float
+    rejected: set = field(default_factory=set)
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.8, max_entries: int = 2000, ttl_seconds: float = 86400,
+                 num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._entries = OrderedDict()
+        self._by_prompt = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "rejected": 0, "stores": 0, "evictions": 0, "false_positives": 0}
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            num_perm=settings.SEMANTIC_CACHE_NUM_PERM,
+            bands=settings.SEMANTIC_CACHE_BANDS,
+        )
+
+    def _band_keys(self, scope: str, tokens: frozenset) -> list:
+        signature = self.hasher.signature(tokens)
+        return [(scope, i, signature[i * self.rows:(i + 1) * self.rows]) for i in range(len(signature) // self.rows)]
+
+    def lookup(self, prompt: str, scope: str = ""):
+        """CacheHit for the most similar cached prompt in `scope`, or None."""
+        tokens = normalize_tokens(prompt)
+        if not tokens:
+            return None
+        bands = self._band_keys(scope, tokens)
+        now = time.time()
+        best, best_similarity, rejected = None, 0.0, []
+        with self._lock:
+            candidates = set().union(*(self._buckets.get(band, ()) for band in bands))
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry.created > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                similarity = jaccard(tokens, entry.tokens)
+                if tokens in entry.rejected:
+                    reason = "reported"
+                elif _numbers(tokens) != _numbers(entry.tokens):
+                    reason = "numbers"
+                elif similarity < self.threshold:
+                    reason = "threshold"
+                else:
+                    if similarity > best_similarity:
+                        best, best_similarity = entry, similarity
+                    continue
+                rejected.append((entry, similarity, reason))
+            if best is not None:
+                self._entries.move_to_end(best.entry_id)
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+            self.stats["rejected"] += len(rejected)
+
+        for entry, similarity, reason in rejected:
+            metrics.SEMANTIC_CACHE_LOOKUPS.labels("rejected").inc()
+            self._audit("rejected", prompt, entry, similarity, reason=reason)
+        if best is None:
+            metrics.SEMANTIC_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+        metrics.SEMANTIC_CACHE_LOOKUPS.labels("hit").inc()
+        metrics.SEMANTIC_CACHE_SIMILARITY.observe(best_similarity)
+        self._audit("hit", prompt, best, best_similarity)
+        return CacheHit(best.entry_id, best.deck, round(best_similarity, 3), best.prompt)
+
+    def store(self, prompt: str, deck: dict, scope: str = ""):
+        """Cache `deck` for `prompt` (replacing the entry of an identical normalized prompt)."""
+        tokens = normalize_tokens(prompt)
+        if not tokens:
+            return None
+        bands = self._band_keys(scope, tokens)
+        entry = _Entry(uuid.uuid4().hex[:12], scope, prompt, tokens, bands,
+                       json.loads(json.dumps(deck)), time.time())
+        with self._lock:
+            previous = self._by_prompt.get((scope, tokens))
+            if previous:
+                self._remove(previous)
+            self._entries[entry.entry_id] = entry
+            self._by_prompt[(scope, tokens)] = entry.entry_id
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(entry.entry_id)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        return entry.entry_id
+
+    def report_false_positive(self, entry_id: str, prompt: str) -> bool:
+        """A served hit was wrong for `prompt`: log it and never serve that entry for it again."""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is not None:
+                entry.rejected.add(normalize_tokens(prompt))
+            self.stats["false_positives"] += 1
+        metrics.SEMANTIC_CACHE_FALSE_POSITIVES.inc()
+        audit_logger.warning(json.dumps({
+            "event": "false_positive", "entry_id": entry_id, "prompt": prompt[:300],
+            "cached_prompt": entry.prompt[:300] if entry else None,
+        }, ensure_ascii=False))
+        return entry is not None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                # Share of served hits that users reported as wrong
+                "false_positive_rate": round(self.stats["false_positives"] / self.stats["hits"], 3)
+                if self.stats["hits"] else 0.0,
+                "threshold": self.threshold,
+            }
+
+    def _remove(self, entry_id: str):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        if self._by_prompt.get((entry.scope, entry.tokens)) == entry_id:
+            del self._by_prompt[(entry.scope, entry.tokens)]
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _audit(self, event: str, prompt: str, entry: _Entry, similarity: float, **extra):
+        audit_logger.info(json.dumps({
+            "event": event, "entry_id": entry.entry_id, "scope": entry.scope,
+            "similarity": round(similarity, 3), "threshold": self.threshold,
+            "prompt": prompt[:300], "cached_prompt": entry.prompt[:300], **extra,
+        }, ensure_ascii=False))
@@ -0,0 +1,106 @@
+"""
+Request Coalescing (single-flight) for SmartDeck AI
+
+Double-clicks, frontend retries and teammates uploading the same file
+start the same expensive generation several times at once. Concurrent
+identical requests now share one run of the work:
+- Requests are keyed on a hash of the normalized input (whitespace and
+  Unicode form), the style and the theme
+- The first request (leader) starts the work as its own task; identical
+  requests arriving while it runs (followers) await the same result, or
+  the same exception
+- A caller that is cancelled or times out only stops waiting: the work
+  keeps running for the others and is cancelled once nobody waits for it
+- Nothing is kept after the work finishes; this is not a result cache
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class FlightTimeout(Exception):
+    def __init__(self, key: str, waited: float):
+        super().__init__(f"Coalesced request {key[:12]} not finished after {waited:.1f}s")
+        self.key = key
+        self.waited = waited
+
+
+def normalize_input(text: str) -> str:
+    """Input as the LLM effectively sees it: NFC, runs of whitespace collapsed."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def flight_key(kind: str, text: str, *params: str) -> str:
+    parts = [kind, *(p or "" for p in params), normalize_input(text)]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self.stats = {"leaders": 0, "followers": 0, "abandoned": 0, "timeouts": 0}
+
+    async def run(self, key: str, work, timeout: float | None = None, kind: str = "generate"):
+        """
+        Run `work()` (a coroutine function) once per key among concurrent
+        callers and return its result to all of them. Results are shared
+        objects: callers must not mutate them. Raises FlightTimeout after
+        `timeout` seconds of waiting.
+        """
+        flight = self._flights.get(key)
+        role = "follower" if flight is not None else "leader"
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(work()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        flight.waiters += 1
+        self.stats[f"{role}s"] += 1
+        metrics.COALESCED_REQUESTS.labels(kind, role).inc()
+        if role == "follower":
+            logger.info(f"Coalesced {kind} request onto in-flight {key[:12]} ({flight.waiters} waiting)")
+
+        started = time.monotonic()
+        try:
+            # shield: a waiter's timeout or cancellation must not cancel the shared task
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            raise FlightTimeout(key, time.monotonic() - started) from None
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Every caller gave up: stop paying for the work
+                self.stats["abandoned"] += 1
+                flight.task.cancel()
+                self._forget(key, flight)
+
+    def running(self, key: str) -> bool:
+        return key in self._flights
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def snapshot(self) -> dict:
+        total = self.stats["leaders"] + self.stats["followers"]
+        ratio = self.stats["followers"] / total if total else 0.0
+        return {**self.stats, "in_flight": self.in_flight(), "coalescing_ratio": round(ratio, 4)}
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
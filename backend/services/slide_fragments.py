@@ -0,0 +1,153 @@
+"""
+Slide Fragments for SmartDeck AI
+
+Rendered slides are kept as XML fragments so a deck can be re-rendered
+without re-running python-pptx shape creation for slides that did not
+change:
+- A fragment is the slide's <p:cSld> element (all its shapes) plus its
+  speaker notes; our slides reference no images or other parts, so the
+  shape tree alone reproduces the slide
+- Fragments are keyed on the slide dict (canonical JSON), the theme, the
+  builder version and, for slides that print their position, the slide
+  number (and the deck length where the footer shows it)
+- SlideFragmentCache is a size-bounded LRU shared by every build in the
+  process, so identical slides (closing slides, section dividers, the
+  same deck in a new theme) are rendered once
+- FragmentStore keeps a deck's fragments as files in a directory,
+  readable by render workers in other processes
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+# Slide types whose footer shows "n/total" (unknown types render as content slides)
+_POSITIONED_TYPES = {"content_slide"}
+# Slide types whose footer shows the slide number alone
+_NUMBERED_TYPES = {"metrics_slide", "two_column", "challenges_slide"}
+_KNOWN_TYPES = {
+    "title_slide", "executive_summary", "metrics_slide", "two_column",
+    "section_divider", "challenges_slide", "content_slide", "closing_slide",
+}
+
+
+def fragment_key(slide: dict, theme_id: str, index: int, total: int, version: str = "") -> str:
+    canonical = json.dumps(slide, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    slide_type = slide.get("type", "content_slide")
+    positioned = slide_type in _POSITIONED_TYPES or slide_type not in _KNOWN_TYPES
+    if positioned:
+        position = f"{index}/{total}"
+    else:
+        position = str(index) if slide_type in _NUMBERED_TYPES else ""
+    return hashlib.sha256(f"{version}\x00{theme_id}\x00{position}\x00{canonical}".encode()).hexdigest()
+
+
+def capture_fragment(slide) -> dict:
+    """Serialize a rendered python-pptx slide."""
+    from lxml import etree
+    notes = slide.notes_slide.notes_text_frame.text if slide.has_notes_slide else None
+    return {"xml": etree.tostring(slide._element.cSld, encoding="unicode"), "notes": notes}
+
+
+def splice_fragment(prs, fragment: dict):
+    """Append a blank slide to `prs` and fill it from a captured fragment."""
+    from pptx.oxml import parse_xml
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    element = slide._element
+    element.replace(element.cSld, parse_xml(fragment["xml"]))
+    if fragment.get("notes") is not None:
+        slide.notes_slide.notes_text_frame.text = fragment["notes"]
+    return slide
+
+
+class SlideFragmentCache:
+    """In-memory LRU of fragments, bounded by their total size in characters."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _size(fragment: dict) -> int:
+        return len(fragment["xml"]) + len(fragment.get("notes") or "")
+
+    def get(self, key: str):
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return fragment
+
+    def put(self, key: str, fragment: dict):
+        size = self._size(fragment)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = fragment
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._size(evicted)
+                self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self.bytes}
+
+
+_shared_cache = None
+
+
+def shared_cache() -> SlideFragmentCache:
+    """The process-wide cache, sized by settings.SLIDE_CACHE_MAX_BYTES."""
+    global _shared_cache
+    if _shared_cache is None:
+        from config import settings
+        _shared_cache = SlideFragmentCache(settings.SLIDE_CACHE_MAX_BYTES)
+    return _shared_cache
+
+
+class FragmentStore:
+    """Fragments as JSON files in one directory (one per deck)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, fragment: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fragment, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+
+    def prune(self, keep: set):
+        """Drop fragments of slides no longer in the deck."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and name[:-5] not in keep:
+                os.remove(os.path.join(self.directory, name))
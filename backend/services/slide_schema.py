@@ -0,0 +1,221 @@
+"""
+Slide Schema for SmartDeck AI
+
+Typed models for every slide type in IntelligenceService.SLIDE_TYPES_SPEC.
+- DeckSchema is passed to Gemini as response_schema (plain Union, which the
+  API accepts as anyOf)
+- validate_slides() checks each slide on its own so a single bad slide can
+  be repaired without regenerating the whole deck
+- With LLM_COMPACT_OUTPUT the model answers in services.compact_schema
+  instead; responses are expanded to these shapes before validation
+- With SPEAKER_NOTES_MODE=deferred decks come back without speaker_notes
+  and NotesSchema is the response schema of the later notes call
+"""
+import json
+import re
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+# Upper bounds are not enforced: PPTXBuilder already truncates long lists
+Points = Annotated[list[str], Field(min_length=1)]
+
+# Verbose or compact (services.compact_schema) deck keys
+_TITLE_RE = re.compile(r'"(?:presentation_title|t)"\s*:\s*("(?:[^"\\]|\\.)*")')
+_SLIDES_RE = re.compile(r'"(?:slides|s)"\s*:\s*\[')
+
+# Design rule of deck prompts when speaker notes are written afterwards
+# (the offline simulator leaves notes out when it sees it)
+NOTES_DEFERRED_RULE = "Do NOT write speaker_notes: they are written in a later step."
+
+
+class Metric(BaseModel):
+    value: str
+    label: str
+    change: str = ""
+
+
+class TitleSlide(BaseModel):
+    type: Literal["title_slide"]
+    title: str
+    subtitle: str = ""
+
+
+class ExecutiveSummarySlide(BaseModel):
+    type: Literal["executive_summary"]
+    title: str
+    bullet_points: Points
+    speaker_notes: str = ""
+
+
+class MetricsSlide(BaseModel):
+    type: Literal["metrics_slide"]
+    title: str
+    metrics: Annotated[list[Metric], Field(min_length=1)]
+    speaker_notes: str = ""
+
+
+class ContentSlide(BaseModel):
+    type: Literal["content_slide"]
+    title: str
+    bullet_points: Points
+    speaker_notes: str = ""
+
+
+class TwoColumnSlide(BaseModel):
+    type: Literal["two_column"]
+    title: str
+    left_title: str
+    right_title: str
+    left_points: Points
+    right_points: Points
+    speaker_notes: str = ""
+
+
+class SectionDividerSlide(BaseModel):
+    type: Literal["section_divider"]
+    title: str
+    subtitle: str = ""
+
+
+class ChallengesSlide(BaseModel):
+    type: Literal["challenges_slide"]
+    title: str
+    bullet_points: Points
+    speaker_notes: str = ""
+
+
+SlideModel = (
+    TitleSlide | ExecutiveSummarySlide | MetricsSlide | ContentSlide
+    | TwoColumnSlide | SectionDividerSlide | ChallengesSlide
+)
+
+
+class DeckSchema(BaseModel):
+    presentation_title: str
+    slides: list[SlideModel]
+
+
+class OutlineEntry(BaseModel):
+    """One slide of an outline: title and subtitle are final, `focus` guides the body."""
+    type: Literal[
+        "title_slide", "executive_summary", "metrics_slide", "content_slide",
+        "two_column", "section_divider", "challenges_slide",
+    ]
+    title: str
+    subtitle: str = ""
+    focus: str = ""
+
+
+class OutlineSchema(BaseModel):
+    """Response schema for the outline call of the outline pipeline."""
+    presentation_title: str
+    slides: list[OutlineEntry]
+
+
+_OUTLINE_ADAPTER = TypeAdapter(OutlineEntry)
+
+
+def validate_outline_entry(entry) -> dict:
+    """Normalized outline entry, or None if it is unusable."""
+    try:
+        return _OUTLINE_ADAPTER.validate_python(entry).model_dump()
+    except ValidationError:
+        return None
+
+
+class SlidesSchema(BaseModel):
+    """Response schema for repair calls, which return only the fixed slides."""
+    slides: list[SlideModel]
+
+
+class NotesSchema(BaseModel):
+    """Response schema for the deferred speaker-notes call: one entry per slide, in order."""
+    notes: list[str]
+
+
+_SLIDE_ADAPTER = TypeAdapter(Annotated[SlideModel, Field(discriminator="type")])
+
+
+def validate_slide(slide) -> tuple:
+    """Return (normalized slide dict, None) or (None, error message)."""
+    try:
+        model = _SLIDE_ADAPTER.validate_python(slide)
+    except ValidationError as e:
+        errors = "; ".join(
+            f"{'.'.join(str(p) for p in err['loc'][1:]) or 'type'}: {err['msg']}"
+            for err in e.errors()
+        )
+        return None, errors
+    return model.model_dump(), None
+
+
+def validate_slides(slides: list) -> tuple:
+    """Validate each slide independently. Returns (valid_by_index, errors_by_index)."""
+    valid, errors = {}, {}
+    for i, slide in enumerate(slides):
+        normalized, error = validate_slide(slide)
+        if error:
+            errors[i] = error
+        else:
+            valid[i] = normalized
+    return valid, errors
+
+
+def coerce_slide(slide) -> dict:
+    """
+    Last-resort local fix for a slide that is still invalid after repair:
+    keep whatever text it has as a content_slide, or None if it has none.
+    """
+    if not isinstance(slide, dict):
+        return None
+    points = [str(p) for key in ("bullet_points", "left_points", "right_points") for p in slide.get(key) or []]
+    points += [
+        f"{m.get('label', '')}: {m.get('value', '')}".strip(": ")
+        for m in slide.get("metrics") or [] if isinstance(m, dict)
+    ]
+    title = slide.get("title") or ""
+    if not points and not title:
+        return None
+    if not points:
+        return {"type": "section_divider", "title": str(title), "subtitle": str(slide.get("subtitle") or "")}
+    return {
+        "type": "content_slide",
+        "title": str(title),
+        "bullet_points": points[:6],
+        "speaker_notes": str(slide.get("speaker_notes") or ""),
+    }
+
+
+def salvage_deck(text: str):
+    """
+    Recover complete slides from JSON that fails json.loads (usually output
+    truncated mid-slide). Returns a partial deck dict or None.
+    """
+    decoder = json.JSONDecoder()
+    match = _SLIDES_RE.search(text)
+    if not match:
+        return None
+    slides = []
+    pos = match.end()
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] != "{":
+            break
+        try:
+            obj, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        slides.append(obj)
+    if not slides:
+        return None
+
+    title = ""
+    match = _TITLE_RE.search(text)
+    if match:
+        try:
+            title = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            title = ""
+    return {"presentation_title": title, "slides": slides}
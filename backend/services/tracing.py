@@ -0,0 +1,329 @@
+"""
+Request Tracing for SmartDeck AI
+
+Lightweight request-scoped spans (no SDK dependency):
+- span() nests through contextvars, so it follows asyncio tasks and the
+  threadpool; outside a traced request it is a no-op
+- Render workers run in other processes: their spans are captured there
+  and attached under the request's render span when the job returns
+- Every log line carries the request id (RequestIdFilter)
+- Finished traces export as OTLP/JSON: one ExportTraceServiceRequest per
+  line to a file, or POSTed to a collector's /v1/traces, from a background
+  thread so requests never wait on the exporter
+- server_timing() turns a trace into a Server-Timing header with one entry
+  per pipeline stage (upload, extract, llm, render)
+"""
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# OTLP span kinds / status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+    kind: int = SPAN_KIND_INTERNAL
+    status: int = STATUS_OK
+    # Monotonic clock for durations; wall clock only for export timestamps
+    start_perf: float = 0.0
+    end_perf: float = 0.0
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_perf - self.start_perf) * 1000
+
+
+class Trace:
+    def __init__(self, request_id: str):
+        self.trace_id = secrets.token_hex(16)
+        self.request_id = request_id
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def root(self) -> Span | None:
+        return next((s for s in self.spans if s.parent_id is None), None)
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("smartdeck_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("smartdeck_span", default=None)
+
+
+def new_request_id(incoming: str | None = None) -> str:
+    """Reuse a well-formed X-Request-ID from the caller, else mint one."""
+    if incoming and _REQUEST_ID_RE.match(incoming):
+        return incoming
+    return secrets.token_hex(8)
+
+
+def current_request_id() -> str:
+    trace = _current_trace.get()
+    return trace.request_id if trace else "-"
+
+
+@contextmanager
+def trace_request(request_id: str, name: str):
+    """Open a trace with a SERVER root span for the duration of a request."""
+    trace = Trace(request_id)
+    trace_token = _current_trace.set(trace)
+    try:
+        with span(name, kind=SPAN_KIND_SERVER, request_id=request_id) as root:
+            yield trace, root
+    finally:
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """Record a child span of the current one; no-op outside a trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+        kind=kind,
+        start_perf=time.perf_counter(),
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = STATUS_ERROR
+        current.attributes["error.type"] = type(e).__name__
+        raise
+    finally:
+        current.end_perf = time.perf_counter()
+        current.end_ns = current.start_ns + int((current.end_perf - current.start_perf) * 1e9)
+        _current_span.reset(token)
+        trace.add(current)
+
+
+
+@contextmanager
+def capture():
+    """
+    Record spans where no request is traced (a render worker process), to
+    be shipped back with detach() and re-parented with attach(). Yields
+    None inside a trace: the spans then go to it directly.
+    """
+    if _current_trace.get() is not None:
+        yield None
+        return
+    trace = Trace("-")
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def detach(trace: Trace) -> list:
+    """The spans of a captured trace as picklable dicts."""
+    return [
+        {"name": s.name, "span_id": s.span_id, "parent_id": s.parent_id, "start_ns": s.start_ns,
+         "end_ns": s.end_ns, "attributes": s.attributes, "kind": s.kind, "status": s.status}
+        for s in trace.spans
+    ]
+
+
+def attach(spans: list):
+    """Add spans detached in another process as children of the current span."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    parent = _current_span.get()
+    # Wall-clock timestamps are comparable across processes; map them onto
+    # this process's monotonic clock for durations and Server-Timing
+    offset = time.perf_counter() - time.time_ns() / 1e9
+    for item in spans:
+        trace.add(Span(
+            name=item["name"],
+            span_id=item["span_id"],
+            parent_id=item["parent_id"] or (parent.span_id if parent else None),
+            start_ns=item["start_ns"],
+            end_ns=item["end_ns"],
+            attributes=item["attributes"],
+            kind=item["kind"],
+            status=item["status"],
+            start_perf=item["start_ns"] / 1e9 + offset,
+            end_perf=item["end_ns"] / 1e9 + offset,
+        ))
+
+# =========================================================================
+# Server-Timing
+# =========================================================================
+
+def _union_ms(intervals: list) -> float:
+    """Wall time covered by possibly overlapping (start, end) intervals."""
+    total, cur_start, cur_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                total += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total * 1000
+
+
+def server_timing(trace: Trace) -> str:
+    """
+    Server-Timing header: wall time per stage (first segment of the names of
+    the root's direct children; concurrent spans are not double counted)
+    plus the total.
+    """
+    root = trace.root
+    if root is None:
+        return ""
+    stages = {}
+    for s in trace.spans:
+        if s.parent_id == root.span_id:
+            stages.setdefault(s.name.split(".")[0], []).append((s.start_perf, s.end_perf))
+    parts = [f"{stage};dur={_union_ms(intervals):.1f}" for stage, intervals in stages.items()]
+    parts.append(f"total;dur={root.duration_ms:.1f}")
+    return ", ".join(parts)
+
+
+# =========================================================================
+# OTLP/JSON export
+# =========================================================================
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def to_otlp(trace: Trace, service_name: str) -> dict:
+    """ExportTraceServiceRequest (OTLP/JSON encoding) for one trace."""
+    spans = []
+    for s in trace.spans:
+        item = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": s.kind,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": _otlp_attributes(s.attributes),
+            "status": {"code": s.status},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{"scope": {"name": "smartdeck.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class SpanExporter:
+    """
+    Background exporter. target "file" appends OTLP/JSON lines to `path`;
+    "otlp" POSTs them to an OTLP/HTTP collector at `endpoint`.
+    """
+
+    def __init__(self, target: str, service_name: str, path: str | None = None,
+                 endpoint: str | None = None, max_queue: int = 1000):
+        self.target = target
+        self.service_name = service_name
+        self.path = path
+        self.endpoint = endpoint
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until every queued trace has been written (used by tests)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            try:
+                payload = json.dumps(to_otlp(trace, self.service_name))
+                if self.target == "file":
+                    directory = os.path.dirname(os.path.abspath(self.path))
+                    os.makedirs(directory, exist_ok=True)
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(payload + "\n")
+                else:
+                    request = urllib.request.Request(
+                        self.endpoint, data=payload.encode("utf-8"),
+                        headers={"Content-Type": "application/json"}, method="POST",
+                    )
+                    urllib.request.urlopen(request, timeout=5).close()
+            except Exception:
+                logger.warning("Span export failed", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+
+def build_exporter(settings) -> SpanExporter | None:
+    if settings.TRACE_EXPORTER == "file":
+        return SpanExporter("file", settings.TRACE_SERVICE_NAME, path=settings.TRACE_FILE)
+    if settings.TRACE_EXPORTER == "otlp":
+        return SpanExporter("otlp", settings.TRACE_SERVICE_NAME, endpoint=settings.TRACE_OTLP_ENDPOINT)
+    return None
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds `request_id` to every log record ('-' outside a request)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id()
+        return True
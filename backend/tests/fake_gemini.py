@@ -0,0 +1,128 @@
+"""
+Local fake of the Gemini REST API for tests.
+
+Serves the endpoints the backend uses (generateContent, and creating and
+deleting cachedContents) on 127.0.0.1 and records every request, so the real
+google-genai client can be exercised end to end without network access:
+
+    with FakeGeminiServer() as server:
+        client = genai.Client(api_key="k", http_options=types.HttpOptions(base_url=server.url))
+"""
+import json
+import re
+import threading
+import uuid
+from datetime import UTC, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_DECK = {"presentation_title": "Fake Deck", "slides": []}
+
+
+class FakeGeminiServer:
+    def __init__(self, response_json: dict | None = None, cache_ttl_seconds: int = 3600,
+                 fail_cache_create: bool = False, generate_errors: list | None = None):
+        self.response_json = response_json or DEFAULT_DECK
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.fail_cache_create = fail_cache_create
+        # HTTP statuses answered to the next generateContent calls, in order
+        self.generate_errors = list(generate_errors or [])
+        self.requests = []
+        self.caches = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def calls(self, kind: str) -> list:
+        return [r for r in self.requests if r["kind"] == kind]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real API (every response has a Content-Length)
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                # Connection warm-up requests
+                with fake._lock:
+                    fake.requests.append({"kind": "get", "path": self.path})
+                self._send(404, {"error": {"code": 404, "message": "Unknown path", "status": "NOT_FOUND"}})
+
+            def do_DELETE(self):
+                name = self.path.split("?")[0].split("/v1beta/")[-1]
+                with fake._lock:
+                    fake.requests.append({"kind": "cache_delete", "name": name})
+                    found = fake.caches.pop(name, None) is not None
+                if not found:
+                    return self._send(404, {"error": {"code": 404, "message": "CachedContent not found",
+                                                      "status": "NOT_FOUND"}})
+                self._send(200, {})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if self.path.split("?")[0].endswith("/cachedContents"):
+                    with fake._lock:
+                        fake.requests.append({"kind": "cache_create", "body": body})
+                    if fake.fail_cache_create:
+                        return self._send(400, {"error": {"code": 400, "message": "Cached content is too small",
+                                                          "status": "INVALID_ARGUMENT"}})
+                    name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+                    expire = datetime.now(UTC) + timedelta(seconds=fake.cache_ttl_seconds)
+                    with fake._lock:
+                        fake.caches[name] = body
+                    return self._send(200, {
+                        "name": name,
+                        "model": body.get("model"),
+                        "expireTime": expire.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                    })
+
+                match = re.search(r"/models/([^/:]+):generateContent", self.path)
+                if match:
+                    cached = body.get("cachedContent")
+                    with fake._lock:
+                        fake.requests.append({"kind": "generate", "model": match.group(1), "body": body})
+                        error = fake.generate_errors.pop(0) if fake.generate_errors else None
+                    if error:
+                        return self._send(error, {"error": {"code": error, "message": f"Injected {error}",
+                                                            "status": "RESOURCE_EXHAUSTED" if error == 429
+                                                            else "UNAVAILABLE"}})
+                    if cached and cached not in fake.caches:
+                        return self._send(404, {"error": {"code": 404, "message": "CachedContent not found",
+                                                          "status": "NOT_FOUND"}})
+                    text = json.dumps(fake.response_json)
+                    return self._send(200, {
+                        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                        "finishReason": "STOP"}],
+                        "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": 50,
+                                          "totalTokenCount": 150},
+                    })
+
+                self._send(404, {"error": {"code": 404, "message": "Unknown path", "status": "NOT_FOUND"}})
+
+        return Handler
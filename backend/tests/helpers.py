@@ -0,0 +1,37 @@
+"""Shared helpers for the backend tests."""
+import os
+import tempfile
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+from services.llm_simulator import LatencyModel, LLMSimulator
+
+
+def sample(name: str, labels: dict | None = None) -> float:
+    """Current value of a Prometheus sample, 0 when it has not been recorded yet."""
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+@contextmanager
+def main_app(simulator: LLMSimulator | None = None):
+    """
+    The main module, run from a temporary working directory (main keeps its
+    uploads and decks in the cwd) with `simulator` answering the LLM calls,
+    zero-latency by default. The directory is removed and the service's
+    simulator restored on exit.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            import main
+            # Created at import, which may have happened in another test's directory
+            os.makedirs(main.UPLOAD_DIR, exist_ok=True)
+            os.makedirs(main.GENERATED_DIR, exist_ok=True)
+            simulator = simulator or LLMSimulator(latency=LatencyModel(median_ms=0))
+            with patch.object(main.intelligence, "simulator", simulator):
+                yield main
+        finally:
+            os.chdir(cwd)
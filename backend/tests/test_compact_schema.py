@@ -0,0 +1,79 @@
+import asyncio
+import copy
+import json
+import os
+import sys
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.compact_schema import compact_deck, compact_slide, expand_deck
+from services.intelligence import IntelligenceService
+from services.llm_simulator import MOCK_ANALYSIS_DECK, LatencyModel, LLMSimulator
+from services.prompt_packer import TokenEstimator
+from services.slide_schema import salvage_deck, validate_slides
+
+
+class TestCompactSchema(unittest.TestCase):
+
+    def test_compact_deck_expands_back_and_is_smaller(self):
+        """Every slide type survives the round trip; the compact form costs fewer output tokens"""
+        deck = MOCK_ANALYSIS_DECK
+        compact = compact_deck(deck)
+        self.assertEqual(expand_deck(compact), deck)
+        self.assertEqual(compact["s"][2]["m"][0], ["$45.2M", "Q3 Revenue", "+18% YoY"])
+
+        estimator = TokenEstimator()
+        verbose_tokens = estimator.raw_estimate(json.dumps(deck, ensure_ascii=False))
+        compact_tokens = estimator.raw_estimate(json.dumps(compact, ensure_ascii=False))
+        self.assertLess(compact_tokens, verbose_tokens * 0.9)
+
+        # Verbose slides (and mixes) pass through; short metric rows are padded
+        mixed = {"t": "Mixto", "s": [deck["slides"][0], {"k": "metrics", "h": "KPIs", "m": [["10%", "Margen"]]}]}
+        expanded = expand_deck(mixed)
+        self.assertEqual(expanded["slides"][0], deck["slides"][0])
+        valid, errors = validate_slides(expanded["slides"])
+        self.assertEqual(errors, {})
+        self.assertEqual(valid[1]["metrics"], [{"value": "10%", "label": "Margen", "change": ""}])
+
+        # Truncated compact output is salvaged slide by slide
+        text = json.dumps(compact, ensure_ascii=False)
+        salvaged = expand_deck(salvage_deck(text[:text.index('"k": "metrics"') + 20]))
+        self.assertEqual(salvaged["presentation_title"], deck["presentation_title"])
+        self.assertEqual(salvaged["slides"], deck["slides"][:2])
+
+    def test_service_requests_and_expands_compact_output(self):
+        """With compact output on, prompts ask for short keys and the pipeline still yields verbose slides"""
+        service = IntelligenceService(api_key=None)
+        service.simulator = LLMSimulator(latency=LatencyModel(median_ms=0))
+        service.compact_output = True
+        answers = []
+        generate = service.simulator.generate
+
+        async def recording(*args, **kwargs):
+            response = await generate(*args, **kwargs)
+            answers.append(json.loads(response.text))
+            return response
+        service.simulator.generate = recording
+
+        deck = asyncio.run(service.generate_from_prompt("Plan de ventas 2025 para LATAM"))
+        self.assertEqual(sorted(answers[0]), ["s", "t"])
+        self.assertTrue(deck["slides"])
+        self.assertTrue(all("type" in s and "k" not in s for s in deck["slides"]))
+        self.assertEqual(service.validation_stats["invalid_slides"], 0)
+
+        # Repairs and single-slide rewrites use the same wire format
+        broken = copy.deepcopy(deck)
+        broken["slides"][1] = {"type": "content_slide", "title": "Sin bullets", "bullet_points": []}
+        self.assertEqual(compact_slide(broken["slides"][1])["k"], "content")
+        repaired = asyncio.run(service._validate_and_repair(broken))
+        self.assertEqual(service.validation_stats["slides_repaired"], 1)
+        self.assertEqual(len(repaired["slides"]), len(deck["slides"]))
+
+        slide = asyncio.run(service.regenerate_slide(deck, 2, "Más concreto"))
+        self.assertEqual(slide["type"], deck["slides"][2]["type"])
+
+
+if __name__ == '__main__':
+    unittest.main()
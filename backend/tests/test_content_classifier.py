@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.content_classifier import classify_content
+from services.intelligence import IntelligenceService
+
+FINANCIAL_TABLE = """
+--- Source: balance_2024.xlsx ---
+--- Sheet: P&L ---
+| Cuenta | Presupuesto | Gasto | EBITDA |
+|:---|---:|---:|---:|
+| Operaciones | $1,200,000 | $950,000 | 21% |
+| Inversión | $800,000 | $640,000 | 18% |
+| Flujo de caja | $300,000 | $290,000 | 12% |
+"""
+
+TEAM_UPDATE = """
+--- Source: weekly.docx ---
+Weekly team update: the sprint retro went well and the team shared creative ideas.
+Progress is good, status is green, and we will brainstorm new ideas next week.
+"""
+
+class TestContentClassifier(unittest.TestCase):
+
+    def test_ranks_financial_tables_first(self):
+        """Currency-heavy tables with financial terms rank the financial style first"""
+        result = classify_content(FINANCIAL_TABLE)
+        self.assertEqual(result["suggested_styles"][0]["id"], "financial")
+        self.assertTrue(result["suggested_styles"][0]["is_recommended"])
+        self.assertEqual(result["signals"]["tables"], 1)
+
+    def test_ranks_team_update_as_informal(self):
+        """Prose about sprints and team updates ranks the informal style first"""
+        result = classify_content(TEAM_UPDATE)
+        self.assertEqual(result["suggested_styles"][0]["id"], "informal")
+
+    def test_default_reason_goes_with_the_default_pick(self):
+        """With no clear match only the style actually recommended says it is the default"""
+        styles = classify_content("Lista de compras: pan, leche, huevos")["suggested_styles"]
+        self.assertTrue(styles[0]["is_recommended"])
+        self.assertEqual(styles[0]["reason"], "Estilo recomendado por defecto")
+        self.assertEqual([s["id"] for s in styles if s["reason"] == "Estilo recomendado por defecto"],
+                         [styles[0]["id"]])
+
+    def test_summary_mentions_sources_and_style(self):
+        """The templated summary describes the data and the recommended style"""
+        result = classify_content(FINANCIAL_TABLE + TEAM_UPDATE)
+        self.assertIn("2 archivos", result["summary"])
+        self.assertIn(result["suggested_styles"][0]["name"], result["summary"])
+
+    def test_detect_content_type_makes_no_api_call(self):
+        """detect_content_type answers locally even when an API key is configured"""
+        service = IntelligenceService(api_key=None)
+        service.api_key = "fake-key"
+        service.client = None  # any API call would raise AttributeError
+        analysis = service.detect_content_type(FINANCIAL_TABLE)
+        self.assertTrue(analysis["summary"])
+        self.assertEqual(len(analysis["suggested_styles"]), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import settings
+from services.intelligence import IntelligenceService
+from tests.fake_gemini import FakeGeminiServer
+
+
+def _request_text(request):
+    return "".join(part.get("text", "") for content in request["body"]["contents"]
+                   for part in content.get("parts", []))
+
+class TestContextCache(unittest.TestCase):
+
+    def _service(self, server):
+        with patch.object(settings, "GEMINI_BASE_URL", server.url), \
+             patch.object(settings, "CONTEXT_CACHE_ENABLED", True), \
+             patch.object(settings, "CONTEXT_CACHE_MIN_TOKENS", 0):
+            service = IntelligenceService(api_key="fake-key")
+            service.warm_up()  # the client reads the settings when it is created
+            return service
+
+    def test_static_prefix_is_cached_once_and_reused(self):
+        """Repeated calls with the same style send only the variable data"""
+        with FakeGeminiServer() as server:
+            service = self._service(server)
+
+            async def run():
+                await service.generate_from_prompt("Q3 sales deck for LATAM", style_id="sales")
+                await service.generate_from_prompt("Q4 hiring plan for engineering", style_id="sales")
+            asyncio.run(run())
+
+            self.assertEqual(len(server.calls("cache_create")), 1)
+            generates = server.calls("generate")
+            self.assertEqual(len(generates), 2)
+            for request in generates:
+                self.assertTrue(request["body"].get("cachedContent"))
+                self.assertNotIn("SLIDE TYPES", _request_text(request))
+            self.assertEqual(service.context_cache.snapshot()["hits"], 1)
+
+    def test_cache_creation_failure_degrades_to_inline_prompt(self):
+        """If the provider refuses to cache, calls still succeed with the full prompt"""
+        with FakeGeminiServer(fail_cache_create=True) as server:
+            service = self._service(server)
+
+            async def run():
+                first = await service.generate_from_prompt("Q3 sales deck for LATAM")
+                second = await service.generate_from_prompt("Q3 sales deck for LATAM")
+                return first, second
+            first, second = asyncio.run(run())
+
+            self.assertEqual(first["presentation_title"], "Fake Deck")
+            self.assertEqual(second["presentation_title"], "Fake Deck")
+            # The failed key is on cooldown: no second creation attempt
+            self.assertEqual(len(server.calls("cache_create")), 1)
+            for request in server.calls("generate"):
+                self.assertIsNone(request["body"].get("cachedContent"))
+                self.assertIn("SLIDE TYPES", _request_text(request))
+
+    def test_evicted_cache_is_invalidated_and_call_retried(self):
+        """A handle the provider no longer knows is dropped and the call resent inline"""
+        with FakeGeminiServer() as server:
+            service = self._service(server)
+
+            async def run():
+                await service.generate_from_prompt("Q3 sales deck for LATAM")
+                server.caches.clear()
+                return await service.generate_from_prompt("Q3 sales deck for LATAM")
+            result = asyncio.run(run())
+
+            self.assertEqual(result["presentation_title"], "Fake Deck")
+            self.assertEqual(service.context_cache.snapshot()["invalidations"], 1)
+            self.assertIn("SLIDE TYPES", _request_text(server.calls("generate")[-1]))
+
+    def test_quota_errors_keep_the_cache_and_go_to_the_retries(self):
+        """A 429 on a cached call is not resent inline: the governor retries it and the handle stays valid"""
+        with FakeGeminiServer(generate_errors=[429]) as server:
+            service = self._service(server)
+
+            async def run():
+                deck = await service.generate_from_prompt("Q3 sales deck for LATAM")
+                await service.aclose()
+                return deck
+            # The backoff is read when the retry is scheduled
+            with patch.object(settings, "LLM_GOVERNOR_RETRY_BASE_SECONDS", 0.001):
+                deck = asyncio.run(run())
+
+            self.assertEqual(deck["presentation_title"], "Fake Deck")
+            self.assertEqual(service.context_cache.snapshot()["invalidations"], 0)
+            generates = server.calls("generate")
+            self.assertEqual(len(generates), 2)
+            for request in generates:
+                self.assertTrue(request["body"].get("cachedContent"))
+            # The retry ran on the fast model, with its own cache; both are deleted at shutdown
+            self.assertEqual(len(server.calls("cache_create")), 2)
+            self.assertEqual(len(server.calls("cache_delete")), 2)
+            self.assertEqual(server.caches, {})
+
+if __name__ == '__main__':
+    unittest.main()
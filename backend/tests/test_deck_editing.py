@@ -0,0 +1,150 @@
+import copy
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+from pptx import Presentation
+
+from services.llm_simulator import MOCK_ANALYSIS_DECK
+from services.pptx_builder import BUILDER_VERSION, PPTXBuilder
+from services.slide_fragments import FragmentStore, SlideFragmentCache, fragment_key
+from tests.helpers import main_app
+
+
+def slide_xml(path: str) -> list:
+    return [slide._element.cSld.xml for slide in Presentation(path).slides]
+
+
+class TestDeckEditing(unittest.TestCase):
+
+    def test_rerender_rebuilds_only_changed_slides(self):
+        """A second render splices stored fragments; the result matches a full build"""
+        deck = copy.deepcopy(MOCK_ANALYSIS_DECK)
+        with tempfile.TemporaryDirectory() as out:
+            fragments = FragmentStore(os.path.join(out, "fragments"))
+            # Deck fragments only: no process-wide cache
+            builder = PPTXBuilder(fragment_cache=SlideFragmentCache(0))
+            builder.build(deck, "first.pptx", output_dir=out, fragments=fragments)
+            self.assertEqual(builder.last_build_stats["rendered"], len(deck["slides"]) + 1)
+
+            deck["slides"][3]["title"] = "Edited title"
+            incremental = builder.build(deck, "second.pptx", output_dir=out, fragments=fragments)
+            # The edited slide and the closing slide
+            self.assertEqual(builder.last_build_stats["rendered"], 2)
+            self.assertEqual(builder.last_build_stats["reused"], len(deck["slides"]) - 1)
+
+            full = PPTXBuilder(fragment_cache=SlideFragmentCache(0)).build(deck, "full.pptx", output_dir=out)
+            self.assertEqual(slide_xml(incremental), slide_xml(full))
+            notes = [s.notes_slide.notes_text_frame.text if s.has_notes_slide else None
+                     for s in Presentation(incremental).slides]
+            self.assertEqual(notes, [s.notes_slide.notes_text_frame.text if s.has_notes_slide else None
+                                     for s in Presentation(full).slides])
+
+    def test_fragment_cache_is_shared_across_decks_and_bounded(self):
+        """Identical slides of other decks are spliced from the LRU, which evicts to its size bound"""
+        cache = SlideFragmentCache(10 ** 7)
+        builder = PPTXBuilder(fragment_cache=cache)
+        first = copy.deepcopy(MOCK_ANALYSIS_DECK)
+        other = {"presentation_title": "Otro", "slides": [
+            {"type": "title_slide", "title": "Otro deck", "subtitle": ""}] + first["slides"][1:3]}
+        with tempfile.TemporaryDirectory() as out:
+            builder.build(first, "a.pptx", output_dir=out)
+            builder.build(other, "b.pptx", output_dir=out)
+            stats = builder.last_build_stats
+            # Slides 2-3 are not position-dependent; the closing slide is shared
+            self.assertEqual((stats["rendered"], stats["cache_hits"]), (1, 3))
+            builder.build(other, "c.pptx", output_dir=out)
+            self.assertEqual(builder.last_build_stats["rendered"], 0)
+            self.assertEqual(slide_xml(os.path.join(out, "c.pptx")), slide_xml(os.path.join(out, "b.pptx")))
+            # Another theme is another key
+            builder.build(other, "d.pptx", theme_id="midnight_blue", output_dir=out)
+            self.assertEqual(builder.last_build_stats["cache_hits"], 0)
+
+        # Builder version is part of the key
+        slide = first["slides"][1]
+        self.assertNotEqual(fragment_key(slide, "corporate_navy", 1, 10, BUILDER_VERSION),
+                            fragment_key(slide, "corporate_navy", 1, 10, BUILDER_VERSION + "x"))
+
+        small = SlideFragmentCache(max_bytes=250)
+        for i in range(5):
+            small.put(str(i), {"xml": "x" * 100, "notes": None})
+        small.get("3")
+        small.put("5", {"xml": "x" * 100, "notes": None})
+        snapshot = small.snapshot()
+        self.assertLessEqual(snapshot["bytes"], 250)
+        self.assertIsNotNone(small.get("3"))
+        self.assertIsNone(small.get("0"))
+        self.assertGreaterEqual(snapshot["evictions"], 4)
+
+    def test_numbered_footers_are_not_reused_at_another_position(self):
+        """A slide that prints its number is rendered anew when it moves, even from the shared cache"""
+        builder = PPTXBuilder(fragment_cache=SlideFragmentCache(10 ** 7))
+        title = {"type": "title_slide", "title": "Ventas", "subtitle": ""}
+        divider = {"type": "section_divider", "title": "Resultados", "subtitle": ""}
+        metrics = next(s for s in MOCK_ANALYSIS_DECK["slides"] if s["type"] == "metrics_slide")
+        with tempfile.TemporaryDirectory() as out:
+            builder.build({"slides": [title, metrics]}, "short.pptx", output_dir=out)
+            path = builder.build({"slides": [title, divider, divider, metrics]}, "long.pptx", output_dir=out)
+            # The title, the repeated divider and the closing slide come from the cache; the metrics slide does not
+            self.assertEqual(builder.last_build_stats["cache_hits"], 3)
+            footer = [shape.text_frame.text for shape in Presentation(path).slides[3].shapes
+                      if shape.has_text_frame and shape.text_frame.text.endswith("/")]
+        self.assertEqual(footer, ["4/"])
+
+    def test_regenerate_and_edit_a_single_slide(self):
+        """The deck is stored at generation; one slide can be regenerated or replaced by index"""
+        with main_app() as main:
+            client = TestClient(main.app)
+            generated = client.post("/generate-from-prompt", data={"prompt": "Plan de ventas 2025 para LATAM"})
+            deck_id, token = generated.headers["X-Deck-ID"], generated.headers["X-Deck-Token"]
+            before = client.get(f"/decks/{deck_id}", params={"deck_token": token}).json()["deck"]
+
+            regenerated = client.post(f"/decks/{deck_id}/slides/1/regenerate",
+                                      data={"deck_token": token, "instruction": "Más concreto"})
+            after = client.get(f"/decks/{deck_id}", params={"deck_token": token}).json()
+
+            edited_slide = {"type": "section_divider", "title": "Próximos pasos", "subtitle": "2025"}
+            edited = client.put(f"/decks/{deck_id}/slides/2", params={"deck_token": token}, json=edited_slide)
+            invalid = client.put(f"/decks/{deck_id}/slides/2", params={"deck_token": token},
+                                 json={"type": "content_slide", "title": "Sin bullets"})
+            forbidden = client.get(f"/decks/{deck_id}", params={"deck_token": "wrong"})
+            missing = client.put(f"/decks/{deck_id}/slides/99", params={"deck_token": token}, json=edited_slide)
+            final = client.get(f"/decks/{deck_id}", params={"deck_token": token}).json()
+
+        self.assertEqual(generated.status_code, 200)
+        self.assertEqual(regenerated.status_code, 200)
+        self.assertEqual(regenerated.headers["X-Deck-Version"], "2")
+        self.assertNotEqual(after["deck"]["slides"][1], before["slides"][1])
+        self.assertEqual(after["deck"]["slides"][2:], before["slides"][2:])
+        self.assertEqual(edited.status_code, 200)
+        self.assertEqual(final["deck"]["slides"][2]["title"], "Próximos pasos")
+        self.assertEqual(final["version"], 3)
+        self.assertEqual(invalid.status_code, 422)
+        self.assertEqual(forbidden.status_code, 403)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_each_generation_from_a_session_is_a_new_deck(self):
+        """Generating twice from one analyzed session keeps both decks and their tokens"""
+        with main_app() as main:
+            client = TestClient(main.app)
+            session = client.post("/analyze", files={"files": ("ventas.txt", b"Ventas Q3: 1200 unidades")}).json()
+            data = {"session_id": session["session_id"], "session_token": session["session_token"]}
+            first = client.post("/generate", data=data)
+            second = client.post("/generate", data={**data, "theme": "midnight_blue"})
+            decks = [client.get(f"/decks/{r.headers['X-Deck-ID']}", params={"deck_token": r.headers["X-Deck-Token"]})
+                     for r in (first, second)]
+
+        self.assertEqual([r.status_code for r in (first, second)], [200, 200])
+        self.assertNotEqual(first.headers["X-Deck-ID"], session["session_id"])
+        self.assertNotEqual(first.headers["X-Deck-ID"], second.headers["X-Deck-ID"])
+        self.assertEqual([d.status_code for d in decks], [200, 200])
+        self.assertEqual([d.json()["theme"] for d in decks], ["corporate_navy", "midnight_blue"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import asyncio
+import copy
+import io
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from fastapi.testclient import TestClient
+from pptx import Presentation
+
+from services.intelligence import IntelligenceService
+from services.llm_simulator import MOCK_ANALYSIS_DECK, LatencyModel, LLMSimulator
+from services.slide_schema import NOTES_DEFERRED_RULE
+from tests.helpers import main_app, sample
+
+
+def pptx_notes(content: bytes) -> list:
+    return [s.notes_slide.notes_text_frame.text if s.has_notes_slide else "" for s in Presentation(io.BytesIO(content)).slides]
+
+
+class TestDeferredNotes(unittest.TestCase):
+
+    def test_decks_are_written_without_notes_and_notes_come_in_one_call(self):
+        """Deferred mode drops notes from the deck prompt (shorter output); one later call writes them all"""
+        outputs = {}
+        for deferred in (False, True):
+            service = IntelligenceService(api_key=None)
+            service.simulator = LLMSimulator(latency=LatencyModel(median_ms=0))
+            service.deferred_notes = deferred
+            prompts, generate = [], service.simulator.generate
+
+            async def recording(task, prompt, full_prompt=None, generate=generate, prompts=prompts):
+                response = await generate(task, prompt, full_prompt=full_prompt)
+                prompts.append((task, full_prompt, len(response.text)))
+                return response
+            service.simulator.generate = recording
+            deck = asyncio.run(service.generate_from_prompt("Plan de ventas 2025 para LATAM"))
+            outputs[deferred] = prompts[0][2]
+
+        self.assertIn(NOTES_DEFERRED_RULE, prompts[0][1])
+        self.assertNotIn('"n": "talking points"', prompts[0][1])
+        self.assertTrue(all(not s.get("speaker_notes") for s in deck["slides"]))
+        self.assertLess(outputs[True], outputs[False] * 0.9)
+
+        notes = asyncio.run(service.write_speaker_notes(deck, "Plan de ventas 2025 para LATAM"))
+        self.assertEqual(prompts[-1][0], "notes")
+        self.assertEqual(len(notes), len(deck["slides"]))
+        self.assertTrue(all(notes))
+        self.assertTrue(notes[1].startswith(deck["slides"][1]["title"]))
+
+    def test_notes_are_patched_into_the_stored_deck_and_pptx(self):
+        """The response has no notes; the background pass adds them to the deck JSON, the file and its fragments"""
+        with main_app() as main:
+            main.intelligence.deferred_notes = True
+            try:
+                client = TestClient(main.app)
+                generated = client.post("/generate-from-prompt", data={"prompt": "Plan de marketing 2025 en Chile"})
+                deck_id, token = generated.headers["X-Deck-ID"], generated.headers["X-Deck-Token"]
+                status = client.get(f"/decks/{deck_id}/notes", params={"deck_token": token, "wait": 5}).json()
+                deck = client.get(f"/decks/{deck_id}", params={"deck_token": token}).json()
+                enriched = client.get(f"/decks/{deck_id}/pptx", params={"deck_token": token})
+                forbidden = client.get(f"/decks/{deck_id}/pptx", params={"deck_token": "wrong"})
+
+                misses = sample("smartdeck_slide_fragments_total", {"outcome": "miss"})
+                edited = client.put(f"/decks/{deck_id}/slides/1", params={"deck_token": token},
+                                    json={"type": "section_divider", "title": "Próximos pasos", "subtitle": "2025"})
+                rendered = sample("smartdeck_slide_fragments_total", {"outcome": "miss"}) - misses
+            finally:
+                main.intelligence.deferred_notes = False
+
+        self.assertEqual(generated.status_code, 200)
+        self.assertEqual(generated.headers["X-Notes-Status"], "pending")
+        self.assertFalse(any(pptx_notes(generated.content)))
+        self.assertEqual(status, {"deck_id": deck_id, "status": "ready", "version": 2})
+        slides = deck["deck"]["slides"]
+        self.assertEqual(deck["notes_status"], "ready")
+        self.assertTrue(all(s["speaker_notes"] for s in slides))
+        self.assertEqual(enriched.headers["X-Deck-Version"], "2")
+        self.assertEqual(pptx_notes(enriched.content)[:len(slides)], [s["speaker_notes"] for s in slides])
+        self.assertEqual(forbidden.status_code, 403)
+        # Fragments were re-keyed with the notes: editing one slide re-renders only it (and maybe the closing slide)
+        self.assertEqual(edited.status_code, 200)
+        self.assertLessEqual(rendered, 2)
+
+    def test_concurrent_writers_merge_into_the_current_deck(self):
+        """A regeneration finishing after the notes pass keeps the notes; an edit made while they are patched survives"""
+        with main_app() as main:
+
+            async def run():
+                notes_gate, regen_gate = asyncio.Event(), asyncio.Event()
+                patching, unblock = threading.Event(), threading.Event()
+
+                async def write_notes(deck, source_text, style_id):
+                    await notes_gate.wait()
+                    return [f"Notas {i}" for i in range(len(deck["slides"]))]
+
+                async def regenerate(deck, index, instruction, source_text, style_id=None):
+                    await regen_gate.wait()
+                    return {"type": "section_divider", "title": "Regenerada", "subtitle": ""}
+
+                def slow_patch(*args):
+                    patching.set()
+                    unblock.wait(5)
+                    return patch_notes_to_path(*args)
+
+                records = []
+                for deck_id in ("race-regen", "race-edit"):
+                    deck = copy.deepcopy(MOCK_ANALYSIS_DECK)
+                    for slide in deck["slides"]:
+                        slide.pop("speaker_notes", None)
+                    records.append(main.deck_store.create(deck_id, deck, "corporate_navy", "executive", "race.pptx",
+                                                          prompt="Plan", notes_status="pending"))
+                    await main._render(deck, f"SmartDeck_{deck_id}.pptx", "corporate_navy",
+                                       main.deck_store.fragment_dir(deck_id))
+
+                transport = httpx.ASGITransport(app=main.app)
+                with patch.object(main.intelligence, "write_speaker_notes", write_notes), \
+                        patch.object(main.intelligence, "regenerate_slide", regenerate), \
+                        patch.object(main, "patch_notes_to_path", slow_patch):
+                    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                        # Regeneration loads the deck, the notes pass saves, then the regeneration saves
+                        first = records[0]
+                        regen = asyncio.create_task(client.post(f"/decks/{first['deck_id']}/slides/1/regenerate",
+                                                                data={"deck_token": first["token"]}))
+                        await asyncio.sleep(0.1)
+                        notes_gate.set()
+                        unblock.set()
+                        await main._enrich_notes(first["deck_id"], "Plan", time.perf_counter())
+                        regen_gate.set()
+                        regenerated = await regen
+
+                        # An edit arrives while the notes are being patched into the file
+                        second = records[1]
+                        patching.clear()
+                        unblock.clear()
+                        notes = asyncio.create_task(main._enrich_notes(second["deck_id"], "Plan", time.perf_counter()))
+                        await asyncio.to_thread(patching.wait, 5)
+                        edit = asyncio.create_task(client.put(
+                            f"/decks/{second['deck_id']}/slides/2", params={"deck_token": second["token"]},
+                            json={"type": "section_divider", "title": "Próximos pasos", "subtitle": "2025"}))
+                        await asyncio.sleep(0.1)
+                        unblock.set()
+                        await notes
+                        edited = await edit
+                return regenerated, edited
+
+            patch_notes_to_path = main.patch_notes_to_path
+            regenerated, edited = asyncio.run(run())
+            after_regen = main.deck_store.load("race-regen")
+            after_edit = main.deck_store.load("race-edit")
+
+        self.assertEqual(regenerated.status_code, 200)
+        self.assertEqual(regenerated.headers["X-Deck-Version"], "3")
+        self.assertEqual((after_regen["version"], after_regen["notes_status"]), (3, "ready"))
+        slides = after_regen["deck"]["slides"]
+        self.assertEqual(slides[1]["title"], "Regenerada")
+        self.assertEqual([s.get("speaker_notes") for i, s in enumerate(slides) if i != 1],
+                         [f"Notas {i}" for i in range(len(slides)) if i != 1])
+
+        self.assertEqual(edited.status_code, 200)
+        self.assertEqual(edited.headers["X-Deck-Version"], "3")
+        self.assertEqual((after_edit["version"], after_edit["notes_status"]), (3, "ready"))
+        slides = after_edit["deck"]["slides"]
+        self.assertEqual(slides[2]["title"], "Próximos pasos")
+        self.assertEqual(slides[3]["speaker_notes"], "Notas 3")
+
+
+if __name__ == '__main__':
+    unittest.main()
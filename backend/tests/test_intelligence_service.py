@@ -1,7 +1,9 @@
 import sys
 import os
+import json
+import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
 # Add parent directory to path to find 'services' package
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -12,11 +14,17 @@ class TestIntelligenceService(unittest.TestCase):
     
     @patch('services.intelligence.genai')
     def test_init_with_key(self, mock_genai):
-        """Test initialization with API key configures genai"""
+        """Test initialization with API key configures genai on first use"""
         service = IntelligenceService(api_key="fake-key")
-        mock_genai.Client.assert_called_once_with(api_key="fake-key")
+        mock_genai.Client.assert_not_called()
         self.assertEqual(service.model_name, 'gemini-2.0-flash')
         self.assertIsNotNone(service.client)
+        self.assertIs(service.client, service.client)
+        mock_genai.Client.assert_called_once()
+        kwargs = mock_genai.Client.call_args.kwargs
+        self.assertEqual(kwargs["api_key"], "fake-key")
+        # Our pooled keep-alive transport, not the library default
+        self.assertIs(kwargs["http_options"].httpx_async_client, service.http)
 
     def test_init_without_key(self):
         """Test initialization without API key (e.g. CI/CD)"""
@@ -27,7 +35,7 @@ class TestIntelligenceService(unittest.TestCase):
     def test_analyze_without_key_returns_mock(self):
         """Ensure analyze_and_structure returns mock response when no key is present"""
         service = IntelligenceService(api_key=None)
-        result = service.analyze_and_structure("some text")
+        result = asyncio.run(service.analyze_and_structure("some text"))
         
         self.assertIn("presentation_title", result)
         self.assertIn("slides", result)
@@ -35,21 +43,132 @@ class TestIntelligenceService(unittest.TestCase):
 
     @patch('services.intelligence.genai')
     def test_analyze_with_key_calls_model(self, mock_genai):
-        """Ensure analyze_and_structure calls client.models.generate_content when key is present"""
+        """Ensure analyze_and_structure calls client.aio.models.generate_content when key is present"""
         # Setup mock client
         mock_client = MagicMock()
         mock_response = MagicMock()
         mock_response.text = '{"presentation_title": "AI Title", "slides": []}'
         
-        # Mock client.models.generate_content
-        mock_client.models.generate_content.return_value = mock_response
+        # Mock client.aio.models.generate_content
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
         mock_genai.Client.return_value = mock_client
         
         service = IntelligenceService(api_key="fake-key")
-        result = service.analyze_and_structure("some text")
+        result = asyncio.run(service.analyze_and_structure("some text"))
         
-        mock_client.models.generate_content.assert_called()
+        mock_client.aio.models.generate_content.assert_called()
         self.assertEqual(result["presentation_title"], "AI Title")
 
+    @patch('services.intelligence.genai')
+    def test_map_reduce_condenses_every_chunk(self, mock_genai):
+        """Large inputs are condensed chunk by chunk, then structured in one reduce call"""
+        insight = MagicMock(text='{"summary": "part", "key_points": ["Revenue +8%"], "metrics": []}')
+        deck = MagicMock(text='{"presentation_title": "Reduced", "slides": []}')
+        in_flight = {"now": 0, "max": 0}
+
+        async def generate_content(model, contents, config):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return deck if "CONDENSED INSIGHTS" in contents else insight
+
+        mock_client = MagicMock()
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=generate_content)
+        mock_genai.Client.return_value = mock_client
+
+        service = IntelligenceService(api_key="fake-key")
+        rows = "\n".join(f"| {i} | Norte | {i * 10} |" for i in range(3000))
+        text = f"\n\n--- Source: big.csv ---\n| id | region | amount |\n|---|---|---|\n{rows}"
+        result, stats = asyncio.run(service.map_reduce_structure(text, chunk_tokens=2000, concurrency=3))
+
+        self.assertEqual(result["presentation_title"], "Reduced")
+        self.assertGreater(stats.chunks, 3)
+        self.assertEqual(mock_client.aio.models.generate_content.call_count, stats.chunks + 1)
+        self.assertLessEqual(in_flight["max"], 3)
+        self.assertEqual(stats.failed_chunks, 0)
+
+    @patch('services.intelligence.genai')
+    def test_only_invalid_slides_are_repaired(self, mock_genai):
+        """A bad slide triggers one repair call for that slide, not a full regeneration"""
+        deck = {
+            "presentation_title": "AI Title",
+            "slides": [
+                {"type": "title_slide", "title": "Cover"},
+                {"type": "metrics_slide", "title": "KPIs"},  # missing metrics
+                {"type": "content_slide", "title": "Body", "bullet_points": ["a"]},
+            ],
+        }
+        repaired = {"slides": [{"type": "metrics_slide", "title": "KPIs",
+                                "metrics": [{"value": "$1M", "label": "Revenue"}]}]}
+        responses = [MagicMock(text=json.dumps(deck)), MagicMock(text=json.dumps(repaired))]
+
+        mock_client = MagicMock()
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=responses)
+        mock_genai.Client.return_value = mock_client
+
+        service = IntelligenceService(api_key="fake-key")
+        result = asyncio.run(service.generate_from_prompt("Q3 sales deck for LATAM"))
+
+        self.assertEqual([s["type"] for s in result["slides"]],
+                         ["title_slide", "metrics_slide", "content_slide"])
+        self.assertEqual(result["slides"][1]["metrics"][0]["value"], "$1M")
+        repair_prompt = mock_client.aio.models.generate_content.call_args_list[1].kwargs["contents"]
+        self.assertIn('"index": 1', repair_prompt)
+        self.assertNotIn("Cover", repair_prompt.split("SLIDES TO FIX")[1])
+        self.assertEqual(service.validation_stats["repair_calls"], 1)
+        self.assertEqual(service.validation_stats["slides_repaired"], 1)
+
+    def test_repair_with_a_different_slide_count_is_ignored(self):
+        """Repaired slides are matched by position, so a short answer is not applied at all"""
+        service = IntelligenceService(api_key=None)
+        deck = {"presentation_title": "AI Title", "slides": [
+            {"type": "metrics_slide", "title": "KPIs"},
+            {"type": "chart_slide", "title": "Ventas"},
+        ]}
+        fixed = {"type": "metrics_slide", "title": "KPIs", "metrics": [{"value": "$1M", "label": "Revenue"}]}
+        with patch.object(service, "_repair_slides", AsyncMock(return_value=[fixed])):
+            result = asyncio.run(service._validate_and_repair(deck))
+
+        self.assertEqual(service.validation_stats["slides_repaired"], 0)
+        self.assertEqual([s["title"] for s in result["slides"]], ["KPIs", "Ventas"])
+        self.assertNotIn("metrics", result["slides"][0])
+
+    def test_next_repair_round_sees_the_latest_attempt(self):
+        """A slide still broken after one round is sent again as last returned, with its new errors"""
+        service = IntelligenceService(api_key=None)
+        deck = {"presentation_title": "AI Title", "slides": [{"type": "metrics_slide", "title": "KPIs"}]}
+        attempt = {"type": "metrics_slide", "title": "KPIs v2", "metrics": "none"}
+        fixed = {"type": "metrics_slide", "title": "KPIs v3", "metrics": [{"value": "$1M", "label": "Revenue"}]}
+        repair = AsyncMock(side_effect=[[attempt], [fixed]])
+        with patch.object(service, "_repair_slides", repair), \
+                patch("services.intelligence.settings.SLIDE_REPAIR_MAX_ROUNDS", 2):
+            result = asyncio.run(service._validate_and_repair(deck))
+
+        slides, errors = repair.call_args_list[1].args[1:3]
+        self.assertEqual(slides[0], attempt)
+        self.assertEqual(list(errors), [0])
+        self.assertNotEqual(errors[0], repair.call_args_list[0].args[2][0])
+        self.assertEqual(result["slides"][0]["title"], "KPIs v3")
+        self.assertEqual(service.validation_stats["slides_repaired"], 1)
+
+    @patch('services.intelligence.genai')
+    def test_truncated_json_keeps_complete_slides(self, mock_genai):
+        """Malformed JSON no longer swaps in the mock deck when slides can be salvaged"""
+        text = ('{"presentation_title": "AI Title", "slides": ['
+                '{"type": "title_slide", "title": "Cover"}, '
+                '{"type": "content_slide", "title": "Body", "bullet_points": ["a"]}, '
+                '{"type": "metrics_slide", "title": "Cut off", "metr')
+        mock_client = MagicMock()
+        mock_client.aio.models.generate_content = AsyncMock(return_value=MagicMock(text=text))
+        mock_genai.Client.return_value = mock_client
+
+        service = IntelligenceService(api_key="fake-key")
+        result = asyncio.run(service.generate_from_prompt("Q3 sales deck for LATAM"))
+
+        self.assertEqual(result["presentation_title"], "AI Title")
+        self.assertEqual(len(result["slides"]), 2)
+        self.assertEqual(service.validation_stats["json_salvaged"], 1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import settings
+from services.intelligence import IntelligenceService
+from services.llm_governor import (
+    GovernorTimeout,
+    LLMGovernor,
+    MemoryGovernorStore,
+    SQLiteGovernorStore,
+)
+from services.llm_simulator import LatencyModel, LLMSimulator
+from tests.helpers import sample
+
+
+class TestLLMGovernor(unittest.TestCase):
+
+    def test_limit_grows_additively_and_halves_once_per_burst(self):
+        """Successes add ~1 per round; a burst of 429s from one round cuts the limit once"""
+        governor = LLMGovernor(MemoryGovernorStore(4), min_limit=1, max_limit=8)
+
+        async def run():
+            deadline = time.monotonic() + 1
+            for _ in range(4):
+                lease = await governor.acquire(deadline)
+                governor.release(lease, "ok", time.time())
+            grown = governor.store.limit
+
+            started = time.time()
+            leases = [await governor.acquire(deadline) for _ in range(4)]
+            for lease in leases:
+                governor.release(lease, "quota", started)
+            return grown, governor.store.limit
+
+        grown, cut = asyncio.run(run())
+        self.assertAlmostEqual(grown, 5.0, delta=0.1)
+        self.assertAlmostEqual(cut, grown / 2)
+        self.assertEqual(governor.stats["decreases"], 1)
+        self.assertEqual(governor.stats["quota_errors"], 4)
+
+    def test_excess_calls_queue_until_their_deadline(self):
+        """Over the limit, calls wait earliest-deadline-first and time out only at their deadline"""
+        governor = LLMGovernor(MemoryGovernorStore(1), max_limit=1)
+
+        async def run():
+            held = await governor.acquire(time.monotonic() + 1)
+            order = []
+
+            async def call(name, deadline):
+                lease = await governor.acquire(deadline)
+                order.append(name)
+                governor.release(lease, "ok", time.time())
+
+            late = asyncio.create_task(call("late", time.monotonic() + 5))
+            soon = asyncio.create_task(call("soon", time.monotonic() + 2))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(GovernorTimeout):
+                await governor.acquire(time.monotonic() + 0.05)
+            depth = governor.queue_depth()
+            governor.release(held, "ok", time.time())
+            await asyncio.gather(late, soon)
+            return order, depth
+
+        order, depth = asyncio.run(run())
+        self.assertEqual(depth, 2)
+        self.assertEqual(order, ["soon", "late"])
+        self.assertEqual(governor.stats["timeouts"], 1)
+
+    def test_sqlite_store_shares_limit_and_leases(self):
+        """Two processes' stores on one file see one limit and one set of leases"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "governor.sqlite3")
+            first, second = SQLiteGovernorStore(path, 2), SQLiteGovernorStore(path, 2)
+            lease = first.try_lease()
+            self.assertIsNotNone(second.try_lease())
+            self.assertIsNone(second.try_lease())
+            first.release(lease)
+            self.assertIsNotNone(second.try_lease())
+
+            args = {"min_limit": 1, "max_limit": 8, "decrease_factor": 0.5}
+            first.adjust("quota", time.time(), **args)
+            self.assertEqual(second.snapshot()["limit"], 1)
+
+    def test_quota_errors_are_retried_instead_of_mocked(self):
+        """Transient 429s shrink the limit and are retried; the request still gets a real answer"""
+        with patch.object(settings, "LLM_GOVERNOR_RETRY_BASE_SECONDS", 0.001):
+            service = IntelligenceService(api_key=None)
+            service.simulator = LLMSimulator(latency=LatencyModel(median_ms=0), failure_rate=0.5,
+                                             quota_error_share=1.0, seed=7)
+            fallbacks_before = sample("smartdeck_mock_fallbacks_total", {"reason": "llm_error"})
+
+            async def run():
+                calls = [service.generate_from_prompt(f"Plan comercial {i} para 2025") for i in range(8)]
+                return await asyncio.wait_for(asyncio.gather(*calls), 10)
+            decks = asyncio.run(run())
+
+        self.assertEqual(len(decks), 8)
+        self.assertGreater(service.governor.stats["quota_errors"], 0)
+        self.assertEqual(sample("smartdeck_mock_fallbacks_total", {"reason": "llm_error"}), fallbacks_before)
+        self.assertEqual(service.governor.snapshot()["in_flight"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
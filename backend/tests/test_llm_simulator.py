@@ -0,0 +1,75 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.llm_simulator import LatencyModel, LLMSimulator, SimulatedLLMError
+from services.slide_schema import validate_slides
+
+
+def fast_simulator(**kwargs) -> LLMSimulator:
+    return LLMSimulator(latency=LatencyModel(median_ms=0), seed=7, **kwargs)
+
+
+class TestLLMSimulator(unittest.TestCase):
+
+    def test_same_input_gives_same_valid_deck(self):
+        """Output is seeded from the prompt and passes slide validation"""
+        sim = fast_simulator()
+        first = asyncio.run(sim.generate("structure", "=== RAW DATA ===\nsales by region"))
+        second = asyncio.run(sim.generate("structure", "=== RAW DATA ===\nsales by region"))
+        self.assertEqual(first.text, second.text)
+
+        deck = json.loads(first.text)
+        _, errors = validate_slides(deck["slides"])
+        self.assertEqual(errors, {})
+        self.assertGreater(first.usage_metadata.candidates_token_count, 0)
+
+        prompt_deck = json.loads(asyncio.run(sim.generate("prompt", "=== USER'S REQUEST ===\nPlan de ventas")).text)
+        self.assertIn("Plan de ventas", prompt_deck["slides"][0]["subtitle"])
+
+    def test_latency_does_not_block_the_event_loop(self):
+        """Concurrent calls overlap instead of serializing like time.sleep did"""
+        sim = LLMSimulator(latency=LatencyModel(median_ms=200), seed=1)
+
+        async def run():
+            await asyncio.gather(*(sim.generate("structure", f"input {i}") for i in range(10)))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        self.assertLess(time.perf_counter() - started, 1.0)
+
+    def test_fault_injection_rates(self):
+        """Failures raise 429/503 and malformed outputs are truncated JSON"""
+        sim = fast_simulator(failure_rate=0.3, malformed_rate=0.3)
+
+        async def run():
+            outcomes = {"ok": 0, "malformed": 0, 429: 0, 503: 0}
+            for i in range(400):
+                try:
+                    response = await sim.generate("structure", f"input {i}")
+                except SimulatedLLMError as e:
+                    outcomes[e.code] += 1
+                    continue
+                try:
+                    json.loads(response.text)
+                    outcomes["ok"] += 1
+                except ValueError:
+                    outcomes["malformed"] += 1
+            return outcomes
+
+        outcomes = asyncio.run(run())
+        failures = outcomes[429] + outcomes[503]
+        self.assertTrue(80 <= failures <= 160, outcomes)
+        self.assertGreater(outcomes[429], 0)
+        self.assertGreater(outcomes[503], 0)
+        self.assertTrue(50 <= outcomes["malformed"] <= 130, outcomes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import settings
+from services.intelligence import IntelligenceService
+from services.llm_transport import ConnectionStats, build_http_client
+from tests.fake_gemini import FakeGeminiServer
+from tests.helpers import sample
+
+
+class TestLLMTransport(unittest.TestCase):
+
+    def test_warmed_connections_are_reused_by_calls(self):
+        """Warm-up opens pooled connections; the real client's calls then go out on them"""
+        with FakeGeminiServer() as server, \
+                patch.object(settings, "GEMINI_BASE_URL", server.url), \
+                patch.object(settings, "CONTEXT_CACHE_ENABLED", False), \
+                patch.object(settings, "LLM_HTTP_WARM_CONNECTIONS", 3):
+            service = IntelligenceService(api_key="fake-key")
+            service.warm_up()
+            reused = sample("smartdeck_llm_connections_total", {"connection": "reused"})
+
+            async def run():
+                opened = await service.warm_connections()
+                for _ in range(2):
+                    await asyncio.gather(*(service.generate_from_prompt(f"Plan comercial {i} para 2025")
+                                           for i in range(3)))
+                await service.aclose()
+                return opened
+            opened = asyncio.run(run())
+
+        self.assertEqual(opened, 3)
+        self.assertEqual(len(server.calls("get")), 3)
+        self.assertEqual(len(server.calls("generate")), 6)
+        stats = service.connection_stats.snapshot()
+        self.assertEqual((stats["new_connections"], stats["reused_connections"]), (3, 6))
+        self.assertAlmostEqual(stats["reuse_ratio"], 0.667)
+        self.assertEqual(sample("smartdeck_llm_connections_total", {"connection": "reused"}), reused + 6)
+
+    def test_transport_follows_settings(self):
+        """Pool limits and per-phase timeouts come from settings; HTTP/2 falls back without h2"""
+        with patch.object(settings, "LLM_HTTP_MAX_CONNECTIONS", 7), \
+                patch.object(settings, "LLM_HTTP_CONNECT_TIMEOUT_SECONDS", 2.5), \
+                patch.object(settings, "LLM_HTTP2", True), \
+                patch("services.llm_transport._http2_available", return_value=False), \
+                self.assertLogs("services.llm_transport", "WARNING"):
+            http = build_http_client(settings, ConnectionStats())
+        transport = http._transport
+        self.assertEqual(transport._pool._max_connections, 7)
+        self.assertEqual(transport.timeouts["connect"], 2.5)
+        self.assertEqual(transport.timeouts["read"], settings.LLM_HTTP_READ_TIMEOUT_SECONDS)
+        self.assertFalse(transport._pool._http2)
+
+
+if __name__ == '__main__':
+    unittest.main()
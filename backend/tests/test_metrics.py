@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest.mock import AsyncMock, patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+
+from services import metrics
+from services.intelligence import IntelligenceService
+from services.llm_simulator import LatencyModel, LLMSimulator
+from tests.helpers import main_app, sample
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_metrics_endpoint_serves_prometheus_text(self):
+        """GET /metrics exposes the pipeline collectors and records itself"""
+        with main_app() as main:
+            client = TestClient(main.app)
+            client.get("/styles")
+            response = client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        for name in ("smartdeck_llm_request_seconds", "smartdeck_render_seconds",
+                     "smartdeck_rate_limit_rejections_total", "smartdeck_active_sessions"):
+            self.assertIn(name, response.text)
+        self.assertIn('route="/styles"', response.text)
+
+    def test_oldest_sessions_and_summaries_are_dropped_at_the_limit(self):
+        """Past MAX_ACTIVE_SESSIONS the oldest session goes, with its summary, and the gauge follows"""
+        with main_app() as main, patch.dict(main.ACTIVE_SESSIONS, clear=True), \
+                patch.dict(main.SESSION_SUMMARIES, clear=True), patch.object(main.settings, "MAX_ACTIVE_SESSIONS", 2):
+            for session_id in ("s1", "s2", "s3"):
+                main._open_session(session_id)
+                main.SESSION_SUMMARIES[session_id] = {"status": "pending", "summary": ""}
+
+            self.assertEqual(list(main.ACTIVE_SESSIONS), ["s2", "s3"])
+            self.assertEqual(list(main.SESSION_SUMMARIES), ["s2", "s3"])
+            self.assertEqual(sample("smartdeck_active_sessions"), 2)
+
+            # A summary finishing after its session was dropped is discarded
+            with patch.object(main.intelligence, "summarize_with_llm", AsyncMock(return_value="Resumen")):
+                asyncio.run(main._summarize_session("s1", "texto"))
+            self.assertNotIn("s1", main.SESSION_SUMMARIES)
+
+    def test_llm_failures_and_mock_fallbacks_are_counted(self):
+        """A failing LLM call is labelled by error class and counted as a fallback"""
+        service = IntelligenceService(api_key=None)
+        service.simulator = LLMSimulator(latency=LatencyModel(median_ms=0), failure_rate=1.0,
+                                         quota_error_share=0.0, seed=3)
+        errors_before = sample("smartdeck_llm_errors_total", {"task": "structure", "error_class": "http_503"})
+        fallbacks_before = sample("smartdeck_mock_fallbacks_total", {"reason": "llm_error"})
+
+        deck = asyncio.run(service.analyze_and_structure("Ventas Q3: 1200 unidades"))
+
+        self.assertEqual(deck["presentation_title"], "Q3 2024 Executive Business Review")
+        self.assertEqual(
+            sample("smartdeck_llm_errors_total", {"task": "structure", "error_class": "http_503"}),
+            errors_before + 1)
+        self.assertEqual(sample("smartdeck_mock_fallbacks_total", {"reason": "llm_error"}), fallbacks_before + 1)
+
+    def test_labels_stay_low_cardinality(self):
+        """File types outside the allow-list and unknown errors collapse to fixed labels"""
+        allowed = {".csv", ".xlsx"}
+        self.assertEqual(metrics.file_type("ventas.CSV", allowed), "csv")
+        self.assertEqual(metrics.file_type("payload.exe", allowed), "other")
+        self.assertEqual(metrics.error_class(TimeoutError()), "timeout")
+        self.assertEqual(metrics.error_class(ValueError("x")), "ValueError")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import settings
+from services.intelligence import IntelligenceService
+from services.llm_simulator import MOCK_PROMPT_DECK
+from services.model_router import ModelRouter
+from tests.helpers import sample
+
+
+class _QuotaError(Exception):
+    code = 429
+
+
+class _Models:
+    """Stand-in for client.aio.models: records the model of every call, 429s the first strong one."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate_content(self, model, contents, config):
+        self.calls.append(model)
+        if model == settings.LLM_MODEL_STRONG and self.calls.count(model) == 1:
+            raise _QuotaError("429 RESOURCE_EXHAUSTED")
+        text = json.dumps(MOCK_PROMPT_DECK) if config.response_mime_type else "Resumen breve."
+        usage = SimpleNamespace(prompt_token_count=len(contents) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class TestModelRouter(unittest.TestCase):
+
+    def test_tasks_route_to_their_tier_and_strong_calls_downgrade(self):
+        """Configured tier per task; strong calls use the fast model under load and after a quota error"""
+        router = ModelRouter({"fast": "lite", "strong": "flash"}, {"summary": "fast", "prompt": "strong"},
+                             downgrade_queue_depth=4, quota_cooldown_seconds=60)
+        self.assertEqual(router.route("summary").model, "lite")
+        self.assertEqual(router.route("prompt", queue_depth=3).model, "flash")
+        self.assertEqual(router.route("unknown").tier, "strong")
+
+        loaded = router.route("prompt", queue_depth=4)
+        self.assertEqual((loaded.model, loaded.reason), ("lite", "load"))
+
+        retry = router.after_quota_error(router.route("prompt"))
+        self.assertEqual((retry.model, retry.reason), ("lite", "retry"))
+        self.assertEqual(router.after_quota_error(retry), retry)
+        self.assertEqual(router.route("prompt").reason, "quota")
+        self.assertEqual(router.snapshot()["downgraded_quota"], 1)
+
+        # One model for both tiers: nothing to downgrade to
+        single = ModelRouter({"fast": "flash", "strong": "flash"}, {}, downgrade_queue_depth=1)
+        self.assertEqual(single.route("prompt", queue_depth=9).reason, "task")
+
+    def test_service_sends_each_task_to_its_model(self):
+        """Summaries go to the fast model; a quota error on the strong model is retried on the fast one"""
+        service = IntelligenceService(api_key="fake-key")
+        models = _Models()
+        service.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+        retries = sample("smartdeck_llm_routes_total", {"task": "prompt", "tier": "fast", "reason": "retry"})
+        fast_tokens = sample("smartdeck_llm_tier_tokens_total", {"task": "prompt", "tier": "fast", "direction": "output"})
+
+        summary = asyncio.run(service.summarize_with_llm("Ventas por región y trimestre"))
+        with patch.object(settings, "LLM_GOVERNOR_RETRY_BASE_SECONDS", 0.001):
+            deck = asyncio.run(service.generate_from_prompt("Plan de ventas 2025 para LATAM"))
+        after_quota = service.router.route("prompt")
+
+        self.assertEqual(summary, "Resumen breve.")
+        self.assertEqual(models.calls, [settings.LLM_MODEL_FAST, settings.LLM_MODEL_STRONG, settings.LLM_MODEL_FAST])
+        self.assertEqual(deck["presentation_title"], MOCK_PROMPT_DECK["presentation_title"])
+        self.assertEqual(sample("smartdeck_llm_routes_total", {"task": "prompt", "tier": "fast", "reason": "retry"}),
+                         retries + 1)
+        self.assertGreater(sample("smartdeck_llm_tier_tokens_total",
+                                  {"task": "prompt", "tier": "fast", "direction": "output"}), fast_tokens)
+        # Strong calls stay on the fast model during the cooldown
+        self.assertEqual((after_quota.tier, after_quota.reason), ("fast", "quota"))
+
+
+if __name__ == '__main__':
+    unittest.main()
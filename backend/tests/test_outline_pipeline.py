@@ -0,0 +1,114 @@
+import asyncio
+import glob
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+
+from config import settings
+from services.intelligence import IntelligenceService
+from services.llm_simulator import LatencyModel, LLMSimulator, SimulatedLLMError
+from services.slide_schema import validate_slides
+from tests.helpers import main_app
+
+
+class _FailingSimulator(LLMSimulator):
+    """Fails every call of the given tasks (and the first `fill` call if asked)."""
+
+    def __init__(self, fail_tasks=(), fail_first_fill=False, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_tasks = set(fail_tasks)
+        self.fail_first_fill = fail_first_fill
+        self.tasks = []
+
+    async def generate(self, task, prompt, full_prompt=None):
+        self.tasks.append(task)
+        if task in self.fail_tasks or (task == "fill" and self.fail_first_fill and self.tasks.count("fill") == 1):
+            raise SimulatedLLMError(503, "UNAVAILABLE")
+        return await super().generate(task, prompt, full_prompt=full_prompt)
+
+
+class TestOutlinePipeline(unittest.TestCase):
+
+    def _service(self, simulator) -> IntelligenceService:
+        service = IntelligenceService(api_key=None)
+        service.simulator = simulator
+        return service
+
+    def test_slides_are_written_in_parallel_after_the_outline(self):
+        """Outline first, then one call per body slide; wall time is far below one long completion"""
+        latency = LatencyModel(median_ms=20, ms_per_output_token=2)
+        single = self._service(LLMSimulator(latency=latency))
+        started = time.perf_counter()
+        asyncio.run(single.analyze_and_structure("Ventas Q3 región norte: 45M"))
+        single_seconds = time.perf_counter() - started
+
+        skeletons = []
+        simulator = _FailingSimulator(latency=latency)
+        service = self._service(simulator)
+        with patch.object(settings, "STRUCTURING_PIPELINE", "outline"), \
+                patch.object(settings, "LLM_GOVERNOR_ENABLED", False):
+            service.governor = None
+            started = time.perf_counter()
+            deck = asyncio.run(service.analyze_and_structure("Ventas Q3 región norte: 45M",
+                                                             on_outline=skeletons.append))
+            outline_seconds = time.perf_counter() - started
+
+        self.assertLess(outline_seconds, single_seconds * 0.7)
+        self.assertEqual(len(skeletons), 1)
+        skeleton = skeletons[0]
+        self.assertEqual(validate_slides(skeleton["slides"])[1], {})
+        # Assembled in outline order, with the outline's titles
+        self.assertEqual([s["title"] for s in deck["slides"]], [s["title"] for s in skeleton["slides"]])
+        bodies = sum(1 for s in deck["slides"] if s["type"] not in ("title_slide", "section_divider"))
+        self.assertEqual(simulator.tasks, ["outline"] + ["fill"] * bodies)
+        self.assertTrue(all(s.get("speaker_notes") for s in deck["slides"]
+                            if s["type"] not in ("title_slide", "section_divider")))
+
+    def test_failures_degrade_per_slide_then_to_a_single_call(self):
+        """A failed slide keeps its skeleton; a failed outline falls back to the one-call pipeline"""
+        fast = LatencyModel(median_ms=0)
+        with patch.object(settings, "STRUCTURING_PIPELINE", "outline"):
+            simulator = _FailingSimulator(fail_first_fill=True, latency=fast)
+            service = self._service(simulator)
+            skeletons = []
+            deck = asyncio.run(service.generate_from_prompt("Plan de ventas 2025 para LATAM",
+                                                            on_outline=skeletons.append))
+            placeholder = skeletons[0]["slides"][1]
+            self.assertEqual({k: deck["slides"][1].get(k) for k in placeholder}, placeholder)
+            self.assertEqual(validate_slides(deck["slides"])[1], {})
+
+            simulator = _FailingSimulator(fail_tasks={"outline"}, latency=fast)
+            deck = asyncio.run(self._service(simulator).generate_from_prompt("Plan de ventas 2025 para LATAM"))
+            self.assertEqual(simulator.tasks, ["outline", "prompt"])
+            self.assertGreater(len(deck["slides"]), 2)
+
+    def test_generate_renders_the_skeleton_while_slides_are_written(self):
+        """The endpoint renders the outline's skeleton early and still returns the finished deck"""
+        with main_app(LLMSimulator(latency=LatencyModel(median_ms=50))) as main:
+            rendered = []
+            render = main._render
+
+            async def recording(structure_json, internal_filename, *args, **kwargs):
+                rendered.append(internal_filename)
+                return await render(structure_json, internal_filename, *args, **kwargs)
+
+            with patch.object(settings, "STRUCTURING_PIPELINE", "outline"), patch.object(main, "_render", recording):
+                response = TestClient(main.app).post("/generate-from-prompt",
+                                                     data={"prompt": "Plan de marketing digital 2025"})
+            deck_id = response.headers["X-Deck-ID"]
+            leftovers = glob.glob(os.path.join(main.GENERATED_DIR, "*_skeleton.pptx"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(rendered, [f"SmartDeck_{deck_id}_skeleton.pptx", f"SmartDeck_{deck_id}.pptx"])
+        self.assertEqual(leftovers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
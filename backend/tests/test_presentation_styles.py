@@ -0,0 +1,42 @@
+import os
+import sys
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.presentation_styles import count_keywords, detect_best_styles
+
+
+class TestDetectBestStyles(unittest.TestCase):
+
+    def test_matches_whole_words_only(self):
+        """Keywords must not match inside longer words (lead/leadership, roi/heroic)"""
+        counts = count_keywords("Leadership praised the heroic misleading effort")
+        self.assertEqual(counts["lead"], 0)
+        self.assertEqual(counts["roi"], 0)
+
+    def test_counts_every_occurrence_case_insensitively(self):
+        """Each occurrence is counted, regardless of case or punctuation around it"""
+        counts = count_keywords("Revenue up. REVENUE down; revenue, KPI and kpi. P&L ok, cash flow positive")
+        self.assertEqual(counts["revenue"], 3)
+        self.assertEqual(counts["kpi"], 2)
+        self.assertEqual(counts["p&l"], 1)
+        self.assertEqual(counts["cash flow"], 1)
+
+    def test_repeated_keywords_weight_the_ranking(self):
+        """A style whose keywords recur throughout the text outranks single mentions"""
+        text = "sales " * 30 + "revenue profit"
+        results = detect_best_styles(text)
+        self.assertEqual(results[0]["id"], "sales")
+        self.assertTrue(results[0]["is_recommended"])
+        self.assertIn("sales", results[0]["reason"])
+
+    def test_defaults_to_executive_without_matches(self):
+        """With no keyword matches, executive is recommended by default"""
+        results = detect_best_styles("lorem ipsum dolor sit amet")
+        recommended = [r["id"] for r in results if r["is_recommended"]]
+        self.assertEqual(recommended, ["executive"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.prompt_packer import PromptPacker, TokenEstimator, compact_lines
+
+
+def _table(name, rows):
+    lines = [f"\n\n--- Source: {name} ---", "| id   | region   | amount   |", "|-----:|:---------|---------:|"]
+    lines += [f"| {i:<4} | Norte    | {i * 10:>8} |" for i in range(rows)]
+    return "\n".join(lines)
+
+class TestPromptPacker(unittest.TestCase):
+
+    def test_compacts_padding_and_drops_duplicate_rows(self):
+        """Table cell padding is collapsed and repeated rows are removed"""
+        lines, duplicates = compact_lines("| a    | b |\n| a    | b |\n|---|---|\n|---|---|")
+        self.assertEqual(lines, ["| a | b |", "|---|---|", "|---|---|"])
+        self.assertEqual(duplicates, 1)
+
+    def test_tables_sharing_a_header_keep_both_headers(self):
+        """A second table with the same header, and a row repeated later on, are not dropped"""
+        body = ("| id | amount |\n|---|---|\n| 1 | 10 |\n| 2 | 20 |\n| 1 | 10 |\n\n"
+                "| id | amount |\n|---|---|\n| 3 | 30 |")
+        lines, duplicates = compact_lines(body)
+        self.assertEqual(lines.count("| id | amount |"), 2)
+        self.assertEqual(lines.count("| 1 | 10 |"), 2)
+        self.assertEqual(duplicates, 0)
+
+    def test_small_input_is_sent_whole(self):
+        """Inputs under budget keep every row"""
+        packed = PromptPacker().pack(_table("a.csv", 10), budget=5000)
+        self.assertIn("| 9 | Norte | 90 |", packed.text)
+        self.assertEqual(packed.sources[0].omitted_lines, 0)
+
+    def test_budget_covers_every_source(self):
+        """A huge first file cannot starve the files after it"""
+        text = _table("huge.csv", 20000) + _table("small.csv", 20)
+        packed = PromptPacker().pack(text, budget=2000)
+        self.assertLessEqual(packed.packed_tokens, 2000 * 1.1)
+        self.assertIn("--- Source: small.csv ---", packed.text)
+        self.assertIn("| 19 | Norte | 190 |", packed.text)
+        # Rows are sampled from the whole file, not just its head
+        self.assertGreater(packed.sources[0].omitted_lines, 0)
+        ids = [int(line.split("|")[1]) for line in packed.text.splitlines()
+               if line.startswith("| ") and line.split("|")[1].strip().isdigit()]
+        self.assertGreater(max(ids), 19000)
+
+    def test_estimator_calibrates_from_reported_usage(self):
+        """observe() moves the estimate toward the API's token count"""
+        estimator = TokenEstimator(smoothing=1.0)
+        text = "Revenue grew 18% to $45.2M"
+        estimator.observe(text, estimator.raw_estimate(text) * 2)
+        self.assertEqual(estimator.estimate(text), estimator.raw_estimate(text) * 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+
+from services.rate_limiter import (
+    CostRateLimiter,
+    MemoryBucketStore,
+    PriorityGate,
+    RateLimitExceeded,
+    SQLiteBucketStore,
+)
+from tests.helpers import main_app
+
+
+def fake_request(headers: dict | None = None, host: str = "10.0.0.1"):
+    return SimpleNamespace(headers={k.lower(): v for k, v in (headers or {}).items()},
+                           client=SimpleNamespace(host=host))
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_cost_is_charged_by_work_and_refills(self):
+        """Expensive requests drain the bucket faster; Retry-After reflects the refill rate"""
+        limiter = CostRateLimiter(MemoryBucketStore(), capacity=10, refill_per_minute=60,
+                                  bytes_per_unit=1000, tokens_per_unit=100)
+        self.assertEqual(limiter.cost(1), 1)
+        self.assertEqual(limiter.cost(1, input_bytes=2000, llm_tokens=300), 6)
+        self.assertEqual(limiter.cost(1, input_bytes=10 ** 9), 10)  # capped at a full bucket
+
+        store = limiter.store
+        self.assertTrue(store.take("a", 6, 10, 1.0, now=0).allowed)
+        denied = store.take("a", 6, 10, 1.0, now=0)
+        self.assertFalse(denied.allowed)
+        self.assertAlmostEqual(denied.retry_after, 2.0)
+        self.assertTrue(store.take("a", 6, 10, 1.0, now=2).allowed)
+        # Cheap requests still fit in what is left
+        self.assertTrue(store.take("b", 6, 10, 1.0, now=0).allowed)
+        self.assertTrue(store.take("b", 1, 10, 1.0, now=0).allowed)
+
+    def test_sqlite_store_is_shared_between_instances(self):
+        """Two stores on one file (as two worker processes would) draw from one bucket"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "buckets.sqlite3")
+            first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+            self.assertTrue(first.take("k", 7, 10, 0.0).allowed)
+            self.assertFalse(second.take("k", 7, 10, 0.0).allowed)
+            self.assertTrue(second.take("k", 3, 10, 0.0).allowed)
+
+    def test_keys_prefer_api_key_then_forwarded_client(self):
+        """Users behind one proxy get separate buckets; spoofed X-Forwarded-For hops are ignored"""
+        limiter = CostRateLimiter(MemoryBucketStore(), capacity=10, refill_per_minute=60, proxy_hops=1,
+                                  api_keys={"secret"})
+        proxied = fake_request({"X-Forwarded-For": "1.2.3.4, 203.0.113.7"})
+        self.assertEqual(limiter.client_key(proxied), "ip:203.0.113.7")
+        keyed = fake_request({"X-API-Key": "secret", "X-Forwarded-For": "203.0.113.7"})
+        self.assertTrue(limiter.client_key(keyed).startswith("key:"))
+        self.assertNotIn("secret", limiter.client_key(keyed))
+        self.assertEqual(limiter.client_key(fake_request()), "ip:10.0.0.1")
+        # Proxy trust is opt-in: by default X-Forwarded-For is not read at all
+        direct = CostRateLimiter(MemoryBucketStore(), capacity=10, refill_per_minute=60)
+        self.assertEqual(direct.client_key(proxied), "ip:10.0.0.1")
+
+        limiter.check("ip:a", 10)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.check("ip:a", 1)
+        limiter.check("ip:b", 10)
+
+    def test_rotating_unknown_api_keys_does_not_reset_the_bucket(self):
+        """An X-API-Key that is not configured is ignored: the caller stays on its address's bucket"""
+        limiter = CostRateLimiter(MemoryBucketStore(), capacity=10, refill_per_minute=0, proxy_hops=1,
+                                  api_keys={"secret"})
+        first = fake_request({"X-API-Key": "random-1", "X-Forwarded-For": "203.0.113.7"})
+        self.assertEqual(limiter.client_key(first), "ip:203.0.113.7")
+        limiter.check(limiter.client_key(first), 10)
+        for i in range(2, 5):
+            rotated = fake_request({"X-API-Key": f"random-{i}", "X-Forwarded-For": "203.0.113.7"})
+            with self.assertRaises(RateLimitExceeded):
+                limiter.check(limiter.client_key(rotated), 1)
+        # A configured key still gets a bucket of its own
+        keyed = fake_request({"X-API-Key": "secret", "X-Forwarded-For": "203.0.113.7"})
+        limiter.check(limiter.client_key(keyed), 10)
+
+    def test_interactive_requests_jump_queued_batch_jobs(self):
+        """A full gate serves waiting interactive requests before earlier batch jobs"""
+        async def run():
+            gate = PriorityGate(1)
+            order = []
+
+            async def job(name, priority):
+                async with gate.slot(priority):
+                    order.append(name)
+                    await asyncio.sleep(0.01)
+
+            await gate.acquire()
+            tasks = [asyncio.create_task(job(f"batch{i}", "batch")) for i in range(3)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(job("interactive", "interactive")))
+            await asyncio.sleep(0)
+            self.assertEqual(gate.depth("batch"), 3)
+            gate.release()
+            await asyncio.gather(*tasks)
+            return order, gate.active
+
+        order, active = asyncio.run(run())
+        self.assertEqual(order[0], "interactive")
+        self.assertEqual(active, 0)
+
+    def test_endpoint_returns_429_with_retry_after(self):
+        """A generation that empties the caller's bucket gets 429 on the next call"""
+        with main_app() as main:
+            limiter = CostRateLimiter(MemoryBucketStore(), capacity=5, refill_per_minute=1)
+            with patch.object(main, "limiter", limiter):
+                client = TestClient(main.app)
+                data = {"prompt": "Plan de ventas 2025 para LATAM"}
+                headers = {"X-Forwarded-For": "198.51.100.9"}
+                first = client.post("/generate-from-prompt", data=data, headers=headers)
+                second = client.post("/generate-from-prompt", data=data, headers=headers)
+                other = client.get("/styles", headers=headers)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertGreater(int(second.headers["Retry-After"]), 0)
+        self.assertEqual(other.status_code, 200)
+
+    def test_generating_from_a_session_still_charges_the_caller(self):
+        """A session is a sub-limit on top of the caller's bucket, not a fresh bucket of its own"""
+        with main_app() as main:
+            limiter = CostRateLimiter(MemoryBucketStore(), capacity=10, refill_per_minute=1)
+            with patch.object(main, "limiter", limiter):
+                client = TestClient(main.app)
+                session = client.post("/analyze", files={"files": ("ventas.txt", b"Ventas Q3: 1200 unidades")}).json()
+                data = {"session_id": session["session_id"], "session_token": session["session_token"]}
+                first = client.post("/generate", data=data)
+                second = client.post("/generate", data=data)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pptx import Presentation
+
+from services import tracing
+from services.llm_simulator import MOCK_ANALYSIS_DECK
+from services.render_pool import RenderPool
+
+
+class TestRenderPool(unittest.TestCase):
+
+    def test_workers_render_valid_decks_and_are_recycled(self):
+        """Concurrent renders produce valid files; workers are replaced every N jobs"""
+        pool = RenderPool(workers=2, max_jobs_per_worker=2)
+        with tempfile.TemporaryDirectory() as out:
+            async def run():
+                jobs = [pool.render(MOCK_ANALYSIS_DECK, os.path.join(out, f"deck_{i}.pptx"), "corporate_navy")
+                        for i in range(6)]
+                return await asyncio.gather(*jobs)
+            try:
+                results = asyncio.run(run())
+            finally:
+                pool.shutdown()
+
+            for result in results:
+                self.assertEqual(os.path.getsize(result.path), result.bytes)
+                # Slides plus the closing slide
+                self.assertEqual(len(Presentation(result.path).slides), len(MOCK_ANALYSIS_DECK["slides"]) + 1)
+            # Only the final files remain: temp files were renamed into place
+            self.assertEqual(sorted(os.listdir(out)), sorted(f"deck_{i}.pptx" for i in range(6)))
+
+        stats = pool.stats()
+        self.assertEqual(stats["completed"], 6)
+        self.assertEqual(stats["in_flight"], 0)
+        # 6 jobs at 2 per worker need at least 3 distinct worker processes
+        self.assertGreaterEqual(stats["pool_recycles"], 1)
+        self.assertGreaterEqual(stats["workers_started"], 3)
+
+    def test_worker_spans_join_the_request_trace(self):
+        """Per-slide and save spans recorded in a worker become children of the caller's span"""
+        pool = RenderPool(workers=1)
+        with tempfile.TemporaryDirectory() as out:
+            async def run():
+                with tracing.trace_request("req-pool", "POST /generate") as (trace, _), \
+                        tracing.span("render") as render:
+                    await pool.render(MOCK_ANALYSIS_DECK, os.path.join(out, "deck.pptx"), "corporate_navy")
+                return trace, render
+            try:
+                trace, render = asyncio.run(run())
+            finally:
+                pool.shutdown()
+
+        children = [s for s in trace.spans if s.parent_id == render.span_id]
+        names = [s.name for s in children]
+        self.assertEqual(sum(n.startswith("render.") for n in names), len(MOCK_ANALYSIS_DECK["slides"]) + 2)
+        self.assertIn("render.save", names)
+        for child in children:
+            self.assertGreaterEqual(child.start_perf, render.start_perf - 0.05)
+            self.assertLessEqual(child.end_perf, render.end_perf + 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import settings
+from services.intelligence import IntelligenceService
+from services.llm_simulator import LatencyModel, LLMSimulator
+from services.retrieval import ChunkIndex, IndexCache
+from tests.helpers import sample
+
+
+def _report(name, topics, paragraphs=40):
+    """A long text report: filler paragraphs with one paragraph per topic hidden in the middle."""
+    body = [f"Paragraph {i}: general operating commentary, routine figures and process notes for the quarter."
+            for i in range(paragraphs)]
+    for offset, (topic, fact) in enumerate(topics.items()):
+        body.insert(paragraphs // 2 + offset * 7, f"{topic}: {fact}")
+    return f"\n\n--- Source: {name} ---\n" + "\n".join(body)
+
+REPORT = (_report("annual_report.docx", {
+              "Churn": "customer churn fell to 3.1% after the loyalty programme",
+              "Logistics": "warehouse automation cut delivery times by 40% in Monterrey",
+          }, paragraphs=400)
+          + _report("hr_survey.pdf", {"Engagement": "employee engagement rose to 78 points"}, paragraphs=60))
+
+
+class TestRetrieval(unittest.TestCase):
+
+    def test_pack_covers_every_source_and_search_finds_sections(self):
+        """Packing keeps a chunk of every source within budget; BM25 ranks the matching chunk first"""
+        index = ChunkIndex(REPORT, chunk_tokens=120)
+        self.assertGreater(len(index.chunks), 20)
+        best = index.chunks[index.search("Delivery times and warehouse automation")[0]]
+        self.assertIn("warehouse automation cut delivery times", best.text)
+        self.assertEqual(index.search("nothing matches zzz"), [])
+
+        packed = index.pack(budget=600)
+        self.assertLessEqual(packed.packed_tokens, 600 * 1.1)
+        self.assertIn("--- Source: annual_report.docx ---", packed.text)
+        self.assertIn("--- Source: hr_survey.pdf ---", packed.text)
+        self.assertIn("parts omitted", packed.text)
+        # The informative paragraphs beat the filler around them
+        self.assertIn("customer churn fell", packed.text)
+        self.assertGreater(packed.sources[0].omitted_lines, 0)
+
+        # One query per planned section: each gets its own evidence
+        excerpt = index.excerpt(["Customer churn", "Employee engagement", "Logistics and delivery"], 1500)
+        self.assertLessEqual(len(excerpt), 1500)
+        for fact in ("churn fell to 3.1%", "engagement rose to 78", "delivery times by 40%"):
+            self.assertIn(fact, excerpt)
+
+        cache = IndexCache(max_entries=1)
+        self.assertIs(cache.get(REPORT), cache.get(REPORT))
+        cache.get("another input")
+        self.assertIsNot(cache.get(REPORT), index)
+
+        # Async callers that miss together share one build, made in a worker thread
+        async def concurrent(cache):
+            return await asyncio.gather(*(cache.aget(REPORT) for _ in range(4)))
+        builds = sample("smartdeck_retrieval_index_seconds_count")
+        indexes = asyncio.run(concurrent(IndexCache()))
+        self.assertTrue(all(i is indexes[0] for i in indexes))
+        self.assertEqual(sample("smartdeck_retrieval_index_seconds_count"), builds + 1)
+
+    def test_slide_calls_get_excerpts_of_the_whole_input(self):
+        """Over budget: the structuring call gets retrieved chunks, slide excerpts come from the full text"""
+        service = IntelligenceService(api_key=None)
+        service.simulator = LLMSimulator(latency=LatencyModel(median_ms=0))
+        prompts, generate = [], service.simulator.generate
+
+        async def recording(task, prompt, full_prompt=None):
+            prompts.append((task, full_prompt))
+            return await generate(task, prompt, full_prompt=full_prompt)
+        service.simulator.generate = recording
+
+        with patch.object(settings, "PROMPT_INPUT_TOKEN_BUDGET", 1500), \
+                patch.object(settings, "STRUCTURING_MODE", "single"):
+            asyncio.run(service.analyze_and_structure(REPORT))
+        structure = prompts[0][1]
+        self.assertIn("--- Source: hr_survey.pdf ---", structure)
+        self.assertIn("parts omitted", structure)
+
+        excerpt = asyncio.run(service._source_excerpt(REPORT, ["Warehouse automation in Monterrey"], 800))
+        self.assertIn("warehouse automation cut delivery times", excerpt)
+        with patch.object(settings, "RETRIEVAL_ENABLED", False):
+            excerpt = asyncio.run(service._source_excerpt(REPORT, ["Warehouse automation"], 800))
+        self.assertIn("warehouse automation", excerpt)
+        self.assertEqual(asyncio.run(service._source_excerpt("short text", ["x"], 800)), "short text")
+
+
+if __name__ == '__main__':
+    unittest.main()
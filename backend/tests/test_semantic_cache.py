@@ -0,0 +1,111 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+
+from config import settings
+from services.rate_limiter import CostRateLimiter, MemoryBucketStore
+from services.semantic_cache import SemanticCache, normalize_tokens
+from tests.helpers import main_app, sample
+
+DECK = {"presentation_title": "Ventas Q3 LATAM", "slides": [{"type": "title_slide", "title": "Ventas Q3"}]}
+
+
+class TestSemanticCache(unittest.TestCase):
+
+    def test_rewordings_hit_and_different_facts_miss(self):
+        """Reworded prompts share a deck; other numbers, other styles and reported pairs do not"""
+        cache = SemanticCache(threshold=0.8)
+        self.assertEqual(normalize_tokens("Q3 sales deck for LATAM"), normalize_tokens("LATAM Q3 sales presentation"))
+        entry_id = cache.store("Q3 sales deck for LATAM", DECK, scope="executive")
+
+        with self.assertLogs("services.semantic_cache.audit", "INFO") as audit:
+            hit = cache.lookup("Create a presentation about LATAM Q3 sales", scope="executive")
+        self.assertEqual((hit.entry_id, hit.similarity, hit.deck), (entry_id, 1.0, DECK))
+        self.assertIn('"event": "hit"', audit.output[0])
+
+        self.assertIsNone(cache.lookup("Q3 sales deck for LATAM", scope="academic"))
+        self.assertIsNone(cache.lookup("Q4 sales deck for LATAM", scope="executive"))
+        cache.store("Plan comercial 2025 para Chile, Perú y Colombia", DECK, scope="executive")
+        with self.assertLogs("services.semantic_cache.audit", "INFO") as audit:
+            self.assertIsNone(cache.lookup("Q3 sales deck for LATAM and Brazil", scope="executive"))
+            self.assertIsNone(cache.lookup("Plan comercial 2026 para Colombia, Chile y Perú", scope="executive"))
+        self.assertIn('"reason": "threshold"', audit.output[0])
+        self.assertIn('"reason": "numbers"', audit.output[1])
+        self.assertIsNone(cache.lookup("Marketing plan for Spain", scope="executive"))
+
+        with self.assertLogs("services.semantic_cache.audit", "WARNING"):
+            self.assertTrue(cache.report_false_positive(entry_id, "LATAM Q3 sales presentation"))
+        self.assertIsNone(cache.lookup("LATAM Q3 sales presentation", scope="executive"))
+
+        stats = cache.snapshot()
+        self.assertEqual((stats["hits"], stats["misses"], stats["false_positives"]), (1, 6, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 0.143)
+
+        # Bounded: the least recently used entry goes first
+        small = SemanticCache(max_entries=2)
+        for topic in ("ventas 2024", "marketing 2024", "finanzas 2024"):
+            small.store(f"Informe de {topic}", DECK)
+        self.assertIsNone(small.lookup("Informe de ventas 2024"))
+        self.assertEqual(small.snapshot()["entries"], 2)
+
+    def test_endpoint_serves_near_duplicates_without_calling_the_llm(self):
+        """A reworded prompt gets the cached deck, flagged in a header; a reported hit is not served again"""
+        with main_app() as main:
+            calls, generate = [], main.intelligence.simulator.generate
+
+            async def counting(task, prompt, full_prompt=None):
+                calls.append(task)
+                return await generate(task, prompt, full_prompt=full_prompt)
+            main.intelligence.simulator.generate = counting
+            hits = sample("smartdeck_semantic_cache_total", {"outcome": "hit"})
+
+            limiter = CostRateLimiter(MemoryBucketStore(), capacity=100, refill_per_minute=60, api_keys={"other-team"})
+            with patch.object(settings, "SEMANTIC_CACHE_ENABLED", True), \
+                    patch.object(main, "semantic_cache", SemanticCache()), patch.object(main, "limiter", limiter):
+                client = TestClient(main.app)
+                first = client.post("/generate-from-prompt", data={"prompt": "Plan de ventas Q3 2025 para LATAM"})
+                second = client.post("/generate-from-prompt",
+                                     data={"prompt": "Presentación: plan de ventas para LATAM, Q3 2025"})
+                llm_calls = len(calls)
+                deck_id, token = second.headers["X-Deck-ID"], second.headers["X-Deck-Token"]
+                deck = client.get(f"/decks/{deck_id}", params={"deck_token": token}).json()["deck"]
+                first_deck = client.get(f"/decks/{first.headers['X-Deck-ID']}",
+                                        params={"deck_token": first.headers["X-Deck-Token"]}).json()["deck"]
+
+                with self.assertLogs("services.semantic_cache.audit", "WARNING"):
+                    reported = client.post(f"/decks/{deck_id}/cache-report", data={"deck_token": token})
+                not_cached = client.post(f"/decks/{first.headers['X-Deck-ID']}/cache-report",
+                                         data={"deck_token": first.headers["X-Deck-Token"]})
+                again = client.post("/generate-from-prompt",
+                                    data={"prompt": "Presentación: plan de ventas para LATAM, Q3 2025"})
+                stats = client.get("/semantic-cache").json()
+                llm_calls_after_report = len(calls)
+                # Another caller never gets this caller's decks
+                other = client.post("/generate-from-prompt", data={"prompt": "Plan de ventas Q3 2025 para LATAM"},
+                                    headers={"X-API-Key": "other-team"})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn("X-Semantic-Cache", first.headers)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.headers["X-Semantic-Cache"], "hit; similarity=1.0")
+        self.assertEqual(llm_calls, 1)
+        self.assertEqual(deck, first_deck)
+        self.assertEqual(sample("smartdeck_semantic_cache_total", {"outcome": "hit"}), hits + 1)
+
+        self.assertEqual(reported.status_code, 200)
+        self.assertEqual(not_cached.status_code, 404)
+        self.assertNotIn("X-Semantic-Cache", again.headers)
+        self.assertEqual(llm_calls_after_report, llm_calls + 1)
+        self.assertEqual((stats["hits"], stats["false_positives"]), (1, 1))
+        self.assertNotIn("X-Semantic-Cache", other.headers)
+        self.assertEqual(len(calls), llm_calls_after_report + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
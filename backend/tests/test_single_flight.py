@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+from services.llm_simulator import LatencyModel, LLMSimulator
+from services.single_flight import FlightTimeout, SingleFlight, flight_key
+from tests.helpers import main_app, sample
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_identical_calls_share_one_run(self):
+        """Concurrent callers with one key get one run's result (or exception); keys normalize whitespace"""
+        self.assertEqual(flight_key("prompt", "Plan  de\nventas ", "executive", "corporate_navy"),
+                         flight_key("prompt", "Plan de ventas", "executive", "corporate_navy"))
+        self.assertNotEqual(flight_key("prompt", "Plan de ventas", "executive", "corporate_navy"),
+                            flight_key("prompt", "Plan de ventas", "sales", "corporate_navy"))
+        flights = SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return {"slides": len(runs)}
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            results = await asyncio.gather(*(flights.run("k", work) for _ in range(5)))
+            errors = await asyncio.gather(*(flights.run("e", failing) for _ in range(3)), return_exceptions=True)
+            again = await flights.run("k", work)
+            return results, errors, again
+
+        results, errors, again = asyncio.run(run())
+        self.assertEqual(results, [{"slides": 1}] * 5)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(again, {"slides": 2})  # finished flights are not cached
+        self.assertEqual(flights.stats["leaders"], 3)
+        self.assertEqual(flights.stats["followers"], 6)
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_cancelled_and_timed_out_waiters_leave_the_work_running(self):
+        """One waiter giving up does not cancel the shared work; the last one leaving does"""
+        flights = SingleFlight()
+        cancelled = []
+
+        async def work():
+            try:
+                await asyncio.sleep(0.2)
+                return "deck"
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            leader = asyncio.create_task(flights.run("k", work))
+            follower = asyncio.create_task(flights.run("k", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(FlightTimeout):
+                await flights.run("k", work, timeout=0.02)
+            result = await follower
+
+            abandoned = asyncio.create_task(flights.run("a", work))
+            await asyncio.sleep(0.01)
+            abandoned.cancel()
+            await asyncio.sleep(0.01)
+            return result
+
+        self.assertEqual(asyncio.run(run()), "deck")
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(flights.stats["timeouts"], 1)
+        self.assertEqual(flights.stats["abandoned"], 1)
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_concurrent_identical_prompts_generate_once(self):
+        """Two identical /generate-from-prompt requests share one LLM call and render but get their own decks"""
+        with main_app(LLMSimulator(latency=LatencyModel(median_ms=200))) as main:
+            followers = sample("smartdeck_coalesced_requests_total", {"kind": "prompt", "role": "follower"})
+
+            async def run():
+                transport = httpx.ASGITransport(app=main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await asyncio.gather(*(
+                        client.post("/generate-from-prompt", data={"prompt": prompt, "style": "sales"})
+                        for prompt in ("Plan de ventas 2025 para LATAM", "Plan de ventas  2025 para LATAM\n")))
+
+            responses = asyncio.run(run())
+            decks = [main.deck_store.load(r.headers["X-Deck-ID"]) for r in responses]
+            fragments = [os.listdir(main.deck_store.fragment_dir(d["deck_id"])) for d in decks]
+
+        self.assertEqual([r.status_code for r in responses], [200, 200])
+        self.assertEqual(responses[0].content, responses[1].content)
+        self.assertNotEqual(decks[0]["deck_id"], decks[1]["deck_id"])
+        self.assertEqual(decks[0]["deck"], decks[1]["deck"])
+        self.assertEqual(sorted(fragments[0]), sorted(fragments[1]))
+        self.assertEqual(sample("smartdeck_coalesced_requests_total", {"kind": "prompt", "role": "follower"}),
+                         followers + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
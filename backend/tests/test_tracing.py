@@ -0,0 +1,92 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import unittest
+
+# Add parent directory to path to find 'services' package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.testclient import TestClient
+
+from services import tracing
+from services.llm_simulator import MOCK_ANALYSIS_DECK
+from services.pptx_builder import PPTXBuilder
+from tests.helpers import main_app
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_spans_nest_across_tasks_and_export_as_otlp(self):
+        """Concurrent child spans keep their parent; export is valid OTLP/JSON"""
+        async def work():
+            with tracing.trace_request("req-1", "POST /generate") as (trace, root):
+                async def child(i):
+                    with tracing.span("llm.generate", task="insights", chunk=i):
+                        await asyncio.sleep(0.01)
+                await asyncio.gather(*(child(i) for i in range(3)))
+            return trace, root
+
+        trace, root = asyncio.run(work())
+        children = [s for s in trace.spans if s.name == "llm.generate"]
+        self.assertEqual(len(children), 3)
+        self.assertTrue(all(s.parent_id == root.span_id for s in children))
+
+        # Overlapping spans count once in the stage's wall time
+        timing = dict(part.split(";dur=") for part in tracing.server_timing(trace).split(", "))
+        self.assertLess(float(timing["llm"]), 25)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "spans.jsonl")
+            exporter = tracing.SpanExporter("file", "smartdeck-test", path=path)
+            exporter.export(trace)
+            exporter.flush()
+            with open(path) as f:
+                payload = json.loads(f.readline())
+        spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        self.assertEqual({len(s["traceId"]) for s in spans}, {32})
+        self.assertEqual(sum(1 for s in spans if "parentSpanId" not in s), 1)
+        self.assertIn({"key": "chunk", "value": {"intValue": "0"}},
+                      [a for s in spans for a in s["attributes"]])
+
+    def test_builder_records_a_span_per_slide_and_save(self):
+        """PPTXBuilder spans every _create_* call and prs.save when traced"""
+        with tempfile.TemporaryDirectory() as output_dir, tracing.trace_request("req-2", "build") as (trace, _):
+            PPTXBuilder().build(MOCK_ANALYSIS_DECK, "trace.pptx", output_dir=output_dir)
+        names = [s.name for s in trace.spans]
+        self.assertEqual(sum(n.startswith("render.") for n in names), len(MOCK_ANALYSIS_DECK["slides"]) + 2)
+        self.assertIn("render.save", names)
+
+    def test_request_id_and_server_timing_headers(self):
+        """Responses echo a valid X-Request-ID, add Server-Timing, and logs carry the id"""
+        with main_app() as main:
+            client = TestClient(main.app)
+            records = []
+            handler = logging.Handler()
+            handler.addFilter(tracing.RequestIdFilter())
+            handler.emit = records.append
+            app_logger = logging.getLogger("SmartDeck")
+            app_logger.addHandler(handler)
+            previous_level = app_logger.level
+            app_logger.setLevel(logging.INFO)
+            try:
+                response = client.post("/generate-from-prompt", data={"prompt": "Plan de ventas 2025 para LATAM"},
+                                       headers={"X-Request-ID": "abc-123"})
+                forged = client.get("/styles", headers={"X-Request-ID": "bad id\n"})
+            finally:
+                app_logger.removeHandler(handler)
+                app_logger.setLevel(previous_level)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Request-ID"], "abc-123")
+        timing = response.headers["Server-Timing"]
+        for stage in ("llm;dur=", "render;dur=", "total;dur="):
+            self.assertIn(stage, timing)
+        self.assertNotEqual(forged.headers["X-Request-ID"], "bad id\n")
+        self.assertIn("abc-123", [r.request_id for r in records])
+
+
+if __name__ == '__main__':
+    unittest.main()